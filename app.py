@@ -1,16 +1,34 @@
+import os
+
 from flask import Flask
 from flask_restful import Api
 
 from handlers import *
+from models import DictionaryQueries, SearchRequest, LOAD_DICTIONARY_SNAPSHOT, BUILD_SEARCH_INDEXES, \
+    DICTIONARY_IMAGE_PATH
 
 app = Flask(__name__)
 api = Api(app)
 
+# the dictionary is small and read-only, so it can be kept in memory for the whole life of the server
+# if the dictionary image has been written by the loader, it is mapped instead, and shared by all the workers
+if LOAD_DICTIONARY_SNAPSHOT:
+    if os.path.exists(DICTIONARY_IMAGE_PATH):
+        DictionaryQueries().load_image(DICTIONARY_IMAGE_PATH)
+    else:
+        DictionaryQueries().load_snapshot()
+
+# the search indexes are kept up to date by the query classes on every write
+if BUILD_SEARCH_INDEXES:
+    SearchRequest.build_search_indexes()
+
 
 ### This is the api's routing table
 
 # Search endpoint
 api.add_resource(SearchHandler, '/api/search')
+# Typeahead endpoint, backed by the in-memory prefix index
+api.add_resource(AutocompleteHandler, '/api/autocomplete')
 
 
 # Proposition validation and saving endpoints
@@ -21,10 +39,16 @@ api.add_resource(WordGraphSavingHandler, '/api/save_word')
 # validate and save a proposition (sentence or supersentence) graph, and return its IEML string
 api.add_resource(GraphCheckerHandler, '/api/validate_tree')
 api.add_resource(GraphSavingHandler, '/api/save_tree')
+# incremental validation of a proposition graph : the session keeps the graph, and each request sends a change to it
+api.add_resource(ValidationSessionOpeningHandler, '/api/validation_session/open')
+api.add_resource(ValidationSessionDeltaHandler, '/api/validation_session/delta')
+api.add_resource(ValidationSessionClosingHandler, '/api/validation_session/close')
 
 # USL validation and saving endpoints
 api.add_resource(TextValidatorHandler, '/api/validate_text')
 api.add_resource(HyperTextValidatorHandler, '/api/validate_hypertext')
+# canonical IEML form of an USL, streamed
+api.add_resource(USLRenderHandler, '/api/render')
 
 # Text decomposition for hyperlinks
 api.add_resource(TextDecompositionHandler, '/api/decomposition_text')
@@ -1,4 +1,5 @@
 from .propositions import GraphCheckerHandler, WordGraphCheckerHandler, GraphSavingHandler, WordGraphSavingHandler
 from handlers.commons import SearchTermsHandler, ElementDecompositionHandler
-from .usl import TextDecompositionHandler, TextValidatorHandler, HyperTextValidatorHandler
-from .db_search import SearchHandler, CheckTagExistHandler
+from .usl import TextDecompositionHandler, TextValidatorHandler, HyperTextValidatorHandler, USLRenderHandler
+from .sessions import ValidationSessionOpeningHandler, ValidationSessionDeltaHandler, ValidationSessionClosingHandler
+from .db_search import SearchHandler, CheckTagExistHandler, AutocompleteHandler
@@ -2,8 +2,9 @@ import json
 
 from flask_restful import Resource, reqparse
 from ieml.exceptions import IEMLTermNotFoundInDictionnary, ToolsException, InvalidGraphNode, NoRootNodeFound, \
-    SeveralRootNodeFound
+    SeveralRootNodeFound, EdgeCreatesCycle, USLException
 from models.exceptions import DBException
+from .exceptions import ValidationSessionException
 import traceback
 
 
@@ -52,6 +53,14 @@ class ErrorCatcher:
             if issubclass(error_type, type):
                 return self.SUPPORTED_ERRORS_TYPE.index(error_type)
 
+    @staticmethod
+    def _graph_errors_json(error):
+        """All the errors found in the graph along with the raised one, with the nodes they're about"""
+        return [{"TYPE": type(graph_error).__name__,
+                 "MESSAGE": str(graph_error),
+                 "NODES": graph_error.nodes if graph_error.nodes is not None else graph_error.node_ids}
+                for graph_error in error.errors]
+
     def __get__(self, obj, objtype):
         """Support for methods of a class's instance decoration"""
         import functools
@@ -70,18 +79,30 @@ class ErrorCatcher:
         except InvalidGraphNode as e:
             traceback.print_exc()
             return {"ERROR_CODE" : 2,
-                    "MESSAGE" : "Incorrect proposition: " + str(e)}
+                    "MESSAGE" : "Incorrect proposition: " + str(e),
+                    "ERRORS" : self._graph_errors_json(e)}
 
-        except (NoRootNodeFound, SeveralRootNodeFound) as e:
+        except (NoRootNodeFound, SeveralRootNodeFound, EdgeCreatesCycle) as e:
             traceback.print_exc()
             return {"ERROR_CODE" : 3,
-                    "MESSAGE" : "Incorrect proposition: " + e.message}
+                    "MESSAGE" : "Incorrect proposition: " + e.message,
+                    "ERRORS" : self._graph_errors_json(e)}
 
         except IEMLTermNotFoundInDictionnary as e:
             traceback.print_exc()
             return {"ERROR_CODE" : 4,
                     "MESSAGE" : str(e)}
 
+        except ValidationSessionException as e:
+            traceback.print_exc()
+            return {"ERROR_CODE" : 6,
+                    "MESSAGE" : str(e)}
+
+        except USLException as e:
+            traceback.print_exc()
+            return {"ERROR_CODE" : 7,
+                    "MESSAGE" : "Incorrect hypertext: " + str(e)}
+
         except ToolsException:
             traceback.print_exc()
             return {"ERROR_CODE" : 5,
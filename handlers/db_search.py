@@ -1,5 +1,5 @@
 from .base import BaseHandler, ErrorCatcher
-from models import PropositionsQueries, HyperTextQueries, SearchRequest
+from models import PropositionsQueries, HyperTextQueries, SearchRequest, AUTOCOMPLETE_DEFAULT_LIMIT
 from ieml.AST import Word, Sentence, SuperSentence, Term, HyperText, Text
 import json
 
@@ -76,12 +76,27 @@ class SearchHandler(BaseHandler):
         if self.filters['level']:
             level = [level_to_type_table[lvl] for lvl in self.filters['level']]
 
-        if (Term in level or Word in level) and self.filters['category']:
+        # no level filter means that every level is searched
+        if (level is None or Term in level or Word in level) and self.filters['category']:
             category = categories[self.filters['category']]
 
-        if Term in level and self.filters['term_type']:
+        if (level is None or Term in level) and self.filters['term_type']:
             term_type = term_types[self.filters['term_type']]
 
         search_string = self.filters['search_string']
 
         return SearchRequest.search_string(search_string, language, level, category, term_type)
+
+
+class AutocompleteHandler(BaseHandler):
+    """Typeahead completion of tags and IEML strings, for every level of IEML objects"""
+
+    def __init__(self):
+        super().__init__()
+        self.reqparse.add_argument("prefix", required=True, type=str)
+        self.reqparse.add_argument("limit", type=int, default=AUTOCOMPLETE_DEFAULT_LIMIT)
+
+    @ErrorCatcher
+    def post(self):
+        self.do_request_parsing()
+        return SearchRequest.autocomplete(self.args["prefix"], self.args["limit"])
@@ -16,4 +16,38 @@ class InvalidIEMLReference(APIException):
     pass
 
 class EmptyUslChecking(APIException):
-    pass
\ No newline at end of file
+    pass
+
+
+class ValidationSessionException(APIException):
+    """Errors of the changes sent to a validation session"""
+    pass
+
+
+class UnknownValidationSession(ValidationSessionException):
+    def __init__(self, session_id):
+        super().__init__()
+        self.session_id = session_id
+
+    def __str__(self):
+        return "Unknown or expired validation session %s" % self.session_id
+
+
+class UnknownGraphNode(ValidationSessionException):
+    def __init__(self, node_id):
+        super().__init__()
+        self.node_id = node_id
+
+    def __str__(self):
+        return "No node with the id %s in the graph" % self.node_id
+
+
+class DuplicateGraphEdge(ValidationSessionException):
+    def __init__(self, substance_id, attribute_id):
+        super().__init__()
+        self.substance_id = substance_id
+        self.attribute_id = attribute_id
+
+    def __str__(self):
+        return "There's already an edge from the node %s to the node %s in the graph" % (self.substance_id,
+                                                                                        self.attribute_id)
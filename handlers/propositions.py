@@ -1,12 +1,10 @@
-import logging
-
 from ieml import PropositionsParser
-from ieml.AST import Word, Sentence, SuperSentence, Morpheme, Term, promote_to
-from ieml.AST.tools import SentenceGraph, SuperSentenceGraph
+from ieml.AST import Word, Sentence, SuperSentence, Morpheme, Term
 from ieml.exceptions import InvalidNodeIEMLLevel
 from models import PropositionsQueries, DictionaryQueries, PropositionAlreadyExists, TextQueries, HyperTextQueries
 from .base import BaseHandler, BaseDataHandler, ErrorCatcher
 from .exceptions import MissingField,PromotingToInvalidLevel,InvalidIEMLReference, EmptyUslChecking
+from .sessions import GraphValidationSession
 
 
 class ValidatorHandler(BaseDataHandler):
@@ -36,33 +34,15 @@ class GraphCheckerHandler(ValidatorHandler):
                 raise MissingField(field)
 
     def _build_ieml_ast(self):
-        parser = PropositionsParser()
-        if "validation_type" in self.json_data:
-            graph_type = SentenceGraph if self.json_data["validation_type"] == 1 else SuperSentenceGraph
-        else:
-            logging.warning("Couldn't find validation_type field, defaulting to sentence level")
-            graph_type = SentenceGraph
-
-        nodes_table = {}
+        # the whole graph is validated at once, as a single-use validation session
+        session = GraphValidationSession(self.json_data.get("validation_type"))
         for node in self.json_data["nodes"]:
-            nodes_table[node["id"]] = parser.parse(node["ieml_string"])
-            if not isinstance(nodes_table[node["id"]], graph_type.primitive_type):
-                nodes_table[node["id"]] = promote_to(nodes_table[node["id"]], graph_type.primitive_type)
-
-        # transforming the vertices into clauses or superclauses
-        multiplication_elems = []
+            session.add_node(node["id"], node["ieml_string"])
         for vertice in self.json_data["graph"]:
-            new_element = graph_type.multiplicative_type(nodes_table[vertice["substance"]],
-                                                         nodes_table[vertice["attribute"]],
-                                                         nodes_table[vertice["mode"]])
-            multiplication_elems.append(new_element)
+            session.add_edge(vertice["substance"], vertice["attribute"], vertice["mode"])
 
-        #OH WAIT, we can make it into a sentence/supersentence now, and return it
-        proposition_ast = graph_type.additive_type(multiplication_elems)
         # asking the proposition to check then order itself
-        proposition_ast.check()
-
-        return proposition_ast
+        return session.validate()
 
     @ErrorCatcher
     def post(self):
@@ -0,0 +1,197 @@
+import logging
+from collections import OrderedDict, defaultdict
+from threading import Lock
+from uuid import uuid4
+
+from helpers.metaclasses import Singleton
+from ieml import PropositionsParser
+from ieml.AST.tools import SentenceGraph, SuperSentenceGraph, promote_to
+from ieml.exceptions import InvalidPropositionGraph
+from models import VALIDATION_SESSIONS_MAX_COUNT
+from .base import BaseDataHandler, ErrorCatcher
+from .exceptions import MissingField, EmptyUslChecking, UnknownValidationSession, UnknownGraphNode, \
+    DuplicateGraphEdge
+
+
+class GraphValidationSession:
+    """State of a sentence/supersentence graph being built in the editor : its parsed nodes, its edges and the
+    clauses built from them. Each change only parses the added nodes and rebuilds the clauses it affects"""
+
+    def __init__(self, validation_type=None):
+        if validation_type is None:
+            logging.warning("Couldn't find validation_type field, defaulting to sentence level")
+        self.graph_type = SuperSentenceGraph if validation_type not in (None, 1) else SentenceGraph
+        self.nodes = {} # node id => parsed node, promoted to the graph's primitive level
+        self.edges = {} # (substance node id, attribute node id) => mode node id
+        self._clauses = {} # same keys, the clauses built from the edges (rebuilt when one of their nodes changes)
+        self.lock = Lock() # held while a change is applied and the graph validated
+
+    def add_node(self, node_id, ieml_string):
+        """Adds a node to the graph, or replaces it if there's already one with that id"""
+        node = PropositionsParser().parse(ieml_string)
+        if not isinstance(node, self.graph_type.primitive_type):
+            node = promote_to(node, self.graph_type.primitive_type)
+
+        self.nodes[node_id] = node
+        for edge, mode_id in self.edges.items():
+            if node_id in edge or node_id == mode_id:
+                self._clauses.pop(edge, None)
+
+    def remove_node(self, node_id):
+        """Removes a node from the graph, along with the edges using it"""
+        if node_id not in self.nodes:
+            raise UnknownGraphNode(node_id)
+
+        del self.nodes[node_id]
+        for edge, mode_id in list(self.edges.items()):
+            if node_id in edge or node_id == mode_id:
+                self.remove_edge(*edge)
+
+    def add_edge(self, substance_id, attribute_id, mode_id):
+        """Adds the edge going from the substance to the attribute. To change the mode of an edge, it has
+        to be removed first"""
+        for node_id in (substance_id, attribute_id, mode_id):
+            if node_id not in self.nodes:
+                raise UnknownGraphNode(node_id)
+        if (substance_id, attribute_id) in self.edges:
+            raise DuplicateGraphEdge(substance_id, attribute_id)
+
+        self.edges[(substance_id, attribute_id)] = mode_id
+        self._clauses.pop((substance_id, attribute_id), None)
+
+    def remove_edge(self, substance_id, attribute_id):
+        self.edges.pop((substance_id, attribute_id), None)
+        self._clauses.pop((substance_id, attribute_id), None)
+
+    def save_state(self):
+        """Returns a copy of the graph's state, which restore_state puts back"""
+        return dict(self.nodes), dict(self.edges), dict(self._clauses)
+
+    def restore_state(self, state):
+        self.nodes, self.edges, self._clauses = state
+
+    def _clause(self, edge):
+        if edge not in self._clauses:
+            substance_id, attribute_id = edge
+            self._clauses[edge] = self.graph_type.multiplicative_type(self.nodes[substance_id],
+                                                                      self.nodes[attribute_id],
+                                                                      self.nodes[self.edges[edge]])
+        return self._clauses[edge]
+
+    def validate(self):
+        """Builds the sentence/supersentence from the current clauses and returns it, checked and ordered.
+        The errors of the graph refer to the ids of its nodes"""
+        if not self.edges:
+            raise EmptyUslChecking()
+
+        proposition_ast = self.graph_type.additive_type([self._clause(edge) for edge in self.edges])
+        try:
+            proposition_ast.check()
+        except InvalidPropositionGraph as err:
+            self._set_errors_nodes(err, proposition_ast.graph)
+            raise err
+
+        return proposition_ast
+
+    def _set_errors_nodes(self, error, graph):
+        """Replaces the graph's node indexes of the errors by the ids of the nodes"""
+        node_ids = defaultdict(list) # several nodes can be the same graph node
+        for node_id, node in self.nodes.items():
+            node_ids[node].append(node_id)
+
+        for graph_error in error.errors:
+            graph_error.nodes = [node_id for index in graph_error.node_ids
+                                 for node_id in node_ids[graph.nodes_list[index]]]
+
+
+class ValidationSessions(metaclass=Singleton):
+    """The open validation sessions, by id. Only the most recently used ones are kept.
+
+    The sessions are kept in the memory of the server's process, so they only work when the server runs as
+    a single process : with several worker processes, a change could be sent to a process that doesn't know
+    the session (and gets an UnknownValidationSession error). The threads of that process share them"""
+
+    def __init__(self, max_count=VALIDATION_SESSIONS_MAX_COUNT):
+        self.max_count = max_count
+        self._sessions = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def open(self, validation_type=None):
+        """Returns the id of a new session, and the session"""
+        session_id, session = uuid4().hex, GraphValidationSession(validation_type)
+        with self._lock:
+            self._sessions[session_id] = session
+            if len(self._sessions) > self.max_count:
+                self._sessions.popitem(last=False)
+        return session_id, session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise UnknownValidationSession(session_id)
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class ValidationSessionDeltaHandler(BaseDataHandler):
+    """Applies a change (nodes and edges removed, then added) to the graph of a validation session,
+    and validates the graph like the graph checker does"""
+
+    def do_request_parsing(self):
+        super().do_request_parsing()
+        if "session" not in self.json_data:
+            raise MissingField("session")
+
+    def _apply_delta(self, session):
+        for edge in self.json_data.get("remove_edges", []):
+            session.remove_edge(edge["substance"], edge["attribute"])
+        for node_id in self.json_data.get("remove_nodes", []):
+            session.remove_node(node_id)
+        for node in self.json_data.get("add_nodes", []):
+            session.add_node(node["id"], node["ieml_string"])
+        for edge in self.json_data.get("add_edges", []):
+            session.add_edge(edge["substance"], edge["attribute"], edge["mode"])
+
+    @ErrorCatcher
+    def post(self):
+        self.do_request_parsing()
+        session_id = self.json_data["session"]
+        session = ValidationSessions().get(session_id)
+        with session.lock:
+            # a change is applied as a whole or not at all, so that the graph stays the one the client knows of
+            state = session.save_state()
+            try:
+                self._apply_delta(session)
+            except Exception:
+                session.restore_state(state)
+                raise
+            return {"valid": True, "ieml": str(session.validate()), "session": session_id}
+
+
+class ValidationSessionOpeningHandler(BaseDataHandler):
+    """Opens a validation session for a sentence/supersentence graph, and returns its id. The nodes and
+    edges are then sent as changes to the session"""
+
+    @ErrorCatcher
+    def post(self):
+        self.do_request_parsing()
+        session_id, _ = ValidationSessions().open(self.json_data.get("validation_type"))
+        return {"session": session_id}
+
+
+class ValidationSessionClosingHandler(ValidationSessionDeltaHandler):
+    """Closes a validation session"""
+
+    @ErrorCatcher
+    def post(self):
+        self.do_request_parsing()
+        ValidationSessions().close(self.json_data["session"])
+        return {}
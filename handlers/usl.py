@@ -1,13 +1,15 @@
 from uuid import uuid4
 
+from flask import Response, stream_with_context
 from ieml import USLParser, PropositionsParser
 from ieml.AST import Term, Text,HyperText, AbstractProposition, Word, Sentence, SuperSentence, PropositionPath
 from ieml.AST.tools import demote_once, promote_to
 from models import DictionaryQueries, TextQueries, PropositionsQueries, HyperTextQueries
-from .base import BaseDataHandler, BaseHandler
+from .base import BaseDataHandler, BaseHandler, ErrorCatcher
 import json
 from .exceptions import InvalidIEMLReference
 from ieml.AST import ClosedPropositionMetadata
+from ieml.AST.usl import HyperTextAssembler
 
 
 class TextValidatorHandler(BaseDataHandler):
@@ -49,6 +51,7 @@ class HyperTextValidatorHandler(BaseDataHandler):
         self.db_connector_text = HyperTextQueries()
         self.parser = USLParser()
 
+    @ErrorCatcher
     def post(self):
         """
             Request :  {    tags : {..}
@@ -57,19 +60,18 @@ class HyperTextValidatorHandler(BaseDataHandler):
         """
         self.do_request_parsing()
 
-        hypertexts = {}
+        assembler = HyperTextAssembler()
         for text in self.json_data["nodes"]:
-            hypertexts[text["id"]] = self.parser.parse(text["ieml_string"])
+            assembler.add_hypertext(text["id"], self.parser.parse(text["ieml_string"]))
 
-        # parse the graph and add hyperlink, check the cycle
+        # parse the graph and add hyperlink, a cycle is rejected as soon as its last hyperlink is added
         for hyperlink in self.json_data["graph"]:
-            path = hypertexts[hyperlink['substance']].get_path_from_ieml(hyperlink['mode']['selection'])
-            hypertexts[hyperlink['substance']].add_hyperlink(path,
-                                                             hyperlink['mode']['literal'],
-                                                             hypertexts[hyperlink['attribute']])
+            path = assembler.get_hypertext(hyperlink['substance']).get_path_from_ieml(hyperlink['mode']['selection'])
+            assembler.add_hyperlink(hyperlink['substance'], path, hyperlink['mode']['literal'], hyperlink['attribute'])
 
-        # get the root hypertext, the one with the highest strate
-        root = hypertexts[max(hypertexts, key=lambda key: hypertexts[key].strate)]
+        # the hypertexts are only built once all the hyperlinks are there, and the root is the one with the
+        # highest strate
+        root = assembler.build()
 
         # verification of the usl
         root.check()
@@ -80,6 +82,23 @@ class HyperTextValidatorHandler(BaseDataHandler):
         return {'valid': True, "ieml": str(root)}
 
 
+class USLRenderHandler(BaseHandler):
+    """Returns the IEML form of an USL (its elements being ordered). The string is streamed to the response as
+    it's rendered, so large hypertexts are never built in memory"""
+
+    def __init__(self):
+        super().__init__()
+        self.reqparse.add_argument("data", required=True, type=str)
+        self.parser = USLParser()
+
+    @ErrorCatcher
+    def post(self):
+        self.do_request_parsing()
+        hypertext = self.parser.parse(self.args["data"])
+        hypertext.check()
+        return Response(stream_with_context(hypertext.iter_ieml()), mimetype="text/plain")
+
+
 class TextDecompositionHandler(BaseHandler):
 
     def __init__(self):
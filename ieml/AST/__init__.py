@@ -1,5 +1,6 @@
 from .propositions import Morpheme, Word, Clause, SuperSentence, Sentence, SuperClause, AbstractProposition
-from .terms import Term
+from .terms import Term, TermRegistry
 from .usl import Text, HyperText, PropositionPath
+from .consing import PropositionFactory
 from .tools import null_element, promote_to, RandomPropositionGenerator
 from .tree_metadata import ClosedPropositionMetadata, NonClosedPropositionMetadata, TreeElementMetadata, PropositionMetadata
\ No newline at end of file
@@ -0,0 +1,309 @@
+"""Compact binary form of the checked ASTs, so that a stored AST can be rebuilt without going through
+the parser, nor the dictionary.
+
+All the integers are unsigned LEB128 varints, and the strings are a varint length followed by UTF-8 bytes.
+The literals of the hyperlinks are a varint, 0 if there's no literal, else the length of the string + 1, then
+the string's UTF-8 bytes.
+    header          MAGIC, VERSION byte, generation of the dictionary the terms were checked against
+    term table      number of terms, then for each term : IEML, object id (12 bytes), rank + 1 (0 if it has none),
+                    number of canonical forms, canonical forms
+    opcodes         the elements of the AST in post-order, each one pushing an element on a stack after popping
+                    its children from it :
+                        TERM index                      the term at that index in the term table
+                        REF index                       an element that has already been pushed (shared subtree),
+                                                        all the elements pushed by the other opcodes are numbered
+                        MORPHEME, TEXT count            number of children
+                        WORD, SENTENCE,                 number of children, then number of hyperlinks and their
+                        SUPERSENTENCE count, hyperlinks literals. Pops the linked hypertexts, in the hyperlinks'
+                                                        order, then the children. The propositions that have
+                                                        hyperlinks aren't shared, like the parsed ones
+                        CLAUSE, SUPERCLAUSE             (always 3 children)
+                        HYPERTEXT count, hyperlinks     count hyperlinks added to the hypertext (the ones of its
+                                                        text's propositions are encoded with them), each one being
+                                                        its path (length, then the position of each element among
+                                                        its parent's children, starting from the text's) and its
+                                                        literal. Pops the linked hypertexts, in the hyperlinks'
+                                                        order, then the text
+    The element left on the stack is the AST
+"""
+from bson import ObjectId
+
+from .terms import Term, TermRegistry
+from .propositions import ClosedProposition, Morpheme, Word, Clause, SuperClause, Sentence, SuperSentence
+from .usl import Text, HyperText
+from .consing import PropositionFactory
+from .commons import PropositionPath
+from ieml.exceptions import InvalidBinaryAST, UnsupportedBinaryVersion
+
+MAGIC = b"IEMLAST"
+VERSION = 2
+
+TERM, REF, MORPHEME, WORD, CLAUSE, SENTENCE, SUPERCLAUSE, SUPERSENTENCE, TEXT, HYPERTEXT = range(10)
+OPCODES = {Morpheme: MORPHEME, Word: WORD, Clause: CLAUSE, Sentence: SENTENCE, SuperClause: SUPERCLAUSE,
+           SuperSentence: SUPERSENTENCE, Text: TEXT, HyperText: HYPERTEXT}
+COUNTED_OPCODES = {MORPHEME, WORD, SENTENCE, SUPERSENTENCE, TEXT} # the ones followed by their number of children
+HYPERLINKED_OPCODES = {WORD, SENTENCE, SUPERSENTENCE} # the closed propositions, followed by their hyperlinks
+
+
+def _write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _write_string(buffer, string):
+    data = string.encode("utf-8")
+    _write_varint(buffer, len(data))
+    buffer += data
+
+
+def _write_literal(buffer, literal):
+    if literal is None:
+        _write_varint(buffer, 0)
+    else:
+        data = str(literal).encode("utf-8")
+        _write_varint(buffer, len(data) + 1)
+        buffer += data
+
+
+class _Reader:
+    """Reads varints and strings from the encoded data"""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.position = 0
+
+    def at_end(self):
+        return self.position >= len(self.data)
+
+    def bytes(self, length):
+        if self.position + length > len(self.data):
+            raise InvalidBinaryAST("Truncated data")
+        result = self.data[self.position:self.position + length]
+        self.position += length
+        return result
+
+    def varint(self):
+        result, shift = 0, 0
+        while True:
+            byte = self.bytes(1)[0]
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def string(self):
+        return str(self.bytes(self.varint()), "utf-8")
+
+    def literal(self):
+        length = self.varint()
+        return str(self.bytes(length - 1), "utf-8") if length > 0 else None
+
+
+def _hyperlinks_of(hypertext):
+    """(path, literal, linked hypertext) triples of the hyperlinks added to a hypertext, the path being given as
+    child positions. The ones gathered from its text's propositions are left out, they're encoded with them"""
+    gathered = [(path, literal, id(linked_hypertext))
+                for path, (literal, linked_hypertext) in hypertext.children[0].get_hyperlinks()]
+    result = []
+    for path, literal, linked_hypertext in hypertext.get_hyperlinks():
+        if (path, literal, id(linked_hypertext)) in gathered:
+            gathered.remove((path, literal, id(linked_hypertext)))
+            continue
+
+        positions, parent = [], hypertext.children[0]
+        for element in path.path:
+            positions.append(parent.children.index(element))
+            parent = element
+        result.append((positions, literal, linked_hypertext))
+    return result
+
+
+def encode(ast):
+    """Returns the binary form of a checked AST (term, proposition, text or hypertext)"""
+    from models.base_queries import DictionaryQueries
+
+    term_table, term_indexes = [], {}
+    element_indexes = {} # id(element) => number of the element, for the REF opcodes
+    opcodes = bytearray()
+
+    # post-order walk, using a stack of (element, its children have been written) couples
+    stack = [(ast, False)]
+    while stack:
+        element, children_done = stack.pop()
+        if id(element) in element_indexes:
+            opcodes.append(REF)
+            _write_varint(opcodes, element_indexes[id(element)])
+            continue
+
+        if isinstance(element, Term):
+            if element.ieml not in term_indexes:
+                term_indexes[element.ieml] = len(term_table)
+                term_table.append(element)
+            opcodes.append(TERM)
+            _write_varint(opcodes, term_indexes[element.ieml])
+        elif not children_done:
+            if not element.is_checked():
+                raise InvalidBinaryAST("Only checked ASTs can be encoded")
+            stack.append((element, True))
+            if isinstance(element, HyperText):
+                children = [hyperlink[2] for hyperlink in _hyperlinks_of(element)] + list(element.children)
+            elif isinstance(element, ClosedProposition):
+                children = list(element.children) + [hypertext for literal, hypertext in element.hyperlink]
+            else:
+                children = element.children
+            stack += [(child, False) for child in reversed(children)]
+            continue
+        else:
+            opcode = OPCODES[type(element)]
+            opcodes.append(opcode)
+            if opcode in COUNTED_OPCODES:
+                _write_varint(opcodes, len(element.children))
+            if opcode in HYPERLINKED_OPCODES:
+                _write_varint(opcodes, len(element.hyperlink))
+                for literal, _ in element.hyperlink:
+                    _write_literal(opcodes, literal)
+            elif opcode == HYPERTEXT:
+                hyperlinks = _hyperlinks_of(element)
+                _write_varint(opcodes, len(hyperlinks))
+                for positions, literal, _ in hyperlinks:
+                    _write_varint(opcodes, len(positions))
+                    for position in positions:
+                        _write_varint(opcodes, position)
+                    _write_literal(opcodes, literal)
+
+        element_indexes[id(element)] = len(element_indexes)
+
+    buffer = bytearray(MAGIC)
+    buffer.append(VERSION)
+    _write_varint(buffer, DictionaryQueries().generation())
+    _write_varint(buffer, len(term_table))
+    for term in term_table:
+        _write_string(buffer, term.ieml)
+        buffer += term.objectid.binary
+        _write_varint(buffer, term.rank + 1 if term.rank is not None else 0)
+        _write_varint(buffer, len(term.canonical_forms))
+        for canonical_form in term.canonical_forms:
+            _write_string(buffer, canonical_form)
+
+    return bytes(buffer + opcodes)
+
+
+def _read_terms(reader, generation):
+    """Reads the term table. If the dictionary has been reloaded since the AST was encoded, the terms are
+    looked up in the new one, since their object ids and ranks may have changed"""
+    from models.base_queries import DictionaryQueries
+
+    entries = []
+    for i in range(reader.varint()):
+        ieml = reader.string()
+        objectid = ObjectId(bytes(reader.bytes(12)))
+        rank = reader.varint() - 1
+        canonical_forms = [reader.string() for j in range(reader.varint())]
+        entries.append((ieml, objectid, canonical_forms, rank if rank >= 0 else None))
+
+    registry = TermRegistry()
+    # terms encoded without a rank are looked up again too, the terms are sorted by their ranks
+    if generation == DictionaryQueries().generation() and all(entry[3] is not None for entry in entries):
+        return [registry.intern(*entry) for entry in entries]
+
+    registry.resolve([entry[0] for entry in entries])
+    return [registry.get(entry[0]) for entry in entries]
+
+
+def _pop(stack, count):
+    if count > len(stack):
+        raise InvalidBinaryAST("Malformed binary AST")
+    popped = stack[len(stack) - count:]
+    del stack[len(stack) - count:]
+    return popped
+
+
+def _build_hypertext(text, linked_hypertexts, hyperlinks):
+    hypertext = HyperText(text)
+    for (positions, literal), linked_hypertext in zip(hyperlinks, linked_hypertexts):
+        path, parent = [], text
+        for position in positions:
+            parent = parent.children[position]
+            path.append(parent)
+        hypertext._add_hyperlink(PropositionPath(path), literal, linked_hypertext)
+    if hyperlinks:
+        hypertext._build_graph()
+    hypertext.check()
+    return hypertext
+
+
+def _build_hyperlinked_proposition(opcode, children, linked_hypertexts, literals):
+    """Builds a proposition of its own (not a shared one) for the hyperlinks, like the USL parser does"""
+    if opcode == WORD:
+        proposition = Word(*children)
+    else:
+        proposition = (Sentence if opcode == SENTENCE else SuperSentence)(children)
+    proposition.add_hyperlink_list(list(zip(literals, linked_hypertexts)))
+    proposition.check()
+    return proposition
+
+
+def decode(data):
+    """Rebuilds an AST from its binary form. The propositions are built by the PropositionFactory,
+    and the ASTs it returns are checked"""
+    reader = _Reader(data)
+    if bytes(reader.bytes(len(MAGIC))) != MAGIC:
+        raise InvalidBinaryAST("Not a binary AST")
+    version = reader.bytes(1)[0]
+    if version != VERSION:
+        raise UnsupportedBinaryVersion("Binary AST version %i isn't supported" % version)
+
+    generation = reader.varint()
+    terms = _read_terms(reader, generation)
+    factory = PropositionFactory()
+
+    elements, stack = [], []
+    while not reader.at_end():
+        opcode = reader.varint()
+        if opcode == REF:
+            stack.append(elements[reader.varint()])
+            continue
+
+        if opcode == TERM:
+            element = terms[reader.varint()]
+        elif opcode in COUNTED_OPCODES:
+            count = reader.varint()
+            literals = [reader.literal() for i in range(reader.varint())] if opcode in HYPERLINKED_OPCODES else []
+            linked_hypertexts = _pop(stack, len(literals))
+            children = _pop(stack, count)
+            if literals:
+                element = _build_hyperlinked_proposition(opcode, children, linked_hypertexts, literals)
+            elif opcode == MORPHEME:
+                element = factory.morpheme(children)
+            elif opcode == WORD:
+                element = factory.word(*children)
+            elif opcode == SENTENCE:
+                element = factory.sentence(children)
+            elif opcode == SUPERSENTENCE:
+                element = factory.supersentence(children)
+            else:
+                element = Text(children)
+                element.check()
+        elif opcode in (CLAUSE, SUPERCLAUSE):
+            children = _pop(stack, 3)
+            make = factory.clause if opcode == CLAUSE else factory.superclause
+            element = make(*children)
+        elif opcode == HYPERTEXT:
+            hyperlinks = []
+            for i in range(reader.varint()):
+                positions = [reader.varint() for j in range(reader.varint())]
+                hyperlinks.append((positions, reader.literal()))
+            text, = _pop(stack, 1)
+            linked_hypertexts = _pop(stack, len(hyperlinks))
+            element = _build_hypertext(text, linked_hypertexts, hyperlinks)
+        else:
+            raise InvalidBinaryAST("Unknown opcode %i" % opcode)
+
+        elements.append(element)
+        stack.append(element)
+
+    if len(stack) != 1:
+        raise InvalidBinaryAST("Malformed binary AST")
+    return stack[0]
@@ -1,19 +1,33 @@
-from ieml.exceptions import CannotRenderElementWithoutOrdering, PathCannotBeEmpty, CannotRetrieveMetadata
+from ieml.exceptions import CannotRenderElementWithoutOrdering, PathCannotBeEmpty, CannotRetrieveMetadata, \
+    FrozenElementModified
 from functools import total_ordering
+from operator import attrgetter
 
 @total_ordering
 class AbstractPropositionMetaclass(type):
-    """This metaclass enables the comparison of class times, such as (Sentence > Word) == True"""
+    """This metaclass enables the comparison of class times, such as (Sentence > Word) == True.
+    Each concrete class gives its position in the Term < Morpheme < ... < SuperSentence order
+    with its level_order class attribute"""
 
     def __gt__(self, other):
-        from ieml.AST import Term, Morpheme, Word, Clause, Sentence, SuperClause, SuperSentence
-        child_list = [Term, Morpheme, Word, Clause, Sentence, SuperClause, SuperSentence]
-        return child_list.index(self) > child_list.index(other)
+        return self.level_order > other.level_order
 
     def __lt__(self, other):
-        from ieml.AST import Term, Morpheme, Word, Clause, Sentence, SuperClause, SuperSentence
-        child_list = [Term, Morpheme, Word, Clause, Sentence, SuperClause, SuperSentence]
-        return child_list.index(self) < child_list.index(other)
+        return self.level_order < other.level_order
+
+
+by_sort_key = attrgetter('sort_key') # key function for sorting terms and propositions
+
+
+def join_fragments(left, separator, elements, right):
+    """Rendering fragments for left + separator.join(elements) + right"""
+    fragments = [left]
+    for i, element in enumerate(elements):
+        if i:
+            fragments.append(separator)
+        fragments.append(element)
+    fragments.append(right)
+    return fragments
 
 
 def requires_not_empty(method):
@@ -30,6 +44,8 @@ class PropositionPath:
     """Stores a path to a 'closable' proposition *inside* another closed proposition, in a text.
     Used by hyperlinks to figure out which proposition is the right one"""
 
+    __slots__ = ('path',)
+
     def __init__(self, path=None, proposition=None):
         self.path = []
         if path:
@@ -62,29 +78,118 @@ class PropositionPath:
 
 
 class TreeStructure:
+    # the AST nodes are slotted : an AST can have tens of thousands of nodes, and a __dict__ per node
+    # would take several times the memory of the attributes themselves
+    __slots__ = ('_has_been_checked', '_has_been_ordered', '_frozen', '_ieml_string', '_hash', '_sort_key',
+                 '_metadata', '_frozen_metadata', 'children', '__weakref__')
+    # the attributes that are only caches of what can be computed from the (frozen) element, so they can
+    # still be set once it's frozen : concurrent threads computing them would set the same value. The metadata
+    # comes from the database, so a frozen element only caches it along with the write counter of the
+    # collection it was read from (_frozen_metadata), and _metadata itself is never set once it's frozen
+    CACHE_ATTRIBUTES = frozenset(('_ieml_string', '_descendants', '_is_promotion', '_promoted_from',
+                                  '_frozen_metadata'))
+    _has_own_hyperlinks = False # true for the elements whose rendering doesn't depend on their parent's hyperlinks
+    _starts_hyperlink_paths = False # true for the elements whose children are the first element of hyperlink paths
+
     def __init__(self):
         super().__init__()
         self._has_been_checked = False
         self._has_been_ordered = False
-        self._str = None
+        self._frozen = False
+        self._ieml_string = None
+        self._hash = None # structural hash, computed when the element is ordered (if the class defines one)
+        self._sort_key = None # same, for the sort key
         self._metadata = None
+        self._frozen_metadata = None # (write counter of the metadata's collection, metadata) couple
         self.children = None  # will be an iterable (list or tuple)
 
+    def __setattr__(self, name, value):
+        if name not in self.CACHE_ATTRIBUTES and getattr(self, '_frozen', False):
+            raise FrozenElementModified(self, name)
+        object.__setattr__(self, name, value)
+
     def __str__(self):
         if self._str is not None:
             return self._str
         else:
             raise CannotRenderElementWithoutOrdering()
 
+    @property
+    def _str(self):
+        """The IEML string of the element, rendered the first time it's needed (None if the element isn't ordered).
+        Only the strings that are asked for are built : rendering a tree doesn't build the ones of its descendants"""
+        if self._ieml_string is None and self._has_been_ordered:
+            self._ieml_string = ''.join(self.iter_ieml())
+        return self._ieml_string
+
+    @_str.setter
+    def _str(self, ieml_string):
+        self._ieml_string = ieml_string
+
+    def _ieml_fragments(self):
+        """The strings and child elements making up the IEML of the element, in order"""
+        raise NotImplementedError()
+
+    def _ieml_hyperlinks(self):
+        """For the elements that have their own hyperlinks, the path (as a tuple) => (literal, hypertext) list map"""
+        return None
+
+    def iter_ieml(self):
+        """Generates the IEML string of the element in chunks, walking the tree once. Nothing is concatenated, so
+        the string of a large hypertext can be written out (e.g., to a response) without ever being built.
+        The strings of the descendants that have already been rendered are used as is"""
+        # each stack entry is (string or element, hyperlinks map of the enclosing hypertext, path of the element)
+        stack = [(self, None, ())]
+        while stack:
+            item, hyperlinks, path = stack.pop()
+            if isinstance(item, str):
+                yield item
+                continue
+
+            is_tree = isinstance(item, TreeStructure)
+            if is_tree and item._ieml_string is not None and (not hyperlinks or item._has_own_hyperlinks):
+                yield item._ieml_string
+                continue
+
+            if is_tree and item._has_own_hyperlinks:
+                hyperlinks, path = item._ieml_hyperlinks(), ()
+            elif is_tree and item._starts_hyperlink_paths:
+                path = ()
+            elif hyperlinks:
+                # as in the hyperlinks table, the path goes from the text's proposition down to the element
+                path = path + (item,)
+                for literal, hypertext in reversed(hyperlinks.get(path, ())):
+                    stack += [(hypertext, None, ()), ('>', None, ()), (str(literal), None, ()), ('<', None, ())]
+
+            stack += [(fragment, hyperlinks, path) for fragment in reversed(item._ieml_fragments())]
+
+    @property
+    def sort_key(self):
+        """Tuple built from the children's sort keys (and the terms' canonical forms), which compares like the elements
+        themselves. Elements are sorted with key=sort_key rather than through their comparison methods"""
+        if self._sort_key is not None:
+            return self._sort_key
+        else:
+            raise CannotRenderElementWithoutOrdering()
+
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __eq__(self, other):
-        """Two propositions are equal if their children'list or tuple are equal"""
+        """Two propositions are equal if their children'list or tuple are equal. Elements with different
+        structural hashes can't be equal, so these are told apart without walking down their subtrees"""
+        if self is other:
+            return True
+        if self._hash is not None and getattr(other, "_hash", None) is not None and self._hash != other._hash:
+            return False
+        if type(self.children) is not type(other.children): # a frozen element's list has been made a tuple
+            return tuple(self.children) == tuple(other.children)
         return self.children == other.children
 
     def __hash__(self):
-        """Since the IEML string for any proposition AST is supposed to be unique, it can be used as a hash"""
+        """The structural hash when there's one, else the IEML string (which is supposed to be unique)'s hash"""
+        if self._hash is not None:
+            return self._hash
         return self.__str__().__hash__()
 
     def __iter__(self):
@@ -98,6 +203,20 @@ class TreeStructure:
 
     @property
     def metadata(self):
+        if self._frozen:
+            # frozen elements are shared by every request (parser cache, factory nodes), and their metadata
+            # comes from the database, which can change : it's fetched again once its collection has been written
+            generation = self._metadata_generation() # read first, so that a write happening meanwhile is seen
+            frozen_metadata = self._frozen_metadata
+            if frozen_metadata is not None and frozen_metadata[0] == generation:
+                return frozen_metadata[1]
+
+            metadata = self._retrieve_metadata_instance()
+            if metadata is None:
+                raise CannotRetrieveMetadata("Cannot retrieve metadata for this element")
+            self._frozen_metadata = (generation, metadata)
+            return metadata
+
         if self._metadata is None:
             self._metadata = self._retrieve_metadata_instance()
             if self._metadata is not None:
@@ -113,30 +232,81 @@ class TreeStructure:
     def _do_ordering(self):
         pass
 
+    def _compute_hash(self):
+        """Returns the structural hash of the (ordered) element, or None to fall back to the IEML string's hash"""
+        return None
+
+    def _compute_sort_key(self):
+        """Returns the sort key of the (ordered) element, or None if the class isn't ordered by key"""
+        return None
+
     def order(self):
         if self.is_ordered():
             return
 
         self._do_ordering()
         self._do_precompute_str()
+        self._hash = self._compute_hash()
+        self._sort_key = self._compute_sort_key()
         self._has_been_ordered = True
 
     def _do_checking(self):
         pass
 
     def check(self):
-        """Checks the IEML validity of the IEML proposition"""
-        for child in self.children:
-            child.check()
-            child.order()
-
-        if self.is_checked():
-            return
-
-        self._do_checking()
-        self._has_been_checked = True
-
-        self.order()
+        """Checks the IEML validity of the IEML proposition and of all its descendants, which are ordered as well.
+        The elements are checked in post-order, using a stack (so deep trees can't hit the recursion limit),
+        and the subtrees that have already been checked are skipped. Returns the number of elements
+        that actually had to be checked, which is 0 for an already checked tree"""
+        checked_count = 0
+        stack = [(self, False)]
+        while stack:
+            element, children_done = stack.pop()
+            if element.is_checked():
+                element.order()
+            elif children_done:
+                element._do_checking()
+                element._has_been_checked = True
+                element.order()
+                checked_count += 1
+            else:
+                stack.append((element, True))
+                for child in reversed(element.children):
+                    if isinstance(child, TreeStructure):
+                        stack.append((child, False))
+                    else: # terms are the leaves
+                        child.check()
+                        child.order()
+
+        return checked_count
+
+    def _do_freeze(self):
+        """Replaces the mutable containers of the element by immutable ones"""
+        self.children = tuple(self.children)
+
+    def _frozen_dependencies(self):
+        """The elements that have to be frozen along with this one"""
+        return self.children
+
+    def freeze(self):
+        """Checks the element, then makes it and all its descendants read-only : their containers are
+        turned into tuples, and setting any of their attributes (except for the caches) raises
+        FrozenElementModified. Frozen trees can be shared by every thread and cache without being copied.
+        Returns the element"""
+        self.check()
+        stack = [self]
+        while stack:
+            element = stack.pop()
+            if not isinstance(element, TreeStructure) or element._frozen: # already frozen subtrees are skipped
+                continue
+            element.check() # the hypertexts linked by the propositions aren't checked along with them
+            element._do_freeze()
+            element._frozen = True
+            stack.extend(element._frozen_dependencies())
+        return self
+
+    def is_frozen(self):
+        return self._frozen
 
     def is_checked(self):
         return self._has_been_checked
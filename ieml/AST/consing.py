@@ -0,0 +1,52 @@
+from weakref import WeakValueDictionary
+
+from helpers import Singleton
+from .propositions import Morpheme, Word, Clause, SuperClause, Sentence, SuperSentence
+
+
+class PropositionFactory(metaclass=Singleton):
+    """Hash-consing constructors for the propositions : structurally identical propositions are built,
+    checked and ordered only once, and then shared by every AST they appear in (null words, common
+    words, ...). The nodes are identified by the identity of their children, which are themselves shared.
+
+    The propositions it hands out are shared, so they're frozen (see TreeStructure.freeze). The factory
+    only keeps weak references, so a node lives as long as an AST uses it"""
+
+    def __init__(self):
+        self._nodes = WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _make(self, key, constructor):
+        node = self._nodes.get(key)
+        if node is None:
+            node = constructor()
+            node.freeze() # only registered once it's been checked, and found valid
+            self._nodes[key] = node
+        return node
+
+    def _make_additive(self, cls, children):
+        # the checking orders the children of the additive propositions, so their input order doesn't matter
+        return self._make((cls,) + tuple(sorted(map(id, children))), lambda: cls(list(children)))
+
+    def _make_multiplicative(self, cls, subst, attr, mode):
+        return self._make((cls, id(subst), id(attr), id(mode)), lambda: cls(subst, attr, mode))
+
+    def morpheme(self, terms):
+        return self._make_additive(Morpheme, terms)
+
+    def word(self, subst, mode=None):
+        return self._make((Word, id(subst), id(mode)), lambda: Word(subst, mode))
+
+    def clause(self, subst, attr, mode):
+        return self._make_multiplicative(Clause, subst, attr, mode)
+
+    def superclause(self, subst, attr, mode):
+        return self._make_multiplicative(SuperClause, subst, attr, mode)
+
+    def sentence(self, clauses):
+        return self._make_additive(Sentence, clauses)
+
+    def supersentence(self, superclauses):
+        return self._make_additive(SuperSentence, superclauses)
@@ -1,2 +1,3 @@
+from ieml.constants import MAX_NODES_IN_SENTENCE
+
 MAX_TERMS_IN_MORPHEME = 10
-MAX_NODES_IN_SENTENCE = 20
\ No newline at end of file
@@ -2,11 +2,18 @@ import logging
 
 import numpy as np
 
-from ieml.AST.constants import MAX_NODES_IN_SENTENCE
-from ieml.exceptions import InvalidGraphNode, TooManyNodesInGraph
-from ..exceptions import NodeHasNoParent, NodeHasTooMuchParents, NoRootNodeFound, SeveralRootNodeFound
+from ieml.AST.commons import by_sort_key
+from ieml.constants import MAX_NODES_IN_SENTENCE
+from ieml.exceptions import InvalidGraphNode, TooManyNodesInGraph, InvalidPropositionGraph, EdgeCreatesCycle
+from ..exceptions import NodeHasTooMuchParents, NoRootNodeFound, SeveralRootNodeFound, NodeInCycle, \
+    NodeNotConnected
 
 class AbstractGraph:
+    """Sparse representation of a graph : each node has an index (its position in the sorted nodes_list),
+    and the edges are stored as the children's indexes of each node, along with the in and out degrees
+    of the nodes. Building and checking the graph is thus linear in its number of nodes and edges"""
+    _node_sort_key = None # key function used to sort the nodes, if they can't be compared directly
+
     def __init__(self, transitions_list):
         # this table stores each parent node (node that is a substance in a clause) and
         # the clause that it is the substance of
@@ -15,8 +22,12 @@ class AbstractGraph:
         self.nodes_list = None
         self._build_node_list(transitions_list)
 
-        self.adjacency_matrix = None
-        self._build_adjacency_matrix()
+        self.node_indexes = None # node => its index in nodes_list
+        self.children_indexes = None # node index => indexes of its children
+        self.in_degrees = None
+        self.out_degrees = None
+        self._build_adjacency_lists()
+        self._adjacency_matrix = None
         self.graph_checker = GraphChecker(self)
 
         self.root_node = None  # this'll be set once the graph_checker has checked its existence and found it
@@ -37,27 +48,48 @@ class AbstractGraph:
 
         # since this list has been built from a set, every nodes are unique
         self.nodes_list = list(self.nodes_set)
-        self.nodes_list.sort()
-
-    def _build_adjacency_matrix(self):
-        """Once the graph is fully built, this function is called to build the adjacency matrix"""
-
-        self.adjacency_matrix = np.zeros((len(self.nodes_list), len(self.nodes_list)), dtype=bool)
-
-        # A cell is true if node x -> node y, else it's false
-        # thus, for each vertice, we set the (subst_node_index,attr_node_index) cell to true
-        for x in self.parent_nodes:
-            for y in self.parent_nodes[x]:
-                self.adjacency_matrix[self.nodes_list.index(x)][self.nodes_list.index(y[1])] = True
-
-    def check(self):
+        self.nodes_list.sort(key=self._node_sort_key)
+
+    def _build_adjacency_lists(self):
+        """Once the graph is fully built, this function is called to build the children lists and the degrees"""
+        self.node_indexes = {node: index for index, node in enumerate(self.nodes_list)}
+        self.children_indexes = [[] for node in self.nodes_list]
+        self.in_degrees = np.zeros(len(self.nodes_list), dtype=int)
+        self.out_degrees = np.zeros(len(self.nodes_list), dtype=int)
+
+        # several transitions can link the same two nodes (e.g. two hyperlinks to the same hypertext),
+        # they're only one edge
+        edges = set()
+        for x, transitions in self.parent_nodes.items():
+            x_index = self.node_indexes[x]
+            for transition in transitions:
+                edge = (x_index, self.node_indexes[transition[1]])
+                if edge not in edges:
+                    edges.add(edge)
+                    self.children_indexes[x_index].append(edge[1])
+                    self.out_degrees[x_index] += 1
+                    self.in_degrees[edge[1]] += 1
+
+    @property
+    def adjacency_matrix(self):
+        """Dense adjacency matrix of the graph, only built on demand : a cell is true if node x -> node y"""
+        if self._adjacency_matrix is None:
+            self._adjacency_matrix = np.zeros((len(self.nodes_list), len(self.nodes_list)), dtype=bool)
+            for x_index, children_indexes in enumerate(self.children_indexes):
+                self._adjacency_matrix[x_index, children_indexes] = True
+        return self._adjacency_matrix
+
+    def check(self, max_nodes=MAX_NODES_IN_SENTENCE):
+        """Checks the graph and finds its root. max_nodes is the limit on its number of nodes"""
         try:
             self.graph_checker.do_checks()
-        except InvalidGraphNode as err:
-            err.set_node_ieml(str(self.nodes_list[err.node_id]))
+        except InvalidPropositionGraph as err:
+            for error in err.errors:
+                if isinstance(error, InvalidGraphNode):
+                    error.set_node_ieml(str(self.nodes_list[error.node_id]))
             raise err
 
-        if len(self.nodes_list) > MAX_NODES_IN_SENTENCE:
+        if len(self.nodes_list) > max_nodes:
             raise TooManyNodesInGraph()
 
         self.root_node = self.nodes_list[self.graph_checker.root_node_index]
@@ -72,12 +104,14 @@ class HyperTextGraph(AbstractGraph):
 
 class PropositionGraph(AbstractGraph):
     """Stores a representation of the graph described in the visual web interface"""
+    _node_sort_key = by_sort_key
 
     def __init__(self, clause_list):
         super().__init__([(clause.subst, clause.attr) for clause in clause_list])
         self.clause_table = {(clause.subst, clause.attr): clause for clause in clause_list}
 
         self.generations_table = None # This'll store the clauses by *generations* upon a method call
+        self.ordered_clauses = None # set when the graph has been checked by a BatchGraphValidator
 
     def _build_generation_table(self):
         """This needs the reference of the root node to work"""
@@ -108,6 +142,9 @@ class PropositionGraph(AbstractGraph):
 
     def get_ordereded_clauses_list(self):
         """Returns the same set of clauses as the one in input, but put in the right order"""
+        if self.ordered_clauses is not None:
+            return list(self.ordered_clauses)
+
         if not self.has_been_checked:
             self.check()
 
@@ -115,59 +152,268 @@ class PropositionGraph(AbstractGraph):
         ordered_clauses = []
         for generation in self.generations_table:
             generation_clauses = [self.clause_table[transition] for transition in generation]
-            generation_clauses.sort() # clauses/sperclauses are totally ordered, so sort works on a list of those
+            generation_clauses.sort(key=by_sort_key)
             ordered_clauses += generation_clauses
 
         return ordered_clauses
 
 
+class BatchGraphValidator:
+    """Checks many proposition graphs at once. Their edges are packed into flat arrays (the nodes of each
+    graph being numbered from its offset), and the in-degrees, root counts and generation levels of all
+    the graphs are computed by a few vectorized operations, instead of a few per graph.
+
+    The graphs found valid are marked as checked, with their root and their ordered clauses. The other ones
+    are checked on their own, to get the same error as their check() method. max_nodes is the limit on the
+    number of nodes of each graph, as in AbstractGraph.check"""
+
+    def __init__(self, graphs, max_nodes=MAX_NODES_IN_SENTENCE):
+        self.graphs = list(graphs)
+        self.max_nodes = max_nodes
+        node_counts = [len(graph.nodes_list) for graph in self.graphs]
+        self.offsets = np.cumsum([0] + node_counts)
+        self.node_counts = np.array(node_counts, dtype=int)
+        self.graph_of_nodes = np.repeat(np.arange(len(self.graphs)), self.node_counts) # node => its graph's index
+
+        sources, targets = [], []
+        for graph, offset in zip(self.graphs, self.offsets.tolist()):
+            for index, children_indexes in enumerate(graph.children_indexes):
+                sources += [offset + index] * len(children_indexes)
+                targets += [offset + child_index for child_index in children_indexes]
+        self.sources = np.array(sources, dtype=int)
+        self.targets = np.array(targets, dtype=int)
+        self.levels = None # generation of each node (its depth from the root), -1 for the unreachable ones
+
+    def _per_graph_sums(self, node_values):
+        # (unlike a reduceat over the offsets, the graphs without any node get a sum of 0)
+        return np.bincount(self.graph_of_nodes, weights=node_values, minlength=len(self.graphs)).astype(int)
+
+    def _compute_levels(self, roots, is_candidate):
+        """Breadth-first traversal of all the candidate graphs at once, from their root"""
+        self.levels = np.full(self.offsets[-1], -1, dtype=int)
+        self.levels[roots & is_candidate[self.graph_of_nodes]] = 0
+        level = 0
+        while True:
+            reached = self.targets[self.levels[self.sources] == level]
+            reached = reached[self.levels[reached] == -1]
+            if len(reached) == 0:
+                break
+            level += 1
+            self.levels[reached] = level
+
+    def validate(self):
+        """Returns, for each graph, None if it's valid, else its error (holding all its errors)"""
+        if not self.graphs:
+            return []
+
+        in_degrees = np.bincount(self.targets, minlength=self.offsets[-1])
+        roots = in_degrees == 0
+        is_candidate = (self._per_graph_sums(roots) == 1) & (self._per_graph_sums(in_degrees > 1) == 0)
+        self._compute_levels(roots, is_candidate)
+        # with a single root and a parent for every other node, a node can only be out of reach if it's in a cycle
+        is_valid = is_candidate & (self._per_graph_sums(self.levels < 0) == 0) & (self.node_counts <= self.max_nodes)
+
+        verdicts = []
+        for graph, offset, valid in zip(self.graphs, self.offsets.tolist(), is_valid.tolist()):
+            if valid:
+                self._set_checked(graph, self.levels[offset:offset + len(graph.nodes_list)].tolist())
+                verdicts.append(None)
+            else:
+                try:
+                    graph.check(self.max_nodes)
+                    verdicts.append(None)
+                except InvalidPropositionGraph as err:
+                    verdicts.append(err)
+        return verdicts
+
+    @staticmethod
+    def _set_checked(graph, levels):
+        graph.root_node = graph.nodes_list[levels.index(0)]
+        graph.has_been_checked = True
+        if hasattr(graph, "clause_table"):
+            # the clauses by generation (the level of their substance), then by their sort key
+            clauses = [graph.clause_table[transition]
+                       for transitions in graph.parent_nodes.values() for transition in transitions]
+            graph.ordered_clauses = sorted(clauses, key=lambda clause: (levels[graph.node_indexes[clause.subst]],
+                                                                        clause.sort_key))
+
+
+class IncrementalTopologicalOrder:
+    """Topological order of a directed acyclic graph, kept up to date as edges are added (Pearce and Kelly's
+    algorithm). An edge that already agrees with the order costs nothing, otherwise only the nodes between its
+    two ends in the order are visited, and reordered among themselves. An edge that would create a cycle is
+    rejected (EdgeCreatesCycle is raised) and the graph is left unchanged"""
+
+    def __init__(self):
+        self.nodes = [] # node index => node
+        self._indexes = {} # node => node index
+        self._positions = [] # node index => position of the node in the order
+        self._children = [] # node index => set of its children indexes
+        self._parents = []
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self._indexes
+
+    def __iter__(self):
+        """The nodes, parents first"""
+        return iter(self.nodes[index] for index in sorted(range(len(self.nodes)), key=self._positions.__getitem__))
+
+    def add_node(self, node):
+        """Adds the node (if it's not there already) at the end of the order, and returns its index"""
+        if node not in self._indexes:
+            self._indexes[node] = len(self.nodes)
+            self.nodes.append(node)
+            self._positions.append(len(self._positions))
+            self._children.append(set())
+            self._parents.append(set())
+        return self._indexes[node]
+
+    def add_edge(self, source, target):
+        source_index, target_index = self.add_node(source), self.add_node(target)
+        if target_index in self._children[source_index]:
+            return
+
+        lower_bound, upper_bound = self._positions[target_index], self._positions[source_index]
+        if lower_bound <= upper_bound: # the target is before the source, the nodes in between have to be reordered
+            forward = self._visit(target_index, self._children, lambda position: position <= upper_bound)
+            if source_index in forward:
+                error = EdgeCreatesCycle([source_index, target_index])
+                error.nodes = [source, target]
+                raise error
+            backward = self._visit(source_index, self._parents, lambda position: position >= lower_bound)
+            self._reorder(backward, forward)
+
+        self._children[source_index].add(target_index)
+        self._parents[target_index].add(source_index)
+
+    def _visit(self, start_index, neighbours, is_in_region):
+        """Indexes of the nodes reachable from start_index, through neighbours, without leaving the region"""
+        visited, stack = {start_index}, [start_index]
+        while stack:
+            index = stack.pop()
+            for neighbour_index in neighbours[index]:
+                if neighbour_index not in visited and is_in_region(self._positions[neighbour_index]):
+                    visited.add(neighbour_index)
+                    stack.append(neighbour_index)
+        return visited
+
+    def _reorder(self, backward, forward):
+        """Puts the nodes leading to the source before the ones reachable from the target, using their positions"""
+        by_position = self._positions.__getitem__
+        indexes = sorted(backward, key=by_position) + sorted(forward, key=by_position)
+        for index, position in zip(indexes, sorted(map(by_position, indexes))):
+            self._positions[index] = position
+
+
 class GraphChecker:
     """Takes care of checking if a graph describing an IEMl proposition respects the IEML structura
-    rules """
+    rules. All the errors of the graph are found at once, in time linear in its size"""
 
     def __init__(self, graph):
-        self.adjacency_matrix = graph.adjacency_matrix
-        self.node_count = self.adjacency_matrix.shape[0]
-        self.ones_bool = np.full(self.node_count, True, dtype=bool)
-        self.ones_int = np.full(self.node_count, 1,  dtype=int)
-        self.row_and = np.dot(self.adjacency_matrix, self.ones_bool)
-        self.column_and = np.dot(self.adjacency_matrix.transpose(), self.ones_bool)
+        self.children_indexes = graph.children_indexes
+        self.in_degrees = graph.in_degrees
+        self.node_count = len(self.in_degrees)
+        self.root_node_index = None
 
     def do_checks(self):
-        """Runs the multiple checks the graph checker is in charge of, and 'finds' the graph root"""
-        self._check_has_unique_root()
-        self._check_only_unique_parent()
-
-    def _check_has_unique_root(self):
-        """Using the adjacency matrix, checks that the graph has a unique root, and that this root
-        has at least one child"""
-        # checking the "root count"
-        has_parent_count = np.dot(self.column_and.astype(dtype=int), self.column_and.astype(dtype=int))
-        root_count = self.node_count - has_parent_count
-        if root_count == 0: # only one root
-            raise NoRootNodeFound()
-        elif root_count > 1:# more than one root
-            raise SeveralRootNodeFound()
+        """Runs the multiple checks the graph checker is in charge of, and 'finds' the graph root.
+        If the graph isn't a tree, raises the first of its errors, which holds all of them"""
+        errors = self.find_errors()
+        if errors:
+            errors[0].errors = errors
+            raise errors[0]
+
+    def find_errors(self):
+        """Returns the list of the graph's errors : the root's (none, or several roots), then the nodes having
+        several parents, the nodes in a cycle, and the nodes that aren't connected to the root's component"""
+        errors = self._find_root_errors()
+        errors += [NodeHasTooMuchParents(int(index)) for index in np.flatnonzero(self.in_degrees > 1)]
+
+        parents_indexes = [[] for i in range(self.node_count)]
+        for index, children_indexes in enumerate(self.children_indexes):
+            for child_index in children_indexes:
+                parents_indexes[child_index].append(index)
+
+        errors += [NodeInCycle(index) for index in self._find_cycles_nodes(parents_indexes)]
+        errors += [NodeNotConnected(index) for index in self._find_disconnected_nodes(parents_indexes)]
+        return errors
+
+    def _find_root_errors(self):
+        """Using the in-degrees, checks that the graph has a unique root"""
+        # the roots are the nodes without any parent
+        root_indexes = np.flatnonzero(self.in_degrees == 0)
+        if len(root_indexes) == 0:
+            return [NoRootNodeFound()]
+        elif len(root_indexes) > 1:
+            return [SeveralRootNodeFound(int(index) for index in root_indexes)]
         else :
             #saving the index of the root_node
-            for index, node_xor in enumerate(self.column_and):
-                if not node_xor:
-                    self.root_node_index = index
-                    logging.debug("Found root of graph : node %i" % index)
-                    break
-
-    def _check_only_unique_parent(self):
-        """checks that each element of the graph only has one parent (making the graph a tree).
-        This check depends on the root_node check """
-        # getting the "incoming" vertices count for each node in an array
-        incoming_connection_count = np.dot(self.adjacency_matrix.transpose().astype(dtype=int), self.ones_int)
-
-        # for all node, except the root, there can and should only be ONE parent.
-        for index, conn_sum in enumerate(incoming_connection_count):
-            if conn_sum != 1 and index != self.root_node_index:
-                if conn_sum > 1:
-                    raise NodeHasTooMuchParents(index)
-                else:
-                    raise NodeHasNoParent(index)
-
-
+            self.root_node_index = int(root_indexes[0])
+            logging.debug("Found root of graph : node %i" % self.root_node_index)
+            return []
+
+    def _find_cycles_nodes(self, parents_indexes):
+        """Returns the sorted indexes of the nodes that are on a cycle (or between two cycles) : the nodes left once
+        the ones that can be reached without going through a cycle, and then the ones from which a leaf can be reached
+        without going through one, have been pruned"""
+        # pruning from the roots (Kahn's algorithm)
+        remaining_in_degrees = self.in_degrees.tolist()
+        stack = [index for index, degree in enumerate(remaining_in_degrees) if degree == 0]
+        pruned = [False] * self.node_count
+        while stack:
+            index = stack.pop()
+            pruned[index] = True
+            for child_index in self.children_indexes[index]:
+                remaining_in_degrees[child_index] -= 1
+                if remaining_in_degrees[child_index] == 0:
+                    stack.append(child_index)
+
+        if all(pruned):
+            return []
+
+        # then from the leaves, among the nodes that are left
+        remaining_out_degrees = [sum(not pruned[child_index] for child_index in children_indexes)
+                                 for children_indexes in self.children_indexes]
+        stack = [index for index in range(self.node_count) if not pruned[index] and remaining_out_degrees[index] == 0]
+        while stack:
+            index = stack.pop()
+            pruned[index] = True
+            for parent_index in parents_indexes[index]:
+                if not pruned[parent_index]:
+                    remaining_out_degrees[parent_index] -= 1
+                    if remaining_out_degrees[parent_index] == 0:
+                        stack.append(parent_index)
+
+        return [index for index in range(self.node_count) if not pruned[index]]
+
+    def _find_disconnected_nodes(self, parents_indexes):
+        """Returns the sorted indexes of the nodes outside of the main connected component (ignoring the edges'
+        direction), which is the root's, or the biggest one if there isn't a single root"""
+        components = [None] * self.node_count
+        component_sizes = []
+        for start_index in range(self.node_count):
+            if components[start_index] is not None:
+                continue
+            component = len(component_sizes)
+            component_sizes.append(0)
+            components[start_index] = component
+            stack = [start_index]
+            while stack:
+                index = stack.pop()
+                component_sizes[component] += 1
+                for neighbour_index in self.children_indexes[index] + parents_indexes[index]:
+                    if components[neighbour_index] is None:
+                        components[neighbour_index] = component
+                        stack.append(neighbour_index)
+
+        if len(component_sizes) <= 1:
+            return []
+
+        if self.root_node_index is not None:
+            main_component = components[self.root_node_index]
+        else:
+            main_component = component_sizes.index(max(component_sizes))
+        return [index for index in range(self.node_count) if components[index] != main_component]
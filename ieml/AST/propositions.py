@@ -1,23 +1,52 @@
 from functools import total_ordering
 
 from .terms import Term
-from .commons import TreeStructure, AbstractPropositionMetaclass, PropositionPath
+from .commons import TreeStructure, AbstractPropositionMetaclass, PropositionPath, by_sort_key, join_fragments
 from .constants import MAX_TERMS_IN_MORPHEME
 from .propositional_graph import PropositionGraph
 from .tree_metadata import ClosedPropositionMetadata, NonClosedPropositionMetadata
 from ieml.exceptions import IndistintiveTermsExist, InvalidConstructorParameter, \
-    InvalidClauseComparison, SentenceHasntBeenChecked, TooManyTermsInMorpheme
+    InvalidClauseComparison, SentenceHasntBeenChecked, TooManyTermsInMorpheme, FrozenElementModified
 
 
 class ClosedProposition:
     """Interface class added to propositions that can be closed to be used in a USL
     These propositions, even if they're not truly closed in the script, are the only one
     that can link to USL's"""
+    # being a mixin, it can't have slots of its own (CPython only allows one base with a non-empty layout),
+    # the closed propositions declare these ones instead
+    __slots__ = ()
+    SLOTS = ('hyperlink', '_is_promotion', '_promoted_from', '_descendants')
+
     def __init__(self):
         super().__init__()
         self.hyperlink = []
         self._is_promotion = None
         self._promoted_from = None # reference to the promoted proposition/term
+        self._descendants = None # structural hash => descendants having that hash, see descendants_index
+
+    def descendants_index(self):
+        """Returns a dict mapping the structural hash of each descendant (terms included) to the descendants
+        having that hash, built the first time it's needed. Returns None if the proposition hasn't been checked,
+        since its descendants don't have their hash yet"""
+        if self._descendants is None and self.is_checked():
+            index, visited, stack = {}, set(), list(self.children)
+            while stack:
+                node = stack.pop()
+                if id(node) in visited: # identical subtrees are shared
+                    continue
+                visited.add(id(node))
+                index.setdefault(hash(node), []).append(node)
+                if not isinstance(node, Term):
+                    stack.extend(node.children)
+            self._descendants = index
+
+        return self._descendants
+
+    def closed_descendants(self):
+        """IEML strings of the terms and closed propositions contained in this one, itself excluded"""
+        return sorted({str(node) for nodes in self.descendants_index().values() for node in nodes
+                       if isinstance(node, (Term, ClosedProposition))})
 
     @property
     def is_promotion(self):
@@ -39,6 +68,9 @@ class ClosedProposition:
             return self
 
     def add_hyperlink_list(self, usl_list):
+        if self._frozen:
+            raise FrozenElementModified(self, "hyperlink")
+
         # check that all literals are not None
         if any(map(lambda h: h[0] is not None, usl_list)):
             raise InvalidConstructorParameter()
@@ -51,16 +83,25 @@ class ClosedProposition:
     def _retrieve_metadata_instance(self):
         return ClosedPropositionMetadata(self)
 
+    def _metadata_generation(self):
+        return ClosedPropositionMetadata.generation()
+
 
 class NonClosedProposition:
     """This class acts as an interface for propositions that *cannot* be closed"""
+    __slots__ = ()
+
     def _retrieve_metadata_instance(self):
         return NonClosedPropositionMetadata(self)
 
+    def _metadata_generation(self):
+        return NonClosedPropositionMetadata.generation()
+
 
 class AbstractProposition(TreeStructure, metaclass=AbstractPropositionMetaclass):
     """This class is the parent class of all propositions, namely Morpheme, Word,
     Clause, Sentence, Superclause, Supersentence"""
+    __slots__ = ()
 
     class RenderSymbols:
         """This class is just a container for the rendering symbols"""
@@ -78,6 +119,11 @@ class AbstractProposition(TreeStructure, metaclass=AbstractPropositionMetaclass)
         """Tests if the input proposition is contained in the current one, or in one of its child"""
         if proposition == self:
             return True
+
+        index = self.descendants_index() if isinstance(self, ClosedProposition) else None
+        if index is not None and (isinstance(proposition, Term) or proposition.is_ordered()):
+            # the hash only selects the candidates, equality still has the last word in case of a collision
+            return any(node == proposition for node in index.get(hash(proposition), ()))
         else: # could be contained in the children proposition
             if proposition.__class__ < self.__class__:
                 # testing if it's contained in one of the child
@@ -90,22 +136,37 @@ class AbstractProposition(TreeStructure, metaclass=AbstractPropositionMetaclass)
                 # can't be contained if the level is higher
                 return False
 
+    def _compute_hash(self):
+        # the children are ordered before their parent, so each node only hashes its children's cached hashes
+        return hash(tuple(hash(child) for child in self.children))
+
+    def _compute_sort_key(self):
+        # same for the sort keys, the key of a node is made of the (cached) keys of its children
+        return tuple(child.sort_key for child in self.children)
+
+    def __gt__(self, other):
+        return self.sort_key > other.sort_key
+
+    def _do_freeze(self):
+        super()._do_freeze()
+        if isinstance(self, ClosedProposition):
+            self.hyperlink = tuple(self.hyperlink)
+
+    def _frozen_dependencies(self):
+        if isinstance(self, ClosedProposition):
+            # the hypertexts the proposition links to
+            return list(self.children) + [hypertext for literal, hypertext in self.hyperlink]
+        return self.children
+
     def _gather_child_links(self, current_path):
         path = current_path + [self]
         return [couple for sublist in [child.gather_hyperlinks(path) for child in self.children]
                 for couple in sublist]
 
-    def render_hyperlinks(self, hyperlinks, path):
-        current_path = PropositionPath(path.path, self)
-        result = self._do_render_hyperlinks(hyperlinks, current_path)
-
-        if current_path in hyperlinks:
-            result += ''.join(map(lambda t: "<" + str(t[0]) + ">" + str(t[1]), hyperlinks[current_path]))
-
-        return result
 
 
 class AbstractAdditiveProposition(AbstractProposition):
+    __slots__ = ()
 
     def __init__(self, child_elements):
         super().__init__()
@@ -124,29 +185,13 @@ class AbstractAdditiveProposition(AbstractProposition):
         else:
             return False
 
-    def _do_precompute_str(self):
-        self._str = self.RenderSymbols.left_bracket + \
-                    self.RenderSymbols.plus.join([str(element) for element in self.children]) + \
-                    self.RenderSymbols.right_bracket
-
-    def __gt__(self, other):
-        max_length = max(len(self.children), len(other.children))
-        for i in range(max_length):
-            if len(self.children) <= i: # this morpheme is a suffix of the other one, it's "smaller"
-                return False
-            elif len(other.children) <= i: # the morpheme is a suffix of the current one, so current one is "bigger"
-                return True
-            else:
-                if self.children[i] != other.children[i]:
-                    return self.children[i] > other.children[i]
-
-    def _do_render_hyperlinks(self, hyperlinks, path):
-        return self.RenderSymbols.left_bracket + \
-               self.RenderSymbols.plus.join([element.render_hyperlinks(hyperlinks, path) for element in self.children])+\
-               self.RenderSymbols.right_bracket
+    def _ieml_fragments(self):
+        return join_fragments(self.RenderSymbols.left_bracket, self.RenderSymbols.plus, self.children,
+                              self.RenderSymbols.right_bracket)
 
 
 class AbstractMultiplicativeProposition(AbstractProposition):
+    __slots__ = ('subst', 'attr', 'mode')
 
     def __init__(self, child_subst, child_attr=None, child_mode=None):
         super().__init__()
@@ -155,32 +200,19 @@ class AbstractMultiplicativeProposition(AbstractProposition):
         self.mode = child_mode
         self.children = (self.subst, self.attr, self.mode)
 
-    def _do_render_hyperlinks(self, hyperlinks, path):
-        return self.RenderSymbols.left_parent + \
-               self.subst.render_hyperlinks(hyperlinks, path) + self.RenderSymbols.times + \
-               self.attr.render_hyperlinks(hyperlinks, path) + self.RenderSymbols.times + \
-               self.mode.render_hyperlinks(hyperlinks, path) + self.RenderSymbols.right_parent
-
-    def _do_precompute_str(self):
-        self._str = self.RenderSymbols.left_parent + \
-               str(self.subst) + self.RenderSymbols.times + \
-               str(self.attr) + self.RenderSymbols.times + \
-               str(self.mode) + self.RenderSymbols.right_parent
+    def _ieml_fragments(self):
+        return join_fragments(self.RenderSymbols.left_parent, self.RenderSymbols.times, self.children,
+                              self.RenderSymbols.right_parent)
 
 
 @total_ordering
 class Morpheme(AbstractAdditiveProposition, NonClosedProposition):
+    __slots__ = ()
+    level_order = 1
 
-    def _do_precompute_str(self):
-        self._str = self.RenderSymbols.left_parent + \
-                    self.RenderSymbols.plus.join([str(element) for element in self.children]) + \
-                    self.RenderSymbols.right_parent
-
-    def _do_render_hyperlinks(self, hyperlinks, path):
-        return self.RenderSymbols.left_parent + \
-               self.RenderSymbols.plus.join(
-                   [element.render_hyperlinks(hyperlinks, path) for element in self.children]) + \
-               self.RenderSymbols.right_parent
+    def _ieml_fragments(self):
+        return join_fragments(self.RenderSymbols.left_parent, self.RenderSymbols.plus, self.children,
+                              self.RenderSymbols.right_parent)
 
     def _do_checking(self):
         # then we check the terms for unicity by turning them into a set
@@ -197,12 +229,13 @@ class Morpheme(AbstractAdditiveProposition, NonClosedProposition):
 
     def _do_ordering(self):
         """Orders the terms"""
-        # terms have the TotalOrder decorator, as such, they can be automatically ordered
-        self.children.sort()
+        self.children.sort(key=by_sort_key)
 
 
 @total_ordering
 class Word(AbstractMultiplicativeProposition, ClosedProposition):
+    __slots__ = ClosedProposition.SLOTS
+    level_order = 2
 
     def __init__(self, child_subst, child_mode=None):
         super().__init__(child_subst)
@@ -227,36 +260,10 @@ class Word(AbstractMultiplicativeProposition, ClosedProposition):
         else:
             self._is_promotion = False
 
-    def _do_render_hyperlinks(self, hyperlinks, path):
-        if self.mode is None:
-            result = self.RenderSymbols.left_bracket + \
-                     self.subst.render_hyperlinks(hyperlinks, path) + self.RenderSymbols.right_bracket
-        else:
-            result = self.RenderSymbols.left_bracket + \
-                     self.subst.render_hyperlinks(hyperlinks, path) + self.RenderSymbols.times + \
-                     self.mode.render_hyperlinks(hyperlinks, path) + self.RenderSymbols.right_bracket
-        return result
-
-    def _do_precompute_str(self):
-        if self.mode is None:
-            self._str = self.RenderSymbols.left_bracket + \
-                        str(self.subst) + \
-                        self.RenderSymbols.right_bracket
-        else:
-            self._str = self.RenderSymbols.left_bracket + \
-                        str(self.subst) + self.RenderSymbols.times + \
-                        str(self.mode) + self.RenderSymbols.right_bracket
-
-    def __gt__(self, other):
-        if self.subst != other.subst:
-            return self.subst > other.subst
-        elif self.mode is not None:
-            if other.mode is not None:
-                return self.mode > other.mode
-            else:
-                return True
-        else:
-            return False
+    def _ieml_fragments(self):
+        # the children are (subst,) or (subst, mode)
+        return join_fragments(self.RenderSymbols.left_bracket, self.RenderSymbols.times, self.children,
+                              self.RenderSymbols.right_bracket)
 
     def gather_hyperlinks(self, current_path):
         # since morphemes cannot have hyperlinks, we don't gather links for the underlying children
@@ -266,16 +273,17 @@ class Word(AbstractMultiplicativeProposition, ClosedProposition):
 
 @total_ordering
 class AbstractClause(AbstractMultiplicativeProposition, NonClosedProposition):
+    __slots__ = ()
+
+    def _compute_sort_key(self):
+        # clauses are ordered by their substance, then by their attribute
+        return self.subst.sort_key, self.attr.sort_key
 
     def __gt__(self, other):
-        if self.subst != other.subst:
-            # the comparison depends on the terms of the two substs
-            return self.subst > other.subst
-        else:
-            if self.attr != other.attr:
-                return self.attr > other.attr
-            else:
-                raise InvalidClauseComparison(self, other)
+        if self.sort_key == other.sort_key:
+            raise InvalidClauseComparison(self, other)
+        return self.sort_key > other.sort_key
+
     @property
     def is_null(self):
         return self.subst.is_null and self.attr.is_null and self.mode.is_null
@@ -285,15 +293,18 @@ class AbstractClause(AbstractMultiplicativeProposition, NonClosedProposition):
 
 
 class Clause(AbstractClause):
-    pass
+    __slots__ = ()
+    level_order = 3
 
 
 class SuperClause(AbstractClause):
-    pass
+    __slots__ = ()
+    level_order = 5
 
 
 @total_ordering
 class AbstractSentence(AbstractAdditiveProposition, ClosedProposition):
+    __slots__ = ClosedProposition.SLOTS + ('graph',)
 
     def __init__(self, child_elements):
         super().__init__(child_elements)
@@ -307,8 +318,9 @@ class AbstractSentence(AbstractAdditiveProposition, ClosedProposition):
 
     def _do_checking(self):
         # if it's a single-clause list, no graph building
-        if len(self.children) != 1:
+        if len(self.children) != 1 and (self.graph is None or not self.graph.has_been_checked):
             # then, we build the (super)sentence's graph using the (super)clause list
+            # (unless it's been checked along with other sentences' graphs, see tools.check_sentences)
             self.graph = PropositionGraph(self.children)
             self.graph.check() #the graph does some checking
 
@@ -329,12 +341,16 @@ class AbstractSentence(AbstractAdditiveProposition, ClosedProposition):
 
 
 class Sentence(AbstractSentence):
+    __slots__ = ()
+    level_order = 4
 
     def __init__(self, child_elements):
         super().__init__(child_elements)
 
 
 class SuperSentence(AbstractSentence):
+    __slots__ = ()
+    level_order = 6
 
     def __init__(self, child_elements):
         super().__init__(child_elements)
@@ -1,23 +1,31 @@
 from functools import total_ordering
 
-from .commons import PropositionPath, AbstractPropositionMetaclass
+from .commons import AbstractPropositionMetaclass
 from .tree_metadata import TermMetadata
+from helpers import Singleton
 from ieml.exceptions import TermComparisonFailed, CannotRetrieveMetadata, IEMLTermNotFoundInDictionnary
 
 
 @total_ordering
 class Term(metaclass=AbstractPropositionMetaclass):
+    __slots__ = ('ieml', 'objectid', 'canonical_forms', 'rank', '_metadata')
+    level_order = 0
 
     def __init__(self, ieml_string):
-        if ieml_string[0] == '[' and ieml_string[-1] == ']':
-            self.ieml = ieml_string[1:-1]
-        else:
-            self.ieml = ieml_string
+        self.ieml = self.strip_brackets(ieml_string)
 
         self.objectid = None
         self.canonical_forms = None
+        self.rank = None # position of the term in the dictionary's canonical order, if the dictionary provides it
         self._metadata = None
 
+    @staticmethod
+    def strip_brackets(ieml_string):
+        if ieml_string[0] == '[' and ieml_string[-1] == ']':
+            return ieml_string[1:-1]
+        else:
+            return ieml_string
+
     def __str__(self):
         return "[" + self.ieml + "]"
 
@@ -37,7 +45,13 @@ class Term(metaclass=AbstractPropositionMetaclass):
         return proposition == self
 
     def __gt__(self, other):
-        # we use the DB's canonical forms
+        # the dictionary's integer ranks follow the canonical order, so when both terms have one it's all we need
+        if self.rank is not None and other.rank is not None:
+            if self.rank != other.rank:
+                return self.rank > other.rank
+            raise TermComparisonFailed(self.ieml, other.ieml)
+
+        # else we use the DB's canonical forms
         # if the term has MORE canonical sequences, it's "BIGGER", so GT is TRUE
         if len(self.canonical_forms) != len(other.canonical_forms):
             return len(self.canonical_forms) > len(other.canonical_forms)
@@ -50,11 +64,20 @@ class Term(metaclass=AbstractPropositionMetaclass):
 
         raise TermComparisonFailed(self.ieml, other.ieml)
 
+    def __lt__(self, other):
+        # defined explicitly since it's the one used by sort()
+        return other.__gt__(self)
+
+    @property
+    def sort_key(self):
+        """Same order as __gt__ : the dictionary's integer rank. Every checked term has one (the DictionaryQueries
+        compute them when the collection doesn't store them), so the orderings only compare integers"""
+        return self.rank
+
     @property
     def is_null(self):
-        null_term = Term("E:")
-        null_term.check()
-        return self == null_term
+        # the registry's null term is the only null term of the current dictionary generation
+        return self is TermRegistry().null_term
 
     @property
     def level(self):
@@ -80,30 +103,127 @@ class Term(metaclass=AbstractPropositionMetaclass):
     def _retrieve_metadata_instance(self):
         return TermMetadata(self)
 
-    def render_hyperlinks(self, hyperlinks, path):
-        current_path = PropositionPath(path.path, self)
-        result = self._do_render_hyperlinks(hyperlinks, current_path)
-
-        if current_path in hyperlinks:
-            result += ''.join(map(lambda e: "<" + str(e[0]) + ">" + str(e[1]), hyperlinks[current_path]))
+    def _metadata_generation(self):
+        return TermMetadata.generation()
 
-        return result
-
-    def _do_render_hyperlinks(self, hyperlinks, path):
-        return "[" + self.ieml + "]"
+    def _ieml_fragments(self):
+        return (str(self),)
 
     def check(self):
         """Checks that the term exists in the database, and if found, stores the terms's objectid"""
+        if self.objectid is not None:
+            return # already resolved against the dictionary
+
         from models.base_queries import DictionaryQueries
         TermMetadata.set_connector(DictionaryQueries())
         try:
-            self.objectid = self.metadata["OBJECT_ID"]
-            self.canonical_forms = self.metadata["CANONICAL"]
+            objectid, canonical_forms, rank = (self.metadata["OBJECT_ID"], self.metadata["CANONICAL"],
+                                               self.metadata["RANK"])
         except TypeError:
             raise IEMLTermNotFoundInDictionnary(self.ieml)
+        self._publish(objectid, canonical_forms, rank)
+
+    def _publish(self, objectid, canonical_forms, rank):
+        """Sets what was retrieved from the dictionary. The object id is set last : once it's set, check()
+        returns right away, so a thread checking the term at the same time never sees it half resolved"""
+        self.canonical_forms, self.rank = canonical_forms, rank
+        self.objectid = objectid
+
+    def resolve(self, db_entry):
+        """Checks the term using a dictionary entry that has already been fetched (e.g., in a batch)"""
+        self._metadata = TermMetadata.from_db_entry(self, db_entry)
+        self.check()
+
+    def uncheck(self):
+        """Forgets what was retrieved from the dictionary, so that the next check fetches it again"""
+        self.objectid = None
+        self.canonical_forms = None
+        self.rank = None
+        self._metadata = None
 
     def order(self):
         pass
 
     def get_promotion_origin(self):
-        return self
\ No newline at end of file
+        return self
+
+
+NULL_TERM_IEML = "E:"
+
+
+class TermRegistry(metaclass=Singleton):
+    """Hands out a single shared Term instance per IEML string, already checked against the dictionary.
+    Terms are never modified once checked, so these instances can be used in as many ASTs as needed.
+    The registry is emptied when the dictionary's generation changes, since the object ids and ranks
+    of the terms may have changed with it. It also owns the null term, resolved again for every generation"""
+
+    def __init__(self):
+        self._terms = {}
+        self._null_term = None
+        self.generation = None # generation of the dictionary the registered terms were checked against
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, ieml_string):
+        return Term.strip_brackets(ieml_string) in self._terms
+
+    def _check_generation(self):
+        from models.base_queries import DictionaryQueries
+        generation = DictionaryQueries().generation()
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+
+    @property
+    def null_term(self):
+        """The checked null term of the current dictionary generation"""
+        self._check_generation()
+        return self._null_term
+
+    def get(self, ieml_string):
+        """Returns the interned instance for that IEML string. Raises IEMLTermNotFoundInDictionnary
+        if the term doesn't exist, in which case nothing is registered"""
+        self._check_generation()
+        ieml = Term.strip_brackets(ieml_string)
+        term = self._terms.get(ieml)
+        if term is None:
+            term = Term(ieml)
+            term.check()
+            self._terms[ieml] = term
+        else:
+            term.check() # no-op once the term has been resolved
+        return term
+
+    def resolve(self, ieml_strings):
+        """Registers all the given terms at once, fetching the ones that aren't registered yet from the dictionary
+        in a single lookup. The terms that aren't in the dictionary are left out (get raises for them)"""
+        from models.base_queries import DictionaryQueries
+        self._check_generation()
+        missing = {Term.strip_brackets(ieml_string) for ieml_string in ieml_strings} - self._terms.keys()
+        if not missing:
+            return
+
+        for ieml, db_entry in DictionaryQueries().exact_ieml_terms_search(missing).items():
+            term = Term(ieml)
+            term.resolve(db_entry)
+            self._terms[ieml] = term
+
+    def intern(self, ieml_string, objectid, canonical_forms, rank=None):
+        """Returns the interned instance for that IEML string. If there's none, registers a term built from
+        the given dictionary data, without querying the dictionary (e.g., for ASTs reloaded from their binary form)"""
+        self._check_generation()
+        ieml = Term.strip_brackets(ieml_string)
+        term = self._terms.get(ieml)
+        if term is None:
+            term = Term(ieml)
+            term._publish(objectid, canonical_forms, rank)
+            self._terms[ieml] = term
+        return term
+
+    def clear(self):
+        """Forgets every interned term. The null term is resolved again as a new instance, the ones of the
+        previous generations are never modified. If it can't be resolved, the registry is left as it was"""
+        null_term = Term(NULL_TERM_IEML)
+        null_term.check()
+        self._terms, self._null_term = {null_term.ieml: null_term}, null_term
@@ -1,10 +1,14 @@
 import random
 
+import numpy as np
+
 from ieml.AST.constants import MAX_TERMS_IN_MORPHEME, MAX_NODES_IN_SENTENCE
-from ieml.exceptions import CannotPromoteToLowerLevel, CannotDemoteProposition, PropositionNotIncluded
+from ieml.exceptions import CannotPromoteToLowerLevel, CannotDemoteProposition, PropositionNotIncluded, ASTException
+from ieml.AST.propositional_graph import PropositionGraph, BatchGraphValidator
 from .propositions import Word, Morpheme, Clause, Sentence, SuperSentence, SuperClause, \
     AbstractAdditiveProposition, AbstractClause, AbstractProposition
-from ieml.AST import Term
+from ieml.AST.terms import Term, TermRegistry
+from .consing import PropositionFactory
 from helpers import Singleton
 from models import DictionaryQueries
 
@@ -24,27 +28,41 @@ class SuperSentenceGraph:
     multiplicative_type = SuperClause
     additive_type = SuperSentence
 
-NULL_TERM = Term("E:")
-NULL_MORPHEME = Morpheme([NULL_TERM])
-NULL_WORD = Word(NULL_MORPHEME)
-NULL_CLAUSE = Clause(NULL_WORD, NULL_WORD, NULL_WORD)
-NULL_SENTENCE = Sentence([NULL_CLAUSE])
-NULL_SUPERCLAUSE = SuperClause(NULL_SENTENCE, NULL_SENTENCE, NULL_SENTENCE)
-NULL_SUPERSENTENCE = SuperSentence([NULL_SUPERCLAUSE])
+
+class NullElements(metaclass=Singleton):
+    """The null element of each level, built by the PropositionFactory from the registry's null term (so
+    that the parsed null elements are the same nodes). They're built again along with the null term,
+    when the dictionary's generation changes"""
+
+    def __init__(self):
+        self._null_elements_table = None
+
+    def get(self, ast_level_type):
+        null_term = TermRegistry().null_term
+        null_elements_table = self._null_elements_table
+        if null_elements_table is None or null_elements_table[Term] is not null_term:
+            factory = PropositionFactory()
+            null_morpheme = factory.morpheme([null_term])
+            null_word = factory.word(null_morpheme)
+            null_clause = factory.clause(null_word, null_word, null_word)
+            null_sentence = factory.sentence([null_clause])
+            null_superclause = factory.superclause(null_sentence, null_sentence, null_sentence)
+            null_elements_table = {
+                Term : null_term,
+                Morpheme : null_morpheme,
+                Word : null_word,
+                Clause : null_clause,
+                Sentence : null_sentence,
+                SuperClause : null_superclause,
+                SuperSentence : factory.supersentence([null_superclause])
+            }
+            self._null_elements_table = null_elements_table # swapped in once it's complete
+        return null_elements_table[ast_level_type]
 
 
 def null_element(ast_level_type):
-    """Returns the null element for the input ast_level_type"""
-    null_elements_table = {
-        Term : NULL_TERM,
-        Morpheme : NULL_MORPHEME,
-        Word : NULL_WORD,
-        Clause : NULL_CLAUSE,
-        Sentence : NULL_SENTENCE,
-        SuperClause : NULL_SUPERCLAUSE,
-        SuperSentence : NULL_SUPERSENTENCE
-    }
-    return null_elements_table[ast_level_type]
+    """Returns the null element for the input ast_level_type, for the current dictionary generation"""
+    return NullElements().get(ast_level_type)
 
 
 def promote_once(proposition):
@@ -96,18 +114,59 @@ def demote_to(proposition, level_type):
         return demote_to(demote_once(proposition), level_type)
 
 
+def check_sentences(sentences, max_nodes=MAX_NODES_IN_SENTENCE):
+    """Checks many sentences/supersentences at once (e.g. when importing a corpus) : their graphs are
+    validated together by a BatchGraphValidator. Returns, for each sentence, None if it's valid (it's then
+    checked and ordered), else the error its check() would have raised. max_nodes is the limit on the number
+    of nodes of their graphs, which can be raised for the large imported sentences"""
+    verdicts, graphs, graph_sentences = [None] * len(sentences), [], []
+    for i, sentence in enumerate(sentences):
+        if sentence.is_checked() or len(sentence.children) == 1:
+            continue
+        try:
+            for clause in sentence.children:
+                clause.check()
+            sentence.graph = PropositionGraph(sentence.children)
+        except ASTException as err:
+            verdicts[i] = err
+            continue
+        graphs.append(sentence.graph)
+        graph_sentences.append(i)
+
+    for i, error in zip(graph_sentences, BatchGraphValidator(graphs, max_nodes).validate()):
+        verdicts[i] = error
+
+    for i, sentence in enumerate(sentences):
+        if verdicts[i] is None:
+            try:
+                sentence.check() # the graphs found valid aren't checked again
+            except ASTException as err:
+                verdicts[i] = err
+    return verdicts
+
+
 class RandomPropositionGenerator(metaclass=Singleton):
 
     def __init__(self):
         self.db = DictionaryQueries()
+        self.random = random.Random() # for the shape of the propositions
+        self.rng = np.random.default_rng() # for the terms
+        self.term_filters = {}
+
+    def seed(self, seed):
+        """Makes the generated propositions reproducible"""
+        self.random.seed(seed)
+        self.rng = np.random.default_rng(seed)
 
     def _make_random_morpheme(self):
-        term_count = random.randint(1, 3)
-        return Morpheme([Term(term_ieml) for term_ieml in self.db.get_random_terms(term_count)])
+        term_count = self.random.randint(1, 3)
+        # the terms are drawn without replacement, so a morpheme never has the same term twice
+        return Morpheme([TermRegistry().get(term_ieml)
+                         for term_ieml in self.db.get_random_terms(term_count, self.rng, **self.term_filters)])
 
     def _make_random_word(self):
 
-        if bool(random.getrandbits(1)) :
+        if bool(self.random.getrandbits(1)) :
             return Word(self._make_random_morpheme())
         else:
             return Word(self._make_random_morpheme(), self._make_random_morpheme())
@@ -130,10 +189,10 @@ class RandomPropositionGenerator(metaclass=Singleton):
 
         # first,  generating the nodes
         if type is Sentence:
-            initial_nodes = [self._make_random_word() for i in range(random.randint(3, MAX_NODES_IN_SENTENCE))]
+            initial_nodes = [self._make_random_word() for i in range(self.random.randint(3, MAX_NODES_IN_SENTENCE))]
             mode_nodes = [self._make_random_word() for i in range(len(initial_nodes))]
         else:
-            initial_nodes = [self._make_random_sentence(Sentence) for i in range(random.randint(3, MAX_NODES_IN_SENTENCE))]
+            initial_nodes = [self._make_random_sentence(Sentence) for i in range(self.random.randint(3, MAX_NODES_IN_SENTENCE))]
             mode_nodes = [self._make_random_sentence(Sentence) for i in range(len(initial_nodes))]
 
         # then, constructing a tree using a priority queue (current_parents)
@@ -141,7 +200,7 @@ class RandomPropositionGenerator(metaclass=Singleton):
         current_parents = [initial_nodes.pop(0)]
         while current_parents:
             current_parent = current_parents.pop()
-            for i in range(random.randint(1,4)):
+            for i in range(self.random.randint(1,4)):
                 try:
                     child_node = initial_nodes.pop()
                     mode_node = mode_nodes.pop()
@@ -154,8 +213,10 @@ class RandomPropositionGenerator(metaclass=Singleton):
 
         return type(clauses_list)
 
-    def get_random_proposition(self, ast_type):
-        """Returns an unchecked, unordered (but hopefully correct) proposition of level ast_type"""
+    def get_random_proposition(self, ast_type, layer=None, paradigm=None):
+        """Returns a checked and ordered (hopefully correct) proposition of level ast_type. Its terms
+        can be restricted to a layer of the dictionary, and to root paradigms (or non paradigms)"""
+        self.term_filters = {"layer": layer, "paradigm": paradigm}
         if ast_type is Morpheme:
             result = self._make_random_morpheme()
         elif ast_type is Word:
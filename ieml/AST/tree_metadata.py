@@ -33,10 +33,24 @@ class TreeElementMetadata:
     def _retrieve_from_db(self):
         pass
 
+    @classmethod
+    def from_db_entry(cls, element_ref, db_entry):
+        """Builds the metadata from an entry that has already been fetched, without querying the DB"""
+        metadata = cls.__new__(cls)
+        metadata.element_ref = element_ref
+        metadata.db_entry = db_entry
+        return metadata
+
     @classmethod
     def set_connector(cls, connector_instance):
         cls._db_connector = connector_instance
 
+    @classmethod
+    def generation(cls):
+        """Write counter of the collection the metadata is read from (see DBConnector.collection_generation),
+        None if it never changes"""
+        return None
+
 
 class TermMetadata(TreeElementMetadata):
     @needs_db
@@ -54,6 +68,11 @@ class ClosedPropositionMetadata(PropositionMetadata):
     def _retrieve_from_db(self):
         self.db_entry = self._db_connector.exact_ieml_search(self.element_ref)
 
+    @classmethod
+    @needs_db
+    def generation(cls):
+        return cls._db_connector.collection_generation(cls._db_connector.propositions)
+
 
 class NonClosedPropositionMetadata(PropositionMetadata):
     pass
@@ -64,8 +83,18 @@ class TextMetadata(TreeElementMetadata):
     def _retrieve_from_db(self):
         self.db_entry = self._db_connector.get_text_from_ieml(self.element_ref)
 
+    @classmethod
+    @needs_db
+    def generation(cls):
+        return cls._db_connector.collection_generation(cls._db_connector.texts)
+
 
 class HypertextMetadata(TreeElementMetadata):
     @needs_db
     def _retrieve_from_db(self):
-        self.db_entry = self._db_connector.get_hypertext_from_ieml(self.element_ref)
\ No newline at end of file
+        self.db_entry = self._db_connector.get_hypertext_from_ieml(self.element_ref)
+
+    @classmethod
+    @needs_db
+    def generation(cls):
+        return cls._db_connector.collection_generation(cls._db_connector.hypertexts)
\ No newline at end of file
@@ -1,8 +1,10 @@
+from types import MappingProxyType
+
 from ieml.AST.tree_metadata import TextMetadata, HypertextMetadata
-from ieml.exceptions import InvalidPathException, EmptyTextException
+from ieml.exceptions import InvalidPathException, EmptyTextException, FrozenElementModified, UnknownHypertext
 from ieml.AST.propositions import ClosedProposition, Word, Sentence, SuperSentence
-from ieml.AST.propositional_graph import HyperTextGraph
-from ieml.AST.commons import PropositionPath, TreeStructure
+from ieml.AST.propositional_graph import HyperTextGraph, IncrementalTopologicalOrder
+from ieml.AST.commons import PropositionPath, TreeStructure, by_sort_key, join_fragments
 
 
 class Tag:
@@ -12,6 +14,8 @@ class Tag:
 
 class Text(TreeStructure):
     """A text is basically a list of *closed* propositions"""
+    __slots__ = ()
+    _starts_hyperlink_paths = True
 
     def __init__(self, propositions):
         super().__init__()
@@ -20,14 +24,11 @@ class Text(TreeStructure):
 
         self.children = propositions
 
-    def _do_precompute_str(self):
-        self._str = '{/' + '//'.join(map(str, self.children)) + '/}'
-
-    def __hash__(self):
-        return self.__str__().__hash__()
+    def _ieml_fragments(self):
+        return join_fragments('{/', '//', self.children, '/}')
 
-    def __eq__(self, other):
-        return self.children == other.children
+    def _compute_hash(self):
+        return hash(tuple(hash(child) for child in self.children))
 
     def _do_checking(self):
         for child in self.children:
@@ -37,8 +38,8 @@ class Text(TreeStructure):
     def _retrieve_metadata_instance(self):
         return TextMetadata(self)
 
-    def render(self, hyperlinks):
-        return '{/' + '//'.join([p.render_hyperlinks(hyperlinks, PropositionPath()) for p in self.children]) + '/}'
+    def _metadata_generation(self):
+        return TextMetadata.generation()
 
     def get_hyperlinks(self):
         return [hyperlink for proposition in self.children for hyperlink in proposition.gather_hyperlinks([])]
@@ -62,9 +63,8 @@ class Text(TreeStructure):
         for child in self.children:
             children_by_level[type(child)].append(child)
 
-        children_by_level[Word].sort()
-        children_by_level[Sentence].sort()
-        children_by_level[SuperSentence].sort()
+        for level in children_by_level:
+            children_by_level[level].sort(key=by_sort_key)
         self.children = children_by_level[Word] + \
                       children_by_level[Sentence] + \
                       children_by_level[SuperSentence]
@@ -72,6 +72,8 @@ class Text(TreeStructure):
 
 class HyperText(TreeStructure):
     """An hypertext contains a list of texts and an hyperlink table"""
+    __slots__ = ('_hyperlinks', 'texts', 'transitions', 'strate')
+    _has_own_hyperlinks = True
 
     def __init__(self, text):
         super().__init__()
@@ -96,6 +98,9 @@ class HyperText(TreeStructure):
     def _retrieve_metadata_instance(self):
         return HypertextMetadata(self)
 
+    def _metadata_generation(self):
+        return HypertextMetadata.generation()
+
     def _build_hyperlink(self):
         """Gather the hyper links from the child text of this hypertext"""
         self._hyperlinks = {}
@@ -117,14 +122,25 @@ class HyperText(TreeStructure):
                 yield (path, literal, hypertext)
 
     def add_hyperlink(self, path, literal, hypertext):
+        if self._frozen:
+            raise FrozenElementModified(self, "_hyperlinks")
         self._add_hyperlink(path, literal, hypertext)
         self._build_graph()
 
-    def _do_precompute_str(self):
-        self._str = self.render()
+    def _do_freeze(self):
+        super()._do_freeze()
+        self._hyperlinks = MappingProxyType({path: tuple(links) for path, links in self._hyperlinks.items()})
+        self.texts = tuple(self.texts)
+        self.transitions = frozenset(self.transitions)
+
+    def _frozen_dependencies(self):
+        return list(self.children) + [hypertext for path, literal, hypertext in self.get_hyperlinks()]
+
+    def _ieml_fragments(self):
+        return self.children
 
-    def render(self):
-        return self.children[0].render(self._hyperlinks)
+    def _ieml_hyperlinks(self):
+        return {tuple(path.path): links for path, links in self._hyperlinks.items()}
 
     def _do_checking(self):
         # Check cycle and root node
@@ -157,6 +173,48 @@ class HyperText(TreeStructure):
 
                 self.strate = max((hypertext.strate + 1, self.strate))
 
-                # need to recompute the ieml string and redo the checking
-                self._do_checking()
-                self._do_precompute_str()
+        if self._hyperlinks:
+            # need to redo the checking once all the transitions are there, the ieml string will be rendered again
+            self._do_checking()
+            self._str = None
+
+
+class HyperTextAssembler:
+    """Links hypertexts together. Each hyperlink is checked against the ones already added, using a topological
+    order of the hypertexts, so a hyperlink that would create a cycle is rejected right away (EdgeCreatesCycle).
+    The hypertexts' graphs are only built once all the hyperlinks are there, the linked hypertexts first,
+    so each one is built once"""
+
+    def __init__(self):
+        self.hypertexts = {} # key => hypertext
+        self._order = IncrementalTopologicalOrder()
+        self._linking = set() # keys of the hypertexts that have been given hyperlinks
+
+    def add_hypertext(self, key, hypertext):
+        self.hypertexts[key] = hypertext
+        self._order.add_node(key)
+
+    def get_hypertext(self, key):
+        if key not in self.hypertexts:
+            raise UnknownHypertext(key)
+        return self.hypertexts[key]
+
+    def add_hyperlink(self, key, path, literal, linked_key):
+        """Adds the hyperlink going from the element at path in the hypertext to the linked hypertext"""
+        hypertext, linked_hypertext = self.get_hypertext(key), self.get_hypertext(linked_key)
+        if hypertext.is_frozen():
+            raise FrozenElementModified(hypertext, "_hyperlinks")
+
+        self._order.add_edge(key, linked_key)
+        hypertext._add_hyperlink(path, literal, linked_hypertext)
+        self._linking.add(key)
+
+    def build(self):
+        """Builds the graphs of the hypertexts that have been given hyperlinks, and returns the root hypertext
+        (the one with the highest strate)"""
+        for key in reversed(list(self._order)):
+            if key in self._linking:
+                self.hypertexts[key]._build_graph()
+        self._linking.clear()
+
+        return max(self.hypertexts.values(), key=lambda hypertext: hypertext.strate)
@@ -1,2 +1,6 @@
 
 MORPHEME_SIZE_LIMIT = 12
+PARSER_CACHE_SIZE = 1024 # number of parsed IEML strings kept by each parser
+# maximum number of nodes in the graph of a sentence, supersentence or hypertext. It's the default limit of
+# AbstractGraph.check, which can be given a higher one (e.g. check_sentences, to validate large imported sentences)
+MAX_NODES_IN_SENTENCE = 20
@@ -80,11 +80,31 @@ class IndistintiveTermsExist(ASTException):
 class TooManyTermsInMorpheme(ASTException):
     pass
 
+
+class FrozenElementModified(ASTException):
+
+    def __init__(self, element_ref, attribute):
+        super().__init__()
+        self.element_ref = element_ref
+        self.attribute = attribute
+
+    def __str__(self):
+        return "Cannot set %s on a frozen %s" % (self.attribute, type(self.element_ref).__name__)
+
 ### These exceptions /errors are graph_related
 
 
 class InvalidPropositionGraph(ASTException):
-    pass
+    message = "Invalid proposition graph"
+
+    def __init__(self, node_ids=()):
+        super().__init__()
+        self.node_ids = list(node_ids) # the indexes of the graph nodes the error is about
+        self.nodes = None # references to these nodes, set by whoever built the graph (e.g. the request's node ids)
+        self.errors = [self] # all the errors found in the graph, when it's this one that has been raised
+
+    def __str__(self):
+        return self.message
 
 
 class TooManyNodesInGraph(InvalidPropositionGraph):
@@ -99,11 +119,15 @@ class SeveralRootNodeFound(InvalidPropositionGraph):
     message = "Several root nodes exist for this graph"
 
 
+class EdgeCreatesCycle(InvalidPropositionGraph):
+    message = "This link would create a cycle in the graph"
+
+
 class InvalidGraphNode(InvalidPropositionGraph):
     message = "%s"
 
     def __init__(self, node_id):
-        super().__init__()
+        super().__init__([node_id])
         self.node_id = node_id
         self.node_ieml = None
 
@@ -128,6 +152,14 @@ class InvalidNodeIEMLLevel(InvalidGraphNode):
 class NodeHasTooMuchParents(InvalidGraphNode):
     message = "Node %s has several parents"
 
+
+class NodeInCycle(InvalidGraphNode):
+    message = "Node %s is part of a cycle"
+
+
+class NodeNotConnected(InvalidGraphNode):
+    message = "Node %s isn't connected to the rest of the graph"
+
 ### AST tools related errors
 
 
@@ -182,6 +214,15 @@ class OpenPropositionInTextException(USLException):
 class EmptyTextException(USLException):
     pass
 
+
+class UnknownHypertext(USLException):
+    def __init__(self, key):
+        super().__init__()
+        self.key = key
+
+    def __str__(self):
+        return "No hypertext with the id %s" % self.key
+
 ### Parser-related Errors
 
 
@@ -190,4 +231,19 @@ class ParserErrors(Exception):
 
 
 class CannotParse(ParserErrors):
-    pass
\ No newline at end of file
+    pass
+
+
+### Binary encoding errors
+
+
+class BinaryEncodingErrors(Exception):
+    pass
+
+
+class InvalidBinaryAST(BinaryEncodingErrors):
+    pass
+
+
+class UnsupportedBinaryVersion(BinaryEncodingErrors):
+    pass
@@ -1,5 +1,6 @@
 import ply.lex as lxr
 import logging
+import re
 
 tokens = (
    'TERM',
@@ -18,8 +19,13 @@ tokens = (
 )
 
 
+TERM_REGEX = r'[EUASBTOMFIacbedgfihkjmlonpsutwyx\.\-\;\:\,\'\’\_][EUASBTOMFIacbedgfihkjmlonpsutwyx\.\-\;\:\,\'\’\_\+]+'
+# a term as used in propositions, i.e., between brackets (the lexer ignores whitespaces)
+BRACKETED_TERM = re.compile(r'\[[ \t\n]*(' + TERM_REGEX + r')[ \t\n]*\]')
+
+
 def get_lexer(module=None):
-    t_TERM = r'[EUASBTOMFIacbedgfihkjmlonpsutwyx\.\-\;\:\,\'\’\_][EUASBTOMFIacbedgfihkjmlonpsutwyx\.\-\;\:\,\'\’\_\+]+'
+    t_TERM = TERM_REGEX
     t_PLUS   = r'\+'
     t_TIMES   = r'\*'
     t_LPAREN  = r'\('
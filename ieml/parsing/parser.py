@@ -1,16 +1,70 @@
 import logging
+from collections import OrderedDict
+from threading import Lock
 
 import ply.yacc as yacc
 
 from helpers.metaclasses import Singleton
-from ieml.AST import Word, Morpheme, Clause, SuperClause, Sentence, SuperSentence, Term, Text, HyperText
+from ieml.AST import Word, Sentence, SuperSentence, TermRegistry, PropositionFactory, Text, HyperText
+from ieml.AST.binary import encode, decode
+from ieml.constants import PARSER_CACHE_SIZE
 from ieml.exceptions import CannotParse
-from .lexer import get_lexer, tokens
+from .lexer import get_lexer, tokens, BRACKETED_TERM
+
+
+class ParserCache:
+    """Bounded LRU cache of the ASTs built from IEML strings. It's emptied when the dictionary's generation changes,
+    since the ASTs' terms may have changed with it. It's shared by the request threads, so its entries are only
+    read and changed while holding its lock"""
+
+    def __init__(self, size=PARSER_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.generation = None # generation of the dictionary the cached ASTs were built with
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_generation(self, generation):
+        """Must be called with the lock held"""
+        if generation != self.generation:
+            self._entries.clear()
+            self.generation = generation
+
+    def get(self, ieml_string):
+        """Returns the cached value for that string, or None"""
+        from models.base_queries import DictionaryQueries
+        generation = DictionaryQueries().generation() # read before taking the lock, it can query the database
+        with self._lock:
+            self._check_generation(generation)
+            value = self._entries.get(ieml_string)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(ieml_string)
+            return value
+
+    def put(self, ieml_string, value):
+        with self._lock:
+            self._entries[ieml_string] = value
+            self._entries.move_to_end(ieml_string)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
 
 
 class PropositionsParser(metaclass=Singleton):
     """
-        Base class for a parser
+        Base class for a parser. The propositions are built by the PropositionFactory, so identical
+        subtrees are shared (and checked only once)
     """
     tokens = tokens
 
@@ -19,9 +73,32 @@ class PropositionsParser(metaclass=Singleton):
         # Build the lexer and parser
         self.lexer = get_lexer()
         self.parser = yacc.yacc(module=self, errorlog=logging, start='proposition')
+        self.cache = ParserCache()
 
     def parse(self, s):
-        """Parses the input string, and returns a reference to the created AST's root"""
+        """Parses the input string, and returns a reference to the created AST's root. The ASTs of the
+        last parsed strings are cached"""
+        cached = self.cache.get(s)
+        if cached is not None:
+            return self._from_cache(cached)
+
+        ast = self._parse(s)
+        self.cache.put(s, self._to_cache(ast))
+        return ast
+
+    def _to_cache(self, ast):
+        # the propositions are built by the PropositionFactory, which means they're already shared
+        # and never modified once checked, so they can be handed out again as is
+        return ast
+
+    def _from_cache(self, cached):
+        return cached
+
+    def _parse(self, s):
+        # all the terms of the input are fetched from the dictionary at once, before the AST is built
+        # (the hypertexts are checked while parsing), so that p_term finds them already registered
+        TermRegistry().resolve(BRACKETED_TERM.findall(s))
+
         self.root = None
         self.parser.parse(s)
 
@@ -45,7 +122,7 @@ class PropositionsParser(metaclass=Singleton):
 
     def p_term(self, p):
         """p_term : LBRACKET TERM RBRACKET"""
-        p[0] = Term(p[2])
+        p[0] = TermRegistry().get(p[2])
 
     def p_proposition_sum(self, p):
         """terms_sum : terms_sum PLUS p_term
@@ -61,31 +138,31 @@ class PropositionsParser(metaclass=Singleton):
 
     def p_morpheme(self, p):
         """morpheme : LPAREN terms_sum RPAREN"""
-        p[0] = Morpheme(p[2])
+        p[0] = PropositionFactory().morpheme(p[2])
 
     def p_word(self, p):
         """word : LBRACKET morpheme RBRACKET
                 | LBRACKET morpheme TIMES morpheme RBRACKET"""
         if len(p) == 4:
-            p[0] = Word(p[2])
+            p[0] = PropositionFactory().word(p[2])
         else:
-            p[0] = Word(p[2], p[4])
+            p[0] = PropositionFactory().word(p[2], p[4])
 
     def p_clause(self, p):
         """clause : LPAREN word TIMES word TIMES word RPAREN"""
-        p[0] = Clause(p[2], p[4], p[6])
+        p[0] = PropositionFactory().clause(p[2], p[4], p[6])
 
     def p_sentence(self, p):
         """sentence : LBRACKET clauses_sum RBRACKET"""
-        p[0] = Sentence(p[2])
+        p[0] = PropositionFactory().sentence(p[2])
 
     def p_superclause(self, p):
         """superclause : LPAREN sentence TIMES sentence TIMES sentence RPAREN"""
-        p[0] = SuperClause(p[2], p[4], p[6])
+        p[0] = PropositionFactory().superclause(p[2], p[4], p[6])
 
     def p_super_sentence(self, p):
         """supersentence : LBRACKET superclauses_sum RBRACKET"""
-        p[0] = SuperSentence(p[2])
+        p[0] = PropositionFactory().supersentence(p[2])
 
     def p_error(self, p):
         if p:
@@ -96,13 +173,22 @@ class PropositionsParser(metaclass=Singleton):
 
 class USLParser(PropositionsParser):
     """This parser inherits from the basic propositionnal parser, but adds supports for embedded USL's.
-    Thus, some parsing rules are modified"""
+    Thus, some parsing rules are modified. The propositions that have hyperlinks aren't shared"""
 
     def __init__(self):
         # Build the lexer and parser
         self.lexer = get_lexer()
         self.parser = yacc.yacc(module=self, errorlog=logging, start='hypertext')
         self.p_ieml_proposition = None
+        self.cache = ParserCache()
+
+    def _to_cache(self, ast):
+        # hyperlinks can be added to the hypertexts (and to their propositions), so their binary form
+        # is cached instead, and a new AST is built from it every time
+        return encode(ast)
+
+    def _from_cache(self, cached):
+        return decode(cached)
 
     def p_hypertext(self, p):
         """hypertext : usl"""
@@ -118,28 +204,32 @@ class USLParser(PropositionsParser):
                 | LBRACKET morpheme RBRACKET usl_list
                 | LBRACKET morpheme TIMES morpheme RBRACKET usl_list
                 """
-        if len(p) == 4 or len(p) == 5:
-            p[0] = Word(p[2])
+        if len(p) == 4:
+            p[0] = PropositionFactory().word(p[2])
+        elif len(p) == 6:
+            p[0] = PropositionFactory().word(p[2], p[4])
         else:
-            p[0] = Word(p[2], p[4])
-
-        # if there's an USL list (hyperlinks), we're attaching it to the proposition
-        if len(p) == 5 or len(p) == 7:
+            # if there's an USL list (hyperlinks), we're attaching it to a proposition of its own
+            p[0] = Word(p[2]) if len(p) == 5 else Word(p[2], p[4])
             p[0].add_hyperlink_list(p[len(p) - 1]) # last element is the usl_list
 
     def p_sentence(self, p):
         """sentence : LBRACKET clauses_sum RBRACKET
                     | LBRACKET clauses_sum RBRACKET usl_list"""
-        p[0] = Sentence(p[2])
         if len(p) == 5:
-             p[0].add_hyperlink_list(p[4])
+            p[0] = Sentence(p[2])
+            p[0].add_hyperlink_list(p[4])
+        else:
+            p[0] = PropositionFactory().sentence(p[2])
 
     def p_super_sentence(self, p):
         """supersentence : LBRACKET superclauses_sum RBRACKET
                     | LBRACKET superclauses_sum RBRACKET usl_list"""
-        p[0] = SuperSentence(p[2])
         if len(p) == 5:
-             p[0].add_hyperlink_list(p[4])
+            p[0] = SuperSentence(p[2])
+            p[0].add_hyperlink_list(p[4])
+        else:
+            p[0] = PropositionFactory().supersentence(p[2])
 
     def p_closed_proposition(self, p):
         """closed_proposition : SLASH word SLASH
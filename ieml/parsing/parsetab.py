@@ -0,0 +1,51 @@
+
+# parsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'propositionLBRACKET LITERAL LPAREN L_ANGLE_BRACKET L_CURLY_BRACKET PLUS RBRACKET RPAREN R_ANGLE_BRACKET R_CURLY_BRACKET SLASH TERM TIMESproposition : p_term\n                        | morpheme\n                        | word\n                        | clause\n                        | sentence\n                        | superclause\n                        | supersentencep_term : LBRACKET TERM RBRACKETterms_sum : terms_sum PLUS p_term\n                    | p_term\n            clauses_sum : clauses_sum PLUS clause\n                    | clause\n            superclauses_sum : superclauses_sum PLUS superclause\n                    | superclausemorpheme : LPAREN terms_sum RPARENword : LBRACKET morpheme RBRACKET\n                | LBRACKET morpheme TIMES morpheme RBRACKETclause : LPAREN word TIMES word TIMES word RPARENsentence : LBRACKET clauses_sum RBRACKETsuperclause : LPAREN sentence TIMES sentence TIMES sentence RPARENsupersentence : LBRACKET superclauses_sum RBRACKET'
+    
+_lr_action_items = {'LBRACKET':([0,10,30,31,32,33,35,37,39,48,49,],[9,21,41,43,45,46,41,43,45,43,45,]),'LPAREN':([0,9,21,24,26,28,43,45,46,],[10,10,33,35,37,39,35,37,35,]),'$end':([1,2,3,4,5,6,7,8,22,23,25,27,29,47,52,53,],[0,-1,-2,-3,-4,-5,-6,-7,-8,-16,-19,-21,-15,-17,-18,-20,]),'TERM':([9,21,41,46,],[11,11,11,11,]),'RBRACKET':([11,12,13,14,15,16,29,34,36,38,52,53,],[22,23,25,27,-12,-14,-15,47,-11,-13,-18,-20,]),'TIMES':([12,18,19,23,25,29,42,44,47,],[24,31,32,-16,-19,-15,48,49,-17,]),'PLUS':([13,14,15,16,17,20,22,36,38,40,52,53,],[26,28,-12,-14,30,-10,-8,-11,-13,-9,-18,-20,]),'RPAREN':([17,20,22,23,25,40,47,50,51,],[29,-10,-8,-16,-19,-9,-17,52,53,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'proposition':([0,],[1,]),'p_term':([0,10,30,33,35,],[2,20,40,20,20,]),'morpheme':([0,9,21,24,43,46,],[3,12,12,34,12,12,]),'word':([0,10,31,33,37,48,],[4,18,42,18,18,50,]),'clause':([0,9,21,26,45,],[5,15,15,36,15,]),'sentence':([0,10,32,39,49,],[6,19,44,19,51,]),'superclause':([0,9,28,],[7,16,38,]),'supersentence':([0,],[8,]),'clauses_sum':([9,21,45,],[13,13,13,]),'superclauses_sum':([9,],[14,]),'terms_sum':([10,33,35,],[17,17,17,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> proposition","S'",1,None,None,None),
+  ('proposition -> p_term','proposition',1,'p_ieml_proposition','parser.py',114),
+  ('proposition -> morpheme','proposition',1,'p_ieml_proposition','parser.py',115),
+  ('proposition -> word','proposition',1,'p_ieml_proposition','parser.py',116),
+  ('proposition -> clause','proposition',1,'p_ieml_proposition','parser.py',117),
+  ('proposition -> sentence','proposition',1,'p_ieml_proposition','parser.py',118),
+  ('proposition -> superclause','proposition',1,'p_ieml_proposition','parser.py',119),
+  ('proposition -> supersentence','proposition',1,'p_ieml_proposition','parser.py',120),
+  ('p_term -> LBRACKET TERM RBRACKET','p_term',3,'p_term','parser.py',124),
+  ('terms_sum -> terms_sum PLUS p_term','terms_sum',3,'p_proposition_sum','parser.py',128),
+  ('terms_sum -> p_term','terms_sum',1,'p_proposition_sum','parser.py',129),
+  ('clauses_sum -> clauses_sum PLUS clause','clauses_sum',3,'p_proposition_sum','parser.py',130),
+  ('clauses_sum -> clause','clauses_sum',1,'p_proposition_sum','parser.py',131),
+  ('superclauses_sum -> superclauses_sum PLUS superclause','superclauses_sum',3,'p_proposition_sum','parser.py',132),
+  ('superclauses_sum -> superclause','superclauses_sum',1,'p_proposition_sum','parser.py',133),
+  ('morpheme -> LPAREN terms_sum RPAREN','morpheme',3,'p_morpheme','parser.py',140),
+  ('word -> LBRACKET morpheme RBRACKET','word',3,'p_word','parser.py',144),
+  ('word -> LBRACKET morpheme TIMES morpheme RBRACKET','word',5,'p_word','parser.py',145),
+  ('clause -> LPAREN word TIMES word TIMES word RPAREN','clause',7,'p_clause','parser.py',152),
+  ('sentence -> LBRACKET clauses_sum RBRACKET','sentence',3,'p_sentence','parser.py',156),
+  ('superclause -> LPAREN sentence TIMES sentence TIMES sentence RPAREN','superclause',7,'p_superclause','parser.py',160),
+  ('supersentence -> LBRACKET superclauses_sum RBRACKET','supersentence',3,'p_super_sentence','parser.py',164),
+]
@@ -1,10 +1,15 @@
-from random import randint
 import re
-from pymongo import MongoClient
+import time
+
+import numpy as np
+from pymongo import MongoClient, ReturnDocument
 
 from helpers.metaclasses import Singleton
-from models.constants import TERMS_COLLECTION, TAG_LANGUAGES, DB_NAME_TERM
+from models.constants import TERMS_COLLECTION, TAG_LANGUAGES, DB_NAME_TERM, META_COLLECTION, \
+    DICTIONARY_GENERATION_CHECK_INTERVAL, COLLECTION_GENERATION_CHECK_INTERVAL, TAGGED_INDEX_FIELDS
 from .constants import DB_ADDRESS, DB_NAME
+from .dictionary import DictionarySnapshot, DictionaryImage, CATEGORY_CLASSES, CELL_TERM, PARADIGM_TERM
+from .search_index import SearchIndexes
 
 
 class DBConnector(object, metaclass=Singleton):
@@ -17,10 +22,164 @@ class DBConnector(object, metaclass=Singleton):
         self.db_term = self.client[DB_NAME_TERM]
 
         self.terms = self.db_term[TERMS_COLLECTION]
+        self.meta = self.db_term[META_COLLECTION]
+        self._collection_generations = {} # collection name => (write counter, time it was read at)
+
+    @staticmethod
+    def _tagged_entry_texts(entry):
+        """Returns the fields of a proposition, text or hypertext entry that the searches look into"""
+        texts = {"_id": entry["_id"]}
+        for language in TAG_LANGUAGES:
+            texts["TAGS." + language] = entry["TAGS"].get(language)
+        return texts
+
+    @staticmethod
+    def _tagged_search_fields(languages=None):
+        return ["_id"] + ["TAGS." + language for language in (languages or TAG_LANGUAGES)]
+
+    @staticmethod
+    def _tagged_index_document(entry):
+        """The fields of an entry that the search indexes keep : the ones the search responses are built from,
+        without the (potentially big) BINARY and lists of the contained elements"""
+        return {field: entry[field] for field in TAGGED_INDEX_FIELDS if field in entry}
+
+    @staticmethod
+    def _tagged_entry_response(entry, ieml_type=None):
+        """The search response for an entry. If no IEML type is given, it's read from the entry"""
+        return {"IEML": entry["_id"],
+                "TAGS": entry["TAGS"],
+                "TYPE": ieml_type if ieml_type is not None else entry["TYPE"]}
+
+    def collection_generation(self, collection, force=False):
+        """Returns the write counter of a collection of tagged IEML objects, which is bumped by every write.
+        The search indexes of the collection (and the metadata cached by the frozen elements) are tagged with
+        it, so that the ones of a server process are rebuilt once another process has written in the collection.
+        Like the dictionary's generation, it's only read from the database every few seconds (unless forced)"""
+        now = time.monotonic()
+        generation, read_at = self._collection_generations.get(collection.name, (None, None))
+        if force or generation is None or now - read_at >= COLLECTION_GENERATION_CHECK_INTERVAL:
+            counter = self.meta.find_one({"_id": "collection:" + collection.name})
+            generation = counter["GENERATION"] if counter is not None else 0
+            self._collection_generations[collection.name] = (generation, now)
+        return generation
+
+    def _bump_collection_generation(self, collection):
+        """Called once a collection of tagged IEML objects has been written, returns its new write counter"""
+        counter = self.meta.find_one_and_update({"_id": "collection:" + collection.name},
+                                                {"$inc": {"GENERATION": 1}},
+                                                upsert=True, return_document=ReturnDocument.AFTER)
+        self._collection_generations[collection.name] = (counter["GENERATION"], time.monotonic())
+        return counter["GENERATION"]
+
+    def _build_tagged_search_index(self, collection, ieml_type=None):
+        """(Re)builds the search indexes of a collection of tagged IEML objects"""
+        # the counter is read first, so that a write happening meanwhile triggers another rebuild
+        generation = self.collection_generation(collection, force=True)
+        return SearchIndexes().build(collection.name, self._tagged_search_fields(),
+                                     collection.find({}, {field: True for field in TAGGED_INDEX_FIELDS}),
+                                     lambda entry: entry["_id"], self._tagged_entry_texts,
+                                     lambda entry: self._tagged_entry_response(entry, ieml_type), generation)
+
+    def _tagged_search_index(self, collection, ieml_type=None):
+        """Returns the search index of a collection of tagged IEML objects (or None if it hasn't been built),
+        rebuilt first if another process has written in the collection since it was built"""
+        index = SearchIndexes().get(collection.name)
+        if index is not None and index.generation != self.collection_generation(collection):
+            index = self._build_tagged_search_index(collection, ieml_type)
+        return index
+
+    def _index_tagged_entry(self, collection, entry, ieml_type=None):
+        """Adds a freshly written entry to the search indexes of its collection, if they exist. If the
+        collection has also been written by someone else since the indexes were updated, they're left
+        as they are, and rebuilt by the next search"""
+        generation = self._bump_collection_generation(collection)
+        with SearchIndexes().lock:
+            index = SearchIndexes().get(collection.name)
+            if index is not None and index.generation == generation - 1:
+                SearchIndexes().add(collection.name, entry["_id"], self._tagged_index_document(entry),
+                                    self._tagged_entry_texts(entry),
+                                    self._tagged_entry_response(entry, ieml_type))
+                index.generation = generation
+
+    def _update_indexed_tags(self, collection, ieml, tags_dict, ieml_type=None):
+        index = SearchIndexes().get(collection.name)
+        entry = index.get(ieml) if index is not None else None
+        if entry is not None:
+            self._index_tagged_entry(collection, dict(entry, TAGS=tags_dict), ieml_type)
+        else:
+            self._bump_collection_generation(collection)
+
 
 class DictionaryQueries(DBConnector):
     """Class mainly used for anything related to the terms collection, i.e., the dictionnary"""
 
+    GENERATION_ID = "dictionary" # _id of the generation counter's document in the meta collection
+
+    def __init__(self):
+        super().__init__()
+        self.snapshot = None
+        self.snapshot_generation = None
+        self.search_index_generation = None
+        self._image_path = None # set when the snapshot is a dictionary image
+        self._generation = None
+        self._generation_read_at = None
+        self.random_generator = np.random.default_rng()
+        self._private_snapshot = None # used to draw random terms and rank the terms when there's no snapshot
+
+    def generation(self, force=False):
+        """Returns the generation of the dictionary, which is bumped every time it's reloaded. Caches built over
+        the dictionary should be tagged with it, and rebuilt when it changes. To keep this cheap enough to be
+        called on every lookup, the counter is only read from the database every few seconds (unless forced)"""
+        now = time.monotonic()
+        if force or self._generation is None \
+                or now - self._generation_read_at >= DICTIONARY_GENERATION_CHECK_INTERVAL:
+            counter = self.meta.find_one({"_id": self.GENERATION_ID})
+            self._generation = counter["GENERATION"] if counter is not None else 0
+            self._generation_read_at = now
+        return self._generation
+
+    def bump_generation(self):
+        """Called once the dictionary has been reloaded, returns the new generation"""
+        counter = self.meta.find_one_and_update({"_id": self.GENERATION_ID}, {"$inc": {"GENERATION": 1}},
+                                                upsert=True, return_document=ReturnDocument.AFTER)
+        self._generation, self._generation_read_at = counter["GENERATION"], time.monotonic()
+        return self._generation
+
+    def _refresh(self):
+        """Rebuilds the snapshot and the search index if the dictionary has been reloaded since they were built"""
+        generation = self.generation()
+        if self.snapshot is not None and self.snapshot_generation != generation:
+            if self._image_path is not None:
+                self.load_image(self._image_path)
+            else:
+                self.load_snapshot()
+
+        if self.search_index_generation is not None and self.search_index_generation != generation:
+            self.build_search_index()
+
+    def load_snapshot(self):
+        """Loads the whole terms collection in memory. Once it's loaded, exact term lookups
+        and tag checks are served from the snapshot instead of the database"""
+        # the generation is read first, so that a reload happening meanwhile triggers another refresh
+        self.snapshot_generation = self.generation(force=True)
+        self.snapshot = DictionarySnapshot.from_collection(self.terms)
+        self._image_path = None
+        return self.snapshot
+
+    def load_image(self, image_path):
+        """Same as load_snapshot, but the dictionary is read from a memory-mapped image
+        written by the dictionary loader"""
+        self.snapshot_generation = self.generation(force=True)
+        self.snapshot = DictionaryImage.open(image_path)
+        self._image_path = image_path
+        return self.snapshot
+
+    def drop_snapshot(self):
+        """Goes back to querying the database for every lookup"""
+        self.snapshot = None
+        self.snapshot_generation = None
+        self._image_path = None
+
     def _format_response(self, term):
         return {
             "IEML": '[' + term["IEML"] + ']',
@@ -28,11 +187,44 @@ class DictionaryQueries(DBConnector):
                 "FR": term.get("FR"),
                 "EN": term.get("EN")},
             "TYPE": "TERM",
-            "CANONICAL": term["CANONICAL"],
+            "CANONICAL": list(term["CANONICAL"]),
+            "RANK": term["RANK"] if term.get("RANK") is not None else self._rank_of(term["IEML"]),
             "OBJECT_ID": term["_id"]}
 
+    def _rank_of(self, ieml_string):
+        """Rank of a term of a collection loaded without the ranks (before the dictionary loader was used) :
+        they're computed once for the whole dictionary, so that every term has one"""
+        entry = self._in_memory_dictionary().get(ieml_string)
+        return entry["RANK"] if entry is not None else None
+
+    @staticmethod
+    def _term_texts(term):
+        return {"IEML": term["IEML"], "FR": term.get("FR"), "EN": term.get("EN")}
+
+    @staticmethod
+    def _term_search_response(term):
+        return {"IEML": '[' + term["IEML"] + ']',
+                "TAGS": {"FR": term.get("FR"), "EN": term.get("EN")},
+                "TYPE": "TERM"}
+
+    def build_search_index(self):
+        """(Re)builds the n-gram and prefix indexes used to search the dictionary"""
+        self.search_index_generation = self.generation(force=True)
+        entries = self.snapshot if self.snapshot is not None else self.terms.find()
+        return SearchIndexes().build(TERMS_COLLECTION, ["IEML"] + TAG_LANGUAGES, entries,
+                                     lambda term: term["IEML"], self._term_texts, self._term_search_response)
+
+    def refresh_search_index(self):
+        """Rebuilds the search index if the dictionary has been reloaded since it was built"""
+        self._refresh()
+
     def search_for_terms(self, search_string):
         """Searching for terms containing the search_string, both in the IEML field and translated field"""
+        self._refresh()
+        index = SearchIndexes().get(TERMS_COLLECTION)
+        if index is not None:
+            return [self._format_response(term) for term in index.search(search_string)]
+
         regex = re.compile(re.escape(search_string))
 
         result = [self._format_response(term)
@@ -48,18 +240,83 @@ class DictionaryQueries(DBConnector):
         if ieml_string[0] == '[' and ieml_string[-1] == ']':
             ieml_string = ieml_string[1:-1]
 
-        term = self.terms.find_one({"IEML": ieml_string})
+        self._refresh()
+        if self.snapshot is not None:
+            term = self.snapshot.get(ieml_string)
+        else:
+            term = self.terms.find_one({"IEML": ieml_string})
+
         if term:
             return self._format_response(term)
         else:
             return None
 
-    def get_random_terms(self, count):
-        """Used by the random proposition generator : ouputs n random terms from the dicitonary DB, n being count"""
-        total_count = self.terms.count()
-        return [term["IEML"] for term in self.terms.find().limit(count).skip(randint(0, total_count - 1))]
+    def exact_ieml_terms_search(self, ieml_strings):
+        """Batch version of exact_ieml_term_search : looks up all the terms in a single query (or in the snapshot),
+        and returns an IEML string => response dict, in which the terms that don't exist are missing"""
+        ieml_strings = [ieml_string[1:-1] if ieml_string[0] == '[' and ieml_string[-1] == ']' else ieml_string
+                        for ieml_string in ieml_strings]
+
+        self._refresh()
+        if self.snapshot is not None:
+            terms = (self.snapshot.get(ieml_string) for ieml_string in ieml_strings)
+        else:
+            terms = self.terms.find({"IEML": {"$in": ieml_strings}})
+
+        return {term["IEML"]: self._format_response(term) for term in terms if term is not None}
+
+    def _in_memory_dictionary(self):
+        """In-memory dictionary the random terms are drawn from (and the missing ranks are read from) : the
+        snapshot if it's loaded, else a private copy of the terms collection, rebuilt when the dictionary's
+        generation changes"""
+        self._refresh()
+        if self.snapshot is not None:
+            return self.snapshot
+
+        if self._private_snapshot is None or self._private_snapshot[0] != self.generation():
+            generation = self.generation(force=True)
+            self._private_snapshot = (generation, DictionarySnapshot.from_collection(self.terms))
+        return self._private_snapshot[1]
+
+    def get_random_terms(self, count, rng=None, layer=None, paradigm=None):
+        """Used by the random proposition generator : outputs count distinct terms drawn uniformly from the
+        dictionary, optionally from a given layer and/or among the root paradigms (or the non paradigms).
+        rng is a NumPy random generator, pass a seeded one to get reproducible draws"""
+        return self._in_memory_dictionary().sample(count, rng if rng is not None else self.random_generator,
+                                                    layer, paradigm)
+
+    @staticmethod
+    def _term_filter_query(category=None, term_type=None, layer=None):
+        """Same filters as ColumnarDictionary.filter_mask, as a Mongo query (the fields are stored as strings)"""
+        query = {}
+        if category is not None:
+            query['CLASS'] = {'$in': [str(term_class) for term_class in range(8)
+                                      if term_class & CATEGORY_CLASSES[category]]}
+        if term_type is not None:
+            if term_type == CELL_TERM:
+                query['TAILLE'] = "1"
+            elif term_type == PARADIGM_TERM:
+                query['PARADIGM'] = "1"
+            else:
+                query['TAILLE'] = {'$ne': "1"}
+                query['PARADIGM'] = "0"
+        if layer is not None:
+            query['LAYER'] = str(layer)
+        return query
+
+    def search_terms(self, search_string, languages=None, category=None, type=None, layer=None):
+        """Searches the terms containing the search string in their IEML or their tags, keeping only the ones
+        of the given category (noun, verb or auxiliary), type (table, cell or paradigm) and layer"""
+        self._refresh()
+        filtered = category is not None or type is not None or layer is not None
+        index = SearchIndexes().get(TERMS_COLLECTION)
+        # the filters are applied on the columns of the snapshot, else it's all done by the database
+        if index is not None and (self.snapshot is not None or not filtered):
+            terms = index.search(search_string, ["IEML"] + (languages or TAG_LANGUAGES))
+            if filtered:
+                terms = self.snapshot.filter_entries(terms, category, type, layer)
+            return [self._format_response(term) for term in terms]
 
-    def search_terms(self, search_string, languages=None, category=None, type=None):
         regex = {'$regex': re.compile(re.escape(search_string))}
 
         categories = [{'IEML': regex}]
@@ -70,9 +327,8 @@ class DictionaryQueries(DBConnector):
             for language in TAG_LANGUAGES:
                 categories.append({language: regex})
 
-        query = {'$or': categories}
-        #query['CLASS'] with category
-        #query['PARADIGM'] with type
+        query = self._term_filter_query(category, type, layer)
+        query['$or'] = categories
 
         return [self._format_response(term)
                 for term in self.terms.find(query)]
@@ -84,6 +340,9 @@ class DictionaryQueries(DBConnector):
         return True
 
     def check_tag_exist(self, tag, language):
+        self._refresh()
+        if self.snapshot is not None:
+            return self.snapshot.has_tag(tag, language)
         return self.terms.find_one({language: tag}) is not None
 
 
@@ -8,5 +8,34 @@ TERMS_COLLECTION = "terms"
 PROPOSITION_COLLECTION = "propositions"
 TEXT_COLLECTION = "texts"
 HYPERTEXT_COLLECTION = "hypertexts"
+META_COLLECTION = "meta" # in the terms DB, holds the dictionary's generation and the collections' write counters
 
-TAG_LANGUAGES = ["FR", "EN"]
\ No newline at end of file
+TAG_LANGUAGES = ["FR", "EN"]
+
+# when True, the server loads the whole dictionary in memory at startup. Off by default, so that the server
+# keeps its former behaviour (every lookup queried from the database) until it's turned on for a deployment
+LOAD_DICTIONARY_SNAPSHOT = False
+# binary image of the dictionary written by models.dictionary_loader. When it exists, the server
+# maps it in memory (shared by all the workers) instead of loading the snapshot from the database
+DICTIONARY_IMAGE_PATH = "data/dictionary.img"
+# the dictionary's generation (bumped by every reload) is read again from the database at most once
+# every that many seconds. All the in-memory caches built over the dictionary are rebuilt when it changes
+DICTIONARY_GENERATION_CHECK_INTERVAL = 5
+
+# when True, the server builds the in-memory n-gram search indexes at startup. Off by default, the searches then
+# query the database (the autocompletion still builds the indexes the first time it's used)
+BUILD_SEARCH_INDEXES = False
+SEARCH_NGRAM_SIZE = 3
+# the fields of the propositions, texts and hypertexts entries kept by the search indexes
+TAGGED_INDEX_FIELDS = ("_id", "TAGS", "TYPE")
+# the write counters of the propositions, texts and hypertexts collections are read again from the database at most
+# once every that many seconds. The search indexes of a collection are rebuilt when another process has written in it
+COLLECTION_GENERATION_CHECK_INTERVAL = 5
+
+# number of autocompletion results returned by default for each level, and the hard cap on that number
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# number of graph validation sessions (see handlers.sessions) kept by the server, the least recently used
+# sessions are dropped beyond that
+VALIDATION_SESSIONS_MAX_COUNT = 256
@@ -0,0 +1,328 @@
+import json
+import mmap
+import struct
+from types import MappingProxyType
+
+import numpy as np
+from bson import ObjectId
+
+from .constants import TAG_LANGUAGES
+
+
+def canonical_sort_key(canonical_forms):
+    """Same order as the one used by Term.__gt__: terms with more canonical sequences are "bigger", and
+    terms with the same number of sequences are compared sequence by sequence"""
+    return len(canonical_forms), tuple(canonical_forms)
+
+
+def canonical_ranks(term_entries):
+    """Assigns a dense integer rank to every term, following the canonical order of the dictionary.
+    Terms that have the same canonical forms get the same rank. Returns an IEML string => rank map"""
+    sort_keys = {entry["IEML"]: canonical_sort_key(entry["CANONICAL"]) for entry in term_entries}
+    key_ranks = {key: rank for rank, key in enumerate(sorted(set(sort_keys.values())))}
+    return {ieml: key_ranks[key] for ieml, key in sort_keys.items()}
+
+
+# the CLASS field of a term is a bit field of the grammatical categories it can have
+NOUN_CLASS, VERB_CLASS, AUXILIARY_CLASS = 4, 2, 1
+CATEGORY_CLASSES = {0: NOUN_CLASS, 1: VERB_CLASS, 2: AUXILIARY_CLASS} # search API's category => class bit
+
+# term types of the search API
+TABLE_TERM, CELL_TERM, PARADIGM_TERM = 0, 1, 2
+
+COLUMNS = ["LAYER", "CLASS", "PARADIGM", "TAILLE"]
+
+
+class ColumnarDictionary:
+    """Filtering and sampling on the LAYER, CLASS, PARADIGM and TAILLE fields of the terms, done with boolean masks
+    over one NumPy array per field. Subclasses set the columns dict, and implement positions_of and ieml_at"""
+
+    columns = None
+
+    def positions_of(self, ieml_strings):
+        """Returns the position of each term in the columns, -1 for the ones that aren't in the dictionary"""
+        raise NotImplementedError()
+
+    def ieml_at(self, position):
+        """Returns the IEML string of the term at that position in the columns"""
+        raise NotImplementedError()
+
+    def filter_mask(self, category=None, term_type=None, layer=None, paradigm=None):
+        """Mask of the terms matching all the given filters. The term types are a partition of the dictionary :
+        the cells have a size of 1, the paradigms are the root paradigms and the tables are all the others"""
+        mask = np.ones(len(self.columns["CLASS"]), dtype=bool)
+        if category is not None:
+            mask &= (self.columns["CLASS"] & CATEGORY_CLASSES[category]) != 0
+        if term_type is not None:
+            if term_type == CELL_TERM:
+                mask &= self.columns["TAILLE"] == 1
+            elif term_type == PARADIGM_TERM:
+                mask &= self.columns["PARADIGM"] == 1
+            else:
+                mask &= (self.columns["TAILLE"] != 1) & (self.columns["PARADIGM"] == 0)
+        if layer is not None:
+            mask &= self.columns["LAYER"] == layer
+        if paradigm is not None:
+            mask &= (self.columns["PARADIGM"] == 1) == bool(paradigm)
+        return mask
+
+    def sample(self, count, rng, layer=None, paradigm=None):
+        """Draws count distinct terms uniformly (or all the matching ones if there are fewer), using the NumPy random
+        generator rng. The terms can be restricted to a layer, and to root paradigms (or non paradigms)"""
+        if layer is None and paradigm is None:
+            candidates = candidate_count = len(self.columns["LAYER"]) # rng.choice draws from range(n)
+        else:
+            candidates = np.flatnonzero(self.filter_mask(layer=layer, paradigm=paradigm))
+            candidate_count = len(candidates)
+
+        positions = rng.choice(candidates, size=min(count, candidate_count), replace=False)
+        return [self.ieml_at(position) for position in positions]
+
+    def filter_entries(self, term_entries, category=None, term_type=None, layer=None):
+        """Keeps the entries (e.g., the result of a text search) of the terms that match the filters"""
+        term_entries = list(term_entries)
+        if not term_entries:
+            return term_entries
+
+        positions = self.positions_of([entry["IEML"] for entry in term_entries])
+        kept = self.filter_mask(category, term_type, layer)[positions] & (positions >= 0)
+        return [entry for entry, keep in zip(term_entries, kept) if keep]
+
+
+class DictionarySnapshot(ColumnarDictionary):
+    """Immutable in-process copy of the terms collection, indexed by IEML string.
+    It is meant to be built once (at startup) and then shared, so that looking up a term
+    doesn't need a round-trip to the database"""
+
+    def __init__(self, term_entries):
+        term_entries = list(term_entries)
+        ranks = canonical_ranks(term_entries)
+
+        terms = {}
+        for entry in term_entries:
+            frozen_entry = dict(entry)
+            frozen_entry["CANONICAL"] = tuple(entry["CANONICAL"])
+            frozen_entry["RANK"] = ranks[entry["IEML"]]
+            terms[entry["IEML"]] = MappingProxyType(frozen_entry)
+
+        self._terms = MappingProxyType(terms)
+        self._tags = MappingProxyType({language: frozenset(entry[language] for entry in terms.values()
+                                                           if entry.get(language) is not None)
+                                       for language in TAG_LANGUAGES})
+
+        self._ieml_strings = list(terms)
+        self._positions = {ieml: position for position, ieml in enumerate(self._ieml_strings)}
+        self.columns = {column: np.array([int(entry[column]) for entry in terms.values()], dtype=np.int32)
+                        for column in COLUMNS}
+
+    @classmethod
+    def from_collection(cls, terms_collection):
+        """Reads the whole terms collection in one pass"""
+        return cls(terms_collection.find())
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, ieml_string):
+        return ieml_string in self._terms
+
+    def __iter__(self):
+        return iter(self._terms.values())
+
+    def get(self, ieml_string):
+        """Returns the (read-only) entry of a term, or None if the term isn't in the dictionary"""
+        return self._terms.get(ieml_string)
+
+    def canonical_forms(self, ieml_string):
+        return self._terms[ieml_string]["CANONICAL"]
+
+    def rank(self, ieml_string):
+        return self._terms[ieml_string]["RANK"]
+
+    def has_tag(self, tag, language):
+        return tag in self._tags.get(language, ())
+
+    def positions_of(self, ieml_strings):
+        return np.array([self._positions.get(ieml, -1) for ieml in ieml_strings], dtype=np.intp)
+
+    def ieml_at(self, position):
+        return self._ieml_strings[position]
+
+
+class DictionaryImage(ColumnarDictionary):
+    """Read-only, memory-mapped binary image of the dictionary, written by the dictionary loader.
+    Since the file is mapped read-only, all the server workers of a machine share the same copy of it.
+    It can be used in place of a DictionarySnapshot (only the fields of the terms collection that the server uses
+    are kept in the image).
+
+    Layout : the magic bytes, the format version and the length of a JSON header (which lists the sections
+    with their offset, dtype and length), then the sections themselves, each one aligned on 8 bytes.
+    The terms are sorted by IEML string, and these strings are also stored in a fixed-width array, so that terms
+    can be found with a (vectorized) binary search. Each language
+    has a permutation of the terms sorted by tag for the same purpose. All the strings are stored in a single
+    UTF-8 string table"""
+
+    MAGIC = b"IEMLDICT"
+    VERSION = 2
+    PREFIX = struct.Struct("<8sII") # magic, version, JSON header length
+    NO_STRING = -1 # string index of a missing tag
+    CANONICAL_SEPARATOR = " "
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        magic, version, header_length = self.PREFIX.unpack_from(buffer, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Not a version %i dictionary image" % self.VERSION)
+
+        header = json.loads(bytes(buffer[self.PREFIX.size:self.PREFIX.size + header_length]).decode("utf-8"))
+        self._sections = {name: np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+                          for name, (offset, dtype, count) in header.items()}
+
+        self.ranks = self._sections["RANK"]
+        self.columns = {column: self._sections[column] for column in COLUMNS}
+        self._keys = self._sections["IEML_KEYS"]
+        self._objectids = self._sections["OBJECT_ID"].reshape(-1, 12)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as image_file:
+            return cls(mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def write(cls, term_entries, path):
+        """Writes the image of the given term entries (as found in the terms collection) to path"""
+        term_entries = sorted(term_entries, key=lambda entry: entry["IEML"].encode("utf-8"))
+        ranks = canonical_ranks(term_entries)
+
+        strings = []
+        def add_string(string):
+            if string is None:
+                return cls.NO_STRING
+            strings.append(string.encode("utf-8"))
+            return len(strings) - 1
+
+        fields = ["IEML", "CANONICAL"] + TAG_LANGUAGES
+        string_ids = {field: [] for field in fields}
+        for entry in term_entries:
+            string_ids["IEML"].append(add_string(entry["IEML"]))
+            string_ids["CANONICAL"].append(add_string(cls.CANONICAL_SEPARATOR.join(entry["CANONICAL"])))
+            for language in TAG_LANGUAGES:
+                string_ids[language].append(add_string(entry.get(language)))
+
+        ieml_keys = [entry["IEML"].encode("utf-8") for entry in term_entries]
+        sections = {"IEML_KEYS": np.array(ieml_keys, dtype="S%i" % max(map(len, ieml_keys))),
+                    "STRING_OFFSETS": np.cumsum([0] + [len(string) for string in strings], dtype=np.uint32),
+                    "STRINGS": np.frombuffer(b"".join(strings), dtype=np.uint8),
+                    "OBJECT_ID": np.frombuffer(b"".join(entry["_id"].binary for entry in term_entries),
+                                               dtype=np.uint8),
+                    "RANK": np.array([ranks[entry["IEML"]] for entry in term_entries], dtype=np.int32),
+                    "LAYER": np.array([int(entry["LAYER"]) for entry in term_entries], dtype=np.int8),
+                    "CLASS": np.array([int(entry["CLASS"]) for entry in term_entries], dtype=np.int8),
+                    "PARADIGM": np.array([int(entry["PARADIGM"]) for entry in term_entries], dtype=np.int8),
+                    "TAILLE": np.array([int(entry["TAILLE"]) for entry in term_entries], dtype=np.int32)}
+        for field in fields:
+            sections[field] = np.array(string_ids[field], dtype=np.int32)
+        for language in TAG_LANGUAGES:
+            # terms sorted by tag (the ones without tag for that language are left out)
+            tagged = [i for i, entry in enumerate(term_entries) if entry.get(language) is not None]
+            tagged.sort(key=lambda i: term_entries[i][language].encode("utf-8"))
+            sections["BY_" + language] = np.array(tagged, dtype=np.int32)
+
+        # computing the header (with the final offsets) until its size doesn't change anymore
+        header_length = 0
+        while True:
+            header, offset = {}, cls._align(cls.PREFIX.size + header_length)
+            for name, array in sections.items():
+                header[name] = (offset, array.dtype.str, len(array))
+                offset = cls._align(offset + array.nbytes)
+            encoded_header = json.dumps(header).encode("utf-8")
+            if len(encoded_header) == header_length:
+                break
+            header_length = len(encoded_header)
+
+        with open(path, "wb") as image_file:
+            image_file.write(cls.PREFIX.pack(cls.MAGIC, cls.VERSION, header_length) + encoded_header)
+            for name, array in sections.items():
+                image_file.write(b"\0" * (header[name][0] - image_file.tell()))
+                image_file.write(array.tobytes())
+
+    @staticmethod
+    def _align(offset):
+        return (offset + 7) // 8 * 8
+
+    def _bytes(self, string_id):
+        offsets = self._sections["STRING_OFFSETS"]
+        return self._sections["STRINGS"][offsets[string_id]:offsets[string_id + 1]].tobytes()
+
+    def _string(self, string_id):
+        if string_id == self.NO_STRING:
+            return None
+        return self._bytes(string_id).decode("utf-8")
+
+    def _bisect(self, target, permutation, string_ids):
+        """Binary search of a string in the (sorted) strings of the permuted terms. Returns the term index or None"""
+        target = target.encode("utf-8")
+        low, high = 0, len(permutation)
+        while low < high:
+            middle = (low + high) // 2
+            if self._bytes(string_ids[permutation[middle]]) < target:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < len(permutation) and self._bytes(string_ids[permutation[low]]) == target:
+            return int(permutation[low])
+        return None
+
+    def positions_of(self, ieml_strings):
+        keys = [ieml.encode("utf-8") for ieml in ieml_strings]
+        # the keys that don't fit in the array's width can't be in it, and would be truncated by numpy
+        fitting = np.array([len(key) <= self._keys.itemsize for key in keys], dtype=bool)
+        keys = np.array(keys, dtype=self._keys.dtype)
+        positions = np.minimum(np.searchsorted(self._keys, keys), len(self) - 1)
+        return np.where(fitting & (self._keys[positions] == keys), positions, -1)
+
+    def ieml_at(self, position):
+        return self._string(self._sections["IEML"][position])
+
+    def index_of(self, ieml_string):
+        """Position of the term in the image, or None if it's not in the dictionary"""
+        position = int(self.positions_of([ieml_string])[0])
+        return position if position >= 0 else None
+
+    def entry(self, index):
+        """Rebuilds the entry of the term at that position, in the same format as the terms collection"""
+        entry = {"_id": ObjectId(self._objectids[index].tobytes()),
+                 "IEML": self._string(self._sections["IEML"][index]),
+                 "CANONICAL": tuple(self._string(self._sections["CANONICAL"][index])
+                                    .split(self.CANONICAL_SEPARATOR)),
+                 "RANK": int(self.ranks[index])}
+        for language in TAG_LANGUAGES:
+            entry[language] = self._string(self._sections[language][index])
+        for column in COLUMNS:
+            entry[column] = str(self.columns[column][index])
+        return MappingProxyType(entry)
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def __contains__(self, ieml_string):
+        return self.index_of(ieml_string) is not None
+
+    def __iter__(self):
+        return (self.entry(index) for index in range(len(self)))
+
+    def get(self, ieml_string):
+        index = self.index_of(ieml_string)
+        return self.entry(index) if index is not None else None
+
+    def canonical_forms(self, ieml_string):
+        return self.get(ieml_string)["CANONICAL"]
+
+    def rank(self, ieml_string):
+        return int(self.ranks[self.index_of(ieml_string)])
+
+    def has_tag(self, tag, language):
+        if language not in TAG_LANGUAGES:
+            return False
+        return self._bisect(tag, self._sections["BY_" + language], self._sections[language]) is not None
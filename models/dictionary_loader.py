@@ -0,0 +1,89 @@
+"""Loads the dictionary dump (data/ieml_db_loader.js) in the terms collection, and writes the binary
+image of the dictionary that the server workers map in memory.
+
+Usage, from the project's root folder :
+    python3 -m models.dictionary_loader data/ieml_db_loader.js [--image data/dictionary.img] [--no-db]
+"""
+import argparse
+import json
+import os
+import re
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from .base_queries import DictionaryQueries
+from .constants import DB_NAME_TERM, TERMS_COLLECTION, DICTIONARY_IMAGE_PATH
+from .dictionary import DictionaryImage, canonical_ranks
+
+# an insert of the dump : db.getCollection("terms").insert({ ... });
+INSERT_REGEX = re.compile(r'db\.getCollection\("([\w.]+)"\)\.insert\((\{.*?\})\);\s*$', re.DOTALL | re.MULTILINE)
+# the only shell constructors used in the dump
+OBJECT_ID_REGEX = re.compile(r'ObjectId\("([0-9a-f]{24})"\)')
+NUMBER_INT_REGEX = re.compile(r'NumberInt\((-?\d+)\)')
+
+
+def read_dump(dump_path, collection_name=TERMS_COLLECTION):
+    """Returns the documents that the dump inserts in the given collection, as dicts"""
+    with open(dump_path, encoding="utf-8") as dump_file:
+        dump = dump_file.read()
+
+    documents = []
+    for match in INSERT_REGEX.finditer(dump):
+        if match.group(1) != collection_name:
+            continue # skipping the system.indexes records
+
+        document = OBJECT_ID_REGEX.sub(r'{"$oid": "\1"}', match.group(2))
+        document = NUMBER_INT_REGEX.sub(r'\1', document)
+        documents.append(json.loads(document, object_hook=_decode_object_id))
+
+    return documents
+
+
+def _decode_object_id(document):
+    if list(document) == ["$oid"]:
+        return ObjectId(document["$oid"])
+    return document
+
+
+def load_terms(terms_collection, term_entries):
+    """Replaces the content of the terms collection with the given entries, in one bulk insert.
+    The rank of each term is stored along with it"""
+    ranks = canonical_ranks(term_entries)
+    for entry in term_entries:
+        entry["RANK"] = ranks[entry["IEML"]]
+
+    terms_collection.drop()
+    terms_collection.insert_many(term_entries, ordered=False)
+    terms_collection.create_index([("IEML", ASCENDING), ("FR", ASCENDING), ("EN", ASCENDING)], unique=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loads the IEML dictionary dump in the database "
+                                                 "and writes the dictionary image")
+    parser.add_argument("dump", help="path of the dictionary dump (mongo shell script)")
+    parser.add_argument("--image", default=DICTIONARY_IMAGE_PATH, help="path of the dictionary image to write")
+    parser.add_argument("--no-db", action="store_true", help="only write the image, don't load the terms in the "
+                                                             "database (the dictionary's generation is still bumped)")
+    args = parser.parse_args()
+
+    term_entries = read_dump(args.dump)
+
+    # the image is replaced atomically : the workers that still map the old one keep a consistent view
+    # of it until they notice the new generation
+    DictionaryImage.write(term_entries, args.image + ".tmp")
+    os.replace(args.image + ".tmp", args.image)
+    print("Wrote the dictionary image to %s" % args.image)
+
+    connector = DictionaryQueries()
+    if not args.no_db:
+        load_terms(connector.terms, term_entries)
+        print("Loaded %i terms in %s.%s" % (len(term_entries), DB_NAME_TERM, TERMS_COLLECTION))
+
+    # last, so that the caches are only rebuilt once both the image and the collection are up to date. It's
+    # bumped even if only the image has been rewritten, since the workers only map the new one on a new generation
+    print("Dictionary generation is now %i" % connector.bump_generation())
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@ from .propositions import PropositionsQueries
 from .usl import HyperTextQueries
 from ieml.AST import Term, Text, HyperText, Word, Sentence, SuperSentence
 from .exceptions import InvalidTags, InvalidASTType
+from .search_index import SearchIndexes
+from .constants import TERMS_COLLECTION, AUTOCOMPLETE_MAX_LIMIT
 
 class SearchRequest:
     db_terms = DictionaryQueries()
@@ -20,6 +22,13 @@ class SearchRequest:
             "TYPE": response['TYPE']
         }
 
+    @classmethod
+    def build_search_indexes(cls):
+        """Builds the in-memory search indexes of every collection, from the collections' current content"""
+        cls.db_terms.build_search_index()
+        cls.db_propositions.build_search_index()
+        cls.db_hypertexts.build_search_index()
+
     @classmethod
     def search_string(cls, search_string, languages=None, levels=None, category=None, term_type=None):
         result = []
@@ -37,6 +46,21 @@ class SearchRequest:
 
         return result
 
+    @classmethod
+    def autocomplete(cls, prefix, limit):
+        """Returns, for each level (TERM, WORD, ..., HYPERTEXT), the first elements which IEML string
+        or tags start with the prefix. The number of results per level is capped at AUTOCOMPLETE_MAX_LIMIT"""
+        if SearchIndexes().get(TERMS_COLLECTION) is None:
+            cls.build_search_indexes()
+        else:
+            # the completions of the reloaded dictionary, and of the collections written by another
+            # server process, are rebuilt
+            cls.db_terms.refresh_search_index()
+            cls.db_propositions.refresh_search_index()
+            cls.db_hypertexts.refresh_search_index()
+
+        return SearchIndexes().completions.complete(prefix, max(0, min(limit, AUTOCOMPLETE_MAX_LIMIT)))
+
 
 class IemlDb:
     db_terms = DictionaryQueries()
@@ -2,9 +2,12 @@ import re
 
 import ieml.AST.terms
 from models.exceptions import PropositionAlreadyExists, ObjectTypeNotStoredinDB, ObjectNotFound
-from .base_queries import DBConnector
+from .base_queries import DBConnector, DictionaryQueries
 from .constants import PROPOSITION_COLLECTION, TAG_LANGUAGES
 import ieml.AST
+from ieml.AST.binary import encode, decode
+from ieml.exceptions import UnsupportedBinaryVersion
+from bson import Binary
 from pymongo.errors import DuplicateKeyError
 
 
@@ -13,6 +16,12 @@ class PropositionsQueries(DBConnector):
         super().__init__()
         self.propositions = self.db[PROPOSITION_COLLECTION]
 
+    def build_search_index(self):
+        return self._build_tagged_search_index(self.propositions)
+
+    def refresh_search_index(self):
+        self._tagged_search_index(self.propositions)
+
     @staticmethod
     def _proposition_db_type(proposition):
         """Returns the DB name for a proposition"""
@@ -30,7 +39,7 @@ class PropositionsQueries(DBConnector):
     def check_proposition_stored(self, proposition):
         """Retrieves the objectid of an IEML primitive"""
         if isinstance(proposition, ieml.AST.terms.Term):
-            return self.terms.find_one({"IEML": proposition.ieml}) is not None
+            return DictionaryQueries().exact_ieml_term_search(proposition.ieml) is not None
         elif isinstance(proposition, (ieml.AST.Sentence, ieml.AST.Word, ieml.AST.SuperSentence)):
             return self._check_proposition_exist(str(proposition))
         else:
@@ -43,7 +52,11 @@ class PropositionsQueries(DBConnector):
             "TYPE": self._proposition_db_type(proposition),
             "TAGS": {
                 "FR": proposition_tags["FR"],
-                "EN": proposition_tags["EN"]}}
+                "EN": proposition_tags["EN"]},
+            # multikey field, so that finding the propositions using a term/proposition is an indexed query
+            "CONTAINS": proposition.closed_descendants(),
+            # binary form of the AST, so that it can be loaded back without being parsed
+            "BINARY": Binary(encode(proposition))}
 
         if promotion:
             entry["PROMOTION"] = {
@@ -56,6 +69,8 @@ class PropositionsQueries(DBConnector):
         except DuplicateKeyError:
             raise PropositionAlreadyExists()
 
+        self._index_tagged_entry(self.propositions, entry)
+
     def _check_proposition_exist(self, _id):
         return self.propositions.find_one({"_id": str(_id)}) is not None
 
@@ -78,6 +93,14 @@ class PropositionsQueries(DBConnector):
         }
 
     def search_propositions(self, search_string, languages=None, levels=None):
+        index = self._tagged_search_index(self.propositions)
+        if index is not None:
+            result = index.search(search_string, self._tagged_search_fields(languages))
+            if levels:
+                types = [level.__name__.upper() for level in levels]
+                result = [entry for entry in result if entry["TYPE"] in types]
+            return [self._format_response(entry) for entry in result]
+
         query = {}
 
         if levels:
@@ -109,7 +132,30 @@ class PropositionsQueries(DBConnector):
         else:
             raise ObjectTypeNotStoredinDB()
 
+    def load_proposition(self, ieml):
+        """Returns the (checked) AST of a stored proposition. The propositions stored before the binary
+        form was added (or with an older version of it) are parsed from their IEML"""
+        from ieml.parsing import PropositionsParser
+        entry = self.propositions.find_one({"_id": str(ieml)}, {"BINARY": True})
+        if entry is None:
+            raise ObjectNotFound()
+        if entry.get("BINARY") is not None:
+            try:
+                return decode(entry["BINARY"])
+            except UnsupportedBinaryVersion:
+                pass # stored with an older binary format, it's parsed again
+        return PropositionsParser().parse(entry["_id"])
+
+    def propositions_containing(self, proposition, levels=None):
+        """Returns the stored propositions that contain the input term, word or sentence"""
+        query = {"CONTAINS": str(proposition)}
+        if levels:
+            query['TYPE'] = {"$in": [level.__name__.upper() for level in levels]}
+
+        return [self._format_response(entry) for entry in self.propositions.find(query)]
+
     def update_tags(self, ieml, tags_dict):
         """Updates the tag of a proposition identified by the input IEML"""
         self.propositions.update_one({'_id': ieml},
                                      {'$set': {'TAGS': tags_dict}})
+        self._update_indexed_tags(self.propositions, ieml, tags_dict)
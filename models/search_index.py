@@ -0,0 +1,259 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from threading import RLock
+
+from helpers.metaclasses import Singleton
+from .constants import SEARCH_NGRAM_SIZE
+
+
+def ngrams(string, size=SEARCH_NGRAM_SIZE):
+    """Returns the set of substrings of length size of the input string"""
+    return {string[i:i + size] for i in range(len(string) - size + 1)}
+
+
+class TrigramIndex:
+    """Inverted index going from the n-grams of a few text fields to the documents containing them.
+    It answers the same queries as an unanchored, case-sensitive regex on these fields, without
+    having to scan every document. It's shared by the request threads, so it's only read and changed
+    while holding its lock (which SearchIndexes shares between all its indexes)"""
+
+    def __init__(self, fields, generation=None, lock=None):
+        self.fields = fields
+        self.generation = generation # write counter of the indexed collection, see DBConnector
+        self.lock = lock if lock is not None else RLock()
+        self._documents = {} # key => document
+        self._texts = {} # key => {field : text}
+        self._insertion_order = {} # key => insertion number, used to return documents in a stable order
+        self._insertion_count = 0
+        self._postings = defaultdict(set) # n-gram => keys of the documents containing it
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, key):
+        return key in self._documents
+
+    def get(self, key):
+        return self._documents.get(key)
+
+    def keys(self):
+        with self.lock:
+            return list(self._documents)
+
+    def add(self, key, document, texts):
+        """Indexes a document. texts maps each of the index's fields to the text of the document for that field,
+        a missing or None field is never matched"""
+        with self.lock:
+            self._add(key, document, texts)
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _add(self, key, document, texts):
+        """Same as add, without the lock : only used directly on an index that isn't shared yet"""
+        if key in self._documents:
+            self._remove(key)
+
+        self._documents[key] = document
+        self._texts[key] = {field: texts[field] for field in self.fields if texts.get(field) is not None}
+        self._insertion_order[key] = self._insertion_count
+        self._insertion_count += 1
+        for text in self._texts[key].values():
+            for gram in ngrams(text):
+                self._postings[gram].add(key)
+
+    def _remove(self, key):
+        if key not in self._documents:
+            return
+
+        for text in self._texts[key].values():
+            for gram in ngrams(text):
+                self._postings[gram].discard(key)
+                if not self._postings[gram]:
+                    del self._postings[gram]
+
+        del self._documents[key], self._texts[key], self._insertion_order[key]
+
+    def _candidates(self, search_string):
+        """Keys of the documents that contain all the n-grams of the search string"""
+        if len(search_string) < SEARCH_NGRAM_SIZE:
+            # too short to have an n-gram, every document is a candidate
+            return list(self._documents)
+
+        # intersecting the smallest posting lists first
+        posting_lists = sorted((self._postings.get(gram, set()) for gram in ngrams(search_string)), key=len)
+        candidates = set(posting_lists[0])
+        for posting_list in posting_lists[1:]:
+            if not candidates:
+                break
+            candidates &= posting_list
+
+        return sorted(candidates, key=self._insertion_order.get)
+
+    def search(self, search_string, fields=None):
+        """Returns the documents for which at least one of the fields contains the search string"""
+        fields = self.fields if fields is None else fields
+        result = []
+        with self.lock:
+            for key in self._candidates(search_string):
+                texts = self._texts[key]
+                if any(search_string in texts[field] for field in fields if field in texts):
+                    result.append(self._documents[key])
+        return result
+
+
+class PrefixIndex:
+    """For each level (TERM, WORD, ..., HYPERTEXT), a sorted array of (normalized string, key) couples.
+    A prefix query is two binary searches and a scan of at most a few times the requested number of results,
+    so its cost doesn't depend on the size of the collections. Like TrigramIndex, it's only used while holding
+    its lock"""
+
+    def __init__(self, lock=None):
+        self.lock = lock if lock is not None else RLock()
+        self._arrays = defaultdict(list) # level => sorted list of (normalized string, key)
+        self._entries = {} # key => (level, document, normalized strings)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(string):
+        return string.casefold()
+
+    def add(self, level, key, document, strings):
+        with self.lock:
+            if key in self._entries:
+                self.remove(key)
+
+            normalized_strings = {self.normalize(string) for string in strings}
+            self._entries[key] = (level, document, normalized_strings)
+            for string in normalized_strings:
+                insort(self._arrays[level], (string, key))
+
+    def remove(self, key):
+        with self.lock:
+            if key not in self._entries:
+                return
+
+            level, _, normalized_strings = self._entries.pop(key)
+            array = self._arrays[level]
+            for string in normalized_strings:
+                del array[bisect_left(array, (string, key))]
+
+    @classmethod
+    def sort_entries(cls, entries):
+        """Normalizes and sorts an iterable of (level, key, document, strings) entries into what update takes.
+        It doesn't touch the index, so it's done before taking the lock"""
+        normalized_entries, arrays = {}, defaultdict(list)
+        for level, key, document, strings in entries:
+            normalized_strings = {cls.normalize(string) for string in strings}
+            normalized_entries[key] = (level, document, normalized_strings)
+            arrays[level].extend((string, key) for string in normalized_strings)
+
+        for array in arrays.values():
+            array.sort()
+        return normalized_entries, arrays
+
+    def update(self, removed_keys, sorted_entries):
+        """Removes the entries of some keys and adds a batch of entries (see sort_entries), with a single
+        pass over each array involved instead of a binary insertion or deletion per string"""
+        new_entries, new_arrays = sorted_entries
+        with self.lock:
+            removed_keys = {key for key in removed_keys if key in self._entries} | \
+                           {key for key in new_entries if key in self._entries}
+            levels = {self._entries.pop(key)[0] for key in removed_keys} | set(new_arrays)
+            for level in levels:
+                array = self._arrays[level]
+                if removed_keys:
+                    array = [item for item in array if item[1] not in removed_keys]
+                # both lists are already sorted, a run that the sort merges in linear time
+                self._arrays[level] = sorted(array + new_arrays.get(level, []))
+            self._entries.update(new_entries)
+
+    def complete(self, prefix, limit, levels=None):
+        """Returns, for each level, at most limit documents having a string starting with the prefix,
+        in alphabetical order of the matching string"""
+        prefix = self.normalize(prefix)
+        result = {}
+        with self.lock:
+            for level in (list(self._arrays) if levels is None else levels):
+                array = self._arrays.get(level, [])
+                matches, seen_keys = [], set()
+                position = bisect_left(array, (prefix,))
+                while position < len(array) and len(matches) < limit and array[position][0].startswith(prefix):
+                    key = array[position][1]
+                    if key not in seen_keys: # a document can match through several of its strings
+                        seen_keys.add(key)
+                        matches.append(self._entries[key][1])
+                    position += 1
+
+                if matches:
+                    result[level] = matches
+        return result
+
+
+class SearchIndexes(metaclass=Singleton):
+    """Holds the search index of each collection, so that all the query classes
+    working on a same collection share the same index. The prefix index used for
+    autocompletion is shared by all the collections.
+
+    The indexes are kept by each server process. The ones of the tagged collections are tagged with the
+    collection's write counter (see DBConnector), so that a process rebuilds them once another one has
+    written in the collection. All the indexes share a single lock, so that an entry is added to the
+    n-gram and prefix indexes at once, and that the searches never see an index being (re)built"""
+
+    def __init__(self):
+        self.lock = RLock()
+        self._indexes = {}
+        self.completions = PrefixIndex(self.lock)
+
+    def get(self, collection_name):
+        """Returns the index for that collection, or None if it hasn't been built"""
+        return self._indexes.get(collection_name)
+
+    def build(self, collection_name, fields, entries, key_function, texts_function, response_function,
+              generation=None):
+        """(Re)builds the indexes of a collection from an iterable of its entries. response_function
+        returns the {IEML, TAGS, TYPE} response that autocompletion gives for an entry. generation is the
+        collection's write counter, read before the entries"""
+        # the entries (usually a database cursor) are indexed without the lock, in a new index that isn't
+        # shared yet, and the completions are sorted at once : the lock is only taken to swap them in
+        index = TrigramIndex(fields, generation, self.lock)
+        completions = []
+        for entry in entries:
+            key, texts, response = key_function(entry), texts_function(entry), response_function(entry)
+            index._add(key, entry, texts)
+            completions.append((response["TYPE"], (collection_name, key), response, self._strings(texts)))
+        completions = PrefixIndex.sort_entries(completions)
+
+        with self.lock:
+            previous_index = self._indexes.get(collection_name)
+            previous_keys = [(collection_name, key) for key in previous_index.keys()] \
+                if previous_index is not None else []
+            self.completions.update(previous_keys, completions)
+            self._indexes[collection_name] = index
+
+        return index
+
+    @staticmethod
+    def _strings(texts):
+        """The strings of an entry that autocompletion matches the prefixes against"""
+        return [text for text in texts.values() if text is not None]
+
+    def add(self, collection_name, key, entry, texts, response):
+        """Adds (or replaces) an entry in the indexes of its collection. Does nothing if they haven't been built"""
+        with self.lock:
+            index = self._indexes.get(collection_name)
+            if index is None:
+                return
+
+            index.add(key, entry, texts)
+            self.completions.add(response["TYPE"], (collection_name, key), response, self._strings(texts))
+
+    def drop(self, collection_name):
+        with self.lock:
+            index = self._indexes.pop(collection_name, None)
+            if index is not None:
+                self.completions.update([(collection_name, key) for key in index.keys()],
+                                        PrefixIndex.sort_entries([]))
@@ -1,8 +1,11 @@
 from .base_queries import DBConnector, Tag
 from .constants import TEXT_COLLECTION, HYPERTEXT_COLLECTION, TAG_LANGUAGES
-from .exceptions import InvalidTags, TextAlreadyExists, HypertextAlreadyExists
+from .exceptions import InvalidTags, TextAlreadyExists, HypertextAlreadyExists, ObjectNotFound
 from ieml.AST import HyperText, Text
+from ieml.AST.binary import encode, decode
+from ieml.exceptions import UnsupportedBinaryVersion
 import re
+from bson import Binary
 from pymongo.errors import DuplicateKeyError
 
 
@@ -11,16 +14,45 @@ class TextQueries(DBConnector):
         super().__init__()
         self.texts = self.db[TEXT_COLLECTION]
 
+    def build_search_index(self):
+        return self._build_tagged_search_index(self.texts, "TEXT")
+
+    def refresh_search_index(self):
+        self._tagged_search_index(self.texts, "TEXT")
+
     def _write_text_to_db(self, text, tags):
+        entry = {
+            "_id" : str(text),
+            "TAGS" : tags,
+            "PROPOSITIONS" : [str(e) for e in text.children],
+            "BINARY" : Binary(encode(text))
+        }
         try:
-            self.texts.insert_one({
-                "_id" : str(text),
-                "TAGS" : tags,
-                "PROPOSITIONS" : [str(e) for e in text.children]
-            })
+            self.texts.insert_one(entry)
         except DuplicateKeyError:
             raise TextAlreadyExists()
 
+        self._index_tagged_entry(self.texts, entry, "TEXT")
+
+    @staticmethod
+    def _load_usl(collection, ieml):
+        """Returns the AST of a stored text or hypertext, from its binary form if it has been stored (else it's
+        parsed from its IEML, like the ones stored with an older binary format)"""
+        from ieml.parsing import USLParser
+        entry = collection.find_one({"_id": str(ieml)}, {"BINARY": True})
+        if entry is None:
+            raise ObjectNotFound()
+        if entry.get("BINARY") is not None:
+            try:
+                return decode(entry["BINARY"])
+            except UnsupportedBinaryVersion:
+                pass # stored with an older binary format, it's parsed again
+        return USLParser().parse(entry["_id"])
+
+    def load_text(self, ieml):
+        ast = self._load_usl(self.texts, ieml)
+        return ast.children[0] if isinstance(ast, HyperText) else ast
+
     def get_text_from_ieml(self, text_ieml):
         return self.texts.find_one({"_id" : text_ieml})
 
@@ -34,6 +66,10 @@ class TextQueries(DBConnector):
         self._write_text_to_db(text, tags)
 
     def search_text(self, search_string):
+        index = self._tagged_search_index(self.texts, "TEXT")
+        if index is not None:
+            return index.search(search_string)
+
         regex = re.compile(re.escape(search_string))
         result = self.texts.find({'$or': [
                         {'_id': {'$regex': regex}},
@@ -48,6 +84,7 @@ class TextQueries(DBConnector):
         """Updates the tag of a text identified by the input IEML"""
         self.texts.update_one({'_id': ieml},
                               {'$set': {'TAGS': tags_dict}})
+        self._update_indexed_tags(self.texts, ieml, tags_dict, "TEXT")
 
 
 class HyperTextQueries(TextQueries):
@@ -55,26 +92,38 @@ class HyperTextQueries(TextQueries):
         super().__init__()
         self.hypertexts = self.db[HYPERTEXT_COLLECTION]
 
+    def build_search_index(self):
+        super().build_search_index()
+        return self._build_tagged_search_index(self.hypertexts, "HYPERTEXT")
+
+    def refresh_search_index(self):
+        super().refresh_search_index()
+        self._tagged_search_index(self.hypertexts, "HYPERTEXT")
+
     def _write_hypertext_to_db(self, hypertext, tags):
+        entry = {
+            "TAGS": tags,
+            "_id": str(hypertext),
+            "BINARY": Binary(encode(hypertext)),
+            "TEXTS": [str(t) for t in hypertext.texts],
+            "HYPERLINK": [
+                {
+                    'substance': transition[0],
+                    'attribute': transition[1],
+                    'mode': {
+                        'PATH': transition[2].to_ieml_list(),
+                        'LITERAL': transition[3]
+                    }
+                } for transition in hypertext.transitions
+            ]
+        }
         try:
-            self.hypertexts.insert_one({
-                "TAGS": tags,
-                "_id": str(hypertext),
-                "TEXTS": [str(t) for t in hypertext.texts],
-                "HYPERLINK": [
-                    {
-                        'substance': transition[0],
-                        'attribute': transition[1],
-                        'mode': {
-                            'PATH': transition[2].to_ieml_list(),
-                            'LITERAL': transition[3]
-                        }
-                    } for transition in hypertext.transitions
-                ]
-            })
+            self.hypertexts.insert_one(entry)
         except DuplicateKeyError:
             raise HypertextAlreadyExists()
 
+        self._index_tagged_entry(self.hypertexts, entry, "HYPERTEXT")
+
     def exact_hypertext_search(self, ieml):
         return self.hypertexts.find_one({"_id": str(ieml)})
 
@@ -84,6 +133,9 @@ class HyperTextQueries(TextQueries):
 
         self._write_hypertext_to_db(hypertext, tag)
 
+    def load_hypertext(self, ieml):
+        return self._load_usl(self.hypertexts, ieml)
+
     def get_hypertext_from_ieml(self, ieml_string):
         self.hypertexts.find_one({"_id": ieml_string})
 
@@ -100,6 +152,7 @@ class HyperTextQueries(TextQueries):
         """Updates the tag of a text identified by the input IEML"""
         self.hypertexts.update_one({'_id': ieml},
                                    {'$set': {'TAGS': tags_dict}})
+        self._update_indexed_tags(self.hypertexts, ieml, tags_dict, "HYPERTEXT")
 
     def _format_response(self, response, hypertext=True):
         return {
@@ -108,6 +161,12 @@ class HyperTextQueries(TextQueries):
             "TYPE": "HYPERTEXT" if hypertext else "TEXT"
         }
 
+    def _search_collection(self, collection, ieml_type, query, search_string, languages):
+        index = self._tagged_search_index(collection, ieml_type)
+        if index is not None:
+            return index.search(search_string, self._tagged_search_fields(languages))
+        return collection.find(query)
+
     def search_request(self, search_string, languages, levels):
         query = {}
         regex = {'$regex': re.compile(re.escape(search_string))}
@@ -124,9 +183,12 @@ class HyperTextQueries(TextQueries):
 
         result = []
         if levels is None or HyperText in levels:
-            result = [self._format_response(entry, False) for entry in self.hypertexts.find(query)]
+            result = [self._format_response(entry, False)
+                      for entry in self._search_collection(self.hypertexts, "HYPERTEXT", query, search_string,
+                                                           languages)]
 
         if levels is None or Text in levels:
-            result.extend([self._format_response(entry, False) for entry in self.texts.find(query)])
+            result.extend([self._format_response(entry, False)
+                           for entry in self._search_collection(self.texts, "TEXT", query, search_string, languages)])
 
         return result
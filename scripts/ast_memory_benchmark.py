@@ -0,0 +1,97 @@
+"""Measures the memory taken by the nodes of random ASTs, with the slotted node classes and with equivalent
+dict-backed classes (i.e., what the nodes cost before they were slotted).
+
+Only the nodes themselves are measured : both versions share the same children lists, strings, etc.
+Needs the dictionary in the database. Usage, from the project's root folder :
+    python3 -m scripts.ast_memory_benchmark [--count 20] [--seed 0]
+"""
+import argparse
+import tracemalloc
+from collections import defaultdict
+
+from ieml.AST import Term, SuperSentence, Text, HyperText
+from ieml.AST.tools import RandomPropositionGenerator
+
+
+def slots_of(cls):
+    """All the slots of a class, including the inherited ones"""
+    return [slot for klass in cls.__mro__ for slot in getattr(klass, '__slots__', ()) if slot != '__weakref__']
+
+
+def collect_nodes(root):
+    """Distinct nodes of the AST (terms are shared between ASTs, so they're only counted once)"""
+    nodes, stack = {}, [root]
+    while stack:
+        node = stack.pop()
+        if id(node) in nodes:
+            continue
+        nodes[id(node)] = node
+        if not isinstance(node, Term):
+            stack.extend(child for child in node.children if child is not None)
+    return list(nodes.values())
+
+
+def measure(nodes, make_copy):
+    """Bytes allocated to copy each node with make_copy, by node class"""
+    copies, sizes = [None] * len(nodes), defaultdict(int) # preallocated, so that only the copies are measured
+    tracemalloc.start()
+    for i, node in enumerate(nodes):
+        before = tracemalloc.get_traced_memory()[0]
+        copies[i] = make_copy(node)
+        sizes[type(node).__name__] += tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return sizes
+
+
+def slotted_copy(node):
+    copy = type(node).__new__(type(node))
+    for slot in slots_of(type(node)):
+        if hasattr(node, slot):
+            setattr(copy, slot, getattr(node, slot))
+    return copy
+
+
+def dict_backed_copy_function(nodes):
+    # one class per node class, like before, so that the instances' attribute layout is the same.
+    # They're created beforehand so that they aren't counted in the measure
+    dict_classes = {cls: type(cls.__name__, (), {}) for cls in set(type(node) for node in nodes)}
+
+    def dict_backed_copy(node):
+        cls = type(node)
+        copy = dict_classes[cls]()
+        for slot in slots_of(cls):
+            if hasattr(node, slot):
+                setattr(copy, slot, getattr(node, slot))
+        return copy
+
+    return dict_backed_copy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-node memory of slotted vs dict-backed AST nodes")
+    parser.add_argument("--count", type=int, default=20, help="number of random supersentences to build")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = RandomPropositionGenerator()
+    generator.seed(args.seed)
+    propositions = [generator.get_random_proposition(SuperSentence) for i in range(args.count)]
+    nodes = collect_nodes(HyperText(Text(propositions)))
+
+    counts = defaultdict(int)
+    for node in nodes:
+        counts[type(node).__name__] += 1
+
+    slotted = measure(nodes, slotted_copy)
+    dict_backed = measure(nodes, dict_backed_copy_function(nodes))
+
+    print("%-14s %8s %14s %14s" % ("node", "count", "slotted B/node", "dict B/node"))
+    for name in sorted(counts, key=counts.get, reverse=True):
+        print("%-14s %8i %14.1f %14.1f" % (name, counts[name], slotted[name] / counts[name],
+                                          dict_backed[name] / counts[name]))
+    print("%-14s %8i %14.1f %14.1f" % ("all", len(nodes), sum(slotted.values()) / len(nodes),
+                                      sum(dict_backed.values()) / len(nodes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 
 db.propositions.createIndex({ "TAGS.FR" : 1 }, { unique: true })
 db.propositions.createIndex({"TAGS.EN" : 1}, {unique: true})
+db.propositions.createIndex({ "CONTAINS" : 1 })
 
 db.texts.createIndex({ "TAGS.FR" : 1 }, { unique: true })
 db.texts.createIndex({ "TAGS.EN" : 1 }, { unique: true })
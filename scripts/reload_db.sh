@@ -2,5 +2,5 @@
 # Run this script while being in the project's root folder, that's all I ask of you
 
 mongo scripts/drop_db.sh
-mongo db3 data/ieml_db_loader.js
+python3 -m models.dictionary_loader data/ieml_db_loader.js
 mongo ieml_db scripts/indexing.sh
\ No newline at end of file
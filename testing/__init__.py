@@ -1,9 +1,11 @@
-from .api import TestGraphValidator, TestSentenceGraphValidator
-from .ast import TestTermsFeatures, TestMorphemesFeatures, TestWords, TestClauses, \
-    TestSentences, TestMetaFeatures, TestPropositionsInclusion, TestSuperSentence, \
-    TestIsNull, TestIsPromotion
+from .api import TestGraphValidator, TestSentenceGraphValidator, TestValidationSession, TestUSLRender, \
+    TestHyperTextValidator
+from .ast import TestTermsFeatures, TestTermRegistry, TestPropositionFactory, TestFrozenElements, \
+    TestBinaryEncoding, TestMorphemesFeatures, TestWords, TestClauses, TestSentences, TestMetaFeatures, \
+    TestPropositionsInclusion, TestSuperSentence, TestIsNull, TestIsPromotion
 from .usl import TestHypertext, TestTexts
-from .db import TestDBQueries, TestUnicityDb
-from .parser import TestPropositionParser, TestUSLParser
+from .db import TestDBQueries, TestUnicityDb, TestDictionarySnapshot, TestDictionaryImage, \
+    TestDictionaryGeneration, TestTermFilters, TestSearchIndex
+from .parser import TestPropositionParser, TestUSLParser, TestParserCache
 from .tools import TestRandomGenerator, TestPromotion
 from .metadata import TestMetadata
\ No newline at end of file
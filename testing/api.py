@@ -1,6 +1,11 @@
-from handlers import WordGraphCheckerHandler, GraphCheckerHandler, TextDecompositionHandler
+from flask import Flask
+from handlers import WordGraphCheckerHandler, GraphCheckerHandler, TextDecompositionHandler, USLRenderHandler, \
+    HyperTextValidatorHandler, ValidationSessionOpeningHandler, ValidationSessionDeltaHandler, \
+    ValidationSessionClosingHandler
+from handlers.sessions import ValidationSessions
+from handlers.exceptions import UnknownValidationSession
 from .helper import *
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 
 class TestGraphValidator(unittest.TestCase):
@@ -116,6 +121,147 @@ class TestSentenceGraphValidator(unittest.TestCase):
         self.assertIn("ERROR_CODE", request_output)
         self.assertEqual(request_output["ERROR_CODE"], 2)
 
+    def test_all_errors_reported(self):
+        words = list(get_words_list())
+        edges = [(1, 2), (1, 3), (2, 4), (3, 4), (5, 6), (6, 5)] # 4 has two parents, 5 and 6 are a separate cycle
+        self.sentence_handler.json_data = {"validation_type" : 1,
+                                           "nodes" : [{"id" : i + 1, "ieml_string" : str(word)}
+                                                      for i, word in enumerate(words)],
+                                           "graph" : [{"substance" : substance, "attribute" : attribute, "mode" : 6}
+                                                      for substance, attribute in edges],
+                                           "tags" : {"fr" : "", "en" : ""}
+                                           }
+        request_output = self.sentence_handler.post()
+        self.assertEqual(request_output["ERROR_CODE"], 2)
+        errors = [(error["TYPE"], error["NODES"]) for error in request_output["ERRORS"]]
+        self.assertEqual(errors, [("NodeHasTooMuchParents", [4]),
+                                  ("NodeInCycle", [5]), ("NodeInCycle", [6]),
+                                  ("NodeNotConnected", [5]), ("NodeNotConnected", [6])])
+
+
+class TestValidationSession(unittest.TestCase):
+
+    def _post(self, handler_class, json_data):
+        handler = handler_class()
+        handler.do_request_parsing = MagicMock(name="do_request_parsing")
+        handler.json_data = json_data
+        return handler.post()
+
+    def setUp(self):
+        self.words = list(get_words_list())
+        self.session_id = self._post(ValidationSessionOpeningHandler, {"validation_type": 1})["session"]
+
+    def tearDown(self):
+        self._post(ValidationSessionClosingHandler, {"session": self.session_id})
+
+    def _send_delta(self, **delta):
+        return self._post(ValidationSessionDeltaHandler, dict(delta, session=self.session_id))
+
+    def test_incremental_validation(self):
+        a, b, c, d, e, f = self.words
+        self._send_delta(add_nodes=[{"id": i + 1, "ieml_string": str(word)} for i, word in enumerate(self.words)],
+                         add_edges=[{"substance": 1, "attribute": 2, "mode": 6},
+                                    {"substance": 1, "attribute": 3, "mode": 6},
+                                    {"substance": 2, "attribute": 4, "mode": 6}])
+        with patch.object(PropositionsParser, "parse", wraps=PropositionsParser().parse) as parse:
+            response = self._send_delta(add_edges=[{"substance": 2, "attribute": 5, "mode": 6}])
+            self.assertEqual(response["ieml"], str(get_test_sentence()))
+            response = self._send_delta(add_nodes=[{"id": 7, "ieml_string": str(e)}],
+                                        remove_nodes=[5],
+                                        add_edges=[{"substance": 2, "attribute": 7, "mode": 6}])
+            self.assertEqual(response["ieml"], str(get_test_sentence()))
+        self.assertEqual(parse.call_count, 1) # only the added node has been parsed
+
+    def test_errors_reported(self):
+        self._send_delta(add_nodes=[{"id": i + 1, "ieml_string": str(word)} for i, word in enumerate(self.words)],
+                         add_edges=[{"substance": 1, "attribute": 2, "mode": 6},
+                                    {"substance": 3, "attribute": 4, "mode": 6}])
+        response = self._send_delta(add_edges=[{"substance": 2, "attribute": 4, "mode": 6}])
+        self.assertEqual(response["ERROR_CODE"], 3)
+        self.assertEqual(response["ERRORS"][0]["NODES"], [1, 3])
+        response = self._send_delta(remove_edges=[{"substance": 3, "attribute": 4}])
+        self.assertTrue(response["valid"])
+
+    def test_closed_session(self):
+        self._post(ValidationSessionClosingHandler, {"session": self.session_id})
+        response = self._send_delta(add_nodes=[{"id": 1, "ieml_string": str(self.words[0])}])
+        self.assertEqual(response["ERROR_CODE"], 6)
+
+    def test_failed_delta_not_applied(self):
+        self._send_delta(add_nodes=[{"id": i + 1, "ieml_string": str(word)} for i, word in enumerate(self.words)],
+                         add_edges=[{"substance": 1, "attribute": 2, "mode": 6}])
+        session = ValidationSessions().get(self.session_id)
+        nodes, edges = dict(session.nodes), dict(session.edges)
+
+        response = self._send_delta(remove_edges=[{"substance": 1, "attribute": 2}], remove_nodes=[3],
+                                    add_edges=[{"substance": 1, "attribute": 99, "mode": 6}])
+        self.assertEqual(response["ERROR_CODE"], 6)
+        response = self._send_delta(remove_edges=[{"substance": 1, "attribute": 2}],
+                                    add_nodes=[{"id": 7, "ieml_string": "[([E:A:Tqsdf])]"}])
+        self.assertIn("ERROR_CODE", response)
+        self.assertEqual((session.nodes, session.edges), (nodes, edges))
+        self.assertTrue(self._send_delta()["valid"])
+
+    def test_invalid_edges(self):
+        self._send_delta(add_nodes=[{"id": i + 1, "ieml_string": str(word)} for i, word in enumerate(self.words)],
+                         add_edges=[{"substance": 1, "attribute": 2, "mode": 6}])
+        response = self._send_delta(add_edges=[{"substance": 1, "attribute": 7, "mode": 6}])
+        self.assertEqual(response["ERROR_CODE"], 6)
+        response = self._send_delta(add_edges=[{"substance": 1, "attribute": 2, "mode": 5}])
+        self.assertEqual(response["ERROR_CODE"], 6)
+        self.assertEqual(ValidationSessions().get(self.session_id).edges, {(1, 2): 6})
+
+        # the mode of an edge is changed by removing it first
+        self._send_delta(remove_edges=[{"substance": 1, "attribute": 2}],
+                         add_edges=[{"substance": 1, "attribute": 2, "mode": 5}])
+        self.assertEqual(ValidationSessions().get(self.session_id).edges, {(1, 2): 5})
+
+    def test_least_recently_used_sessions_dropped(self):
+        sessions = ValidationSessions()
+        max_count, sessions.max_count = sessions.max_count, len(sessions) + 1
+        try:
+            other_session_id, _ = sessions.open()
+            sessions.get(self.session_id)
+            sessions.open()
+            with self.assertRaises(UnknownValidationSession):
+                sessions.get(other_session_id)
+            sessions.get(self.session_id)
+        finally:
+            sessions.max_count = max_count
+
+
+class TestUSLRender(unittest.TestCase):
+
+    def setUp(self):
+        self.render_handler = USLRenderHandler()
+        self.render_handler.do_request_parsing = MagicMock(name="do_request_parsing")
+
+    def test_streamed_render(self):
+        sentence = get_test_sentence()
+        self.render_handler.args = {"data": "{/%s/}" % str(sentence)}
+        with Flask(__name__).test_request_context():
+            response = self.render_handler.post()
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.get_data(as_text=True), "{/%s/}" % str(sentence))
+
+
+class TestHyperTextValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.hypertext_handler = HyperTextValidatorHandler()
+        self.hypertext_handler.db_connector_text = Mock()
+        self.hypertext_handler.do_request_parsing = MagicMock(name="do_request_parsing")
+
+    def test_hyperlink_to_unknown_hypertext(self):
+        sentence = get_test_sentence()
+        self.hypertext_handler.json_data = {"nodes": [{"id": 1, "ieml_string": "{/%s/}" % str(sentence)}],
+                                            "graph": [{"substance": 1, "attribute": 2,
+                                                       "mode": {"selection": [str(sentence)], "literal": "lit"}}],
+                                            "tags": {"FR": "", "EN": ""}}
+        response = self.hypertext_handler.post()
+        self.assertEqual(response["ERROR_CODE"], 7)
+        self.hypertext_handler.db_connector_text.save_hypertext.assert_not_called()
+
 
 class TestTextDecomposition(unittest.TestCase):
     # TODO : Fix this unittest
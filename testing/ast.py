@@ -1,9 +1,18 @@
+import gc
+import sys
+
 import numpy as np
 
-from ieml.AST.tools import RandomPropositionGenerator, NULL_WORD, NULL_SENTENCE, NULL_SUPERSENTENCE, NULL_CLAUSE, \
-    NULL_MORPHEME, NULL_SUPERCLAUSE, promote_to
+from ieml.AST import TermRegistry, PropositionPath, PropositionFactory
+from ieml.AST.tools import RandomPropositionGenerator, null_element, promote_to, check_sentences
 from ieml.AST.usl import Text, HyperText
-from ieml.exceptions import SeveralRootNodeFound, NodeHasTooMuchParents, NoRootNodeFound
+from ieml.AST.commons import TreeStructure
+from ieml.AST.propositional_graph import PropositionGraph, BatchGraphValidator
+from ieml.AST.binary import encode, decode, MAGIC, VERSION
+from ieml.parsing import USLParser
+from ieml.exceptions import SeveralRootNodeFound, NodeHasTooMuchParents, NoRootNodeFound, \
+    CannotRenderElementWithoutOrdering, InvalidBinaryAST, UnsupportedBinaryVersion, FrozenElementModified, \
+    TooManyNodesInGraph, NodeInCycle, NodeNotConnected
 from testing.helper import *
 
 
@@ -34,6 +43,71 @@ class TestMetaFeatures(unittest.TestCase):
         self.assertTrue(hypertext.is_checked())
         self.assertTrue(hypertext.is_ordered())
 
+    def test_sort_keys(self):
+        words = list(get_words_list()) # already sorted
+        for smaller, bigger in zip(words, words[1:]):
+            self.assertLess(smaller.sort_key, bigger.sort_key)
+            self.assertLess(smaller, bigger)
+        self.assertEqual(sorted(reversed(words), key=lambda word: word.sort_key), words)
+
+        sentence = get_test_sentence()
+        self.assertEqual(sentence.sort_key, tuple(clause.sort_key for clause in sentence.children))
+        with self.assertRaises(CannotRenderElementWithoutOrdering):
+            Word(Morpheme([Term("E:A:T:.")])).sort_key
+
+    def test_structural_hash(self):
+        proposition = get_test_sentence()
+        same_proposition = PropositionsParser().parse(str(proposition)) # built from other instances
+        self.assertIsNotNone(proposition._hash)
+        self.assertEqual(hash(proposition), hash(same_proposition))
+        self.assertEqual(proposition, same_proposition)
+
+    def test_equality_short_circuits_on_hash(self):
+        class UncomparableChildren(list):
+            def __eq__(self, other):
+                raise AssertionError("the children shouldn't be compared")
+
+        proposition = RandomPropositionGenerator().get_random_proposition(Sentence)
+        other_proposition = RandomPropositionGenerator().get_random_proposition(Sentence)
+        self.assertNotEqual(hash(proposition), hash(other_proposition))
+        proposition.children = UncomparableChildren(proposition.children)
+        self.assertFalse(proposition == other_proposition)
+        self.assertTrue(proposition == proposition)
+
+    def test_checked_tree_isnt_traversed_again(self):
+        word = Word(Morpheme([Term("E:A:T:."), Term("E:S:.wa.-")]), Morpheme([Term("E:S:.o.-")]))
+        self.assertEqual(word.check(), 3)
+        self.assertEqual(word.check(), 0)
+
+        proposition = RandomPropositionGenerator().get_random_proposition(SuperSentence)
+        self.assertEqual(proposition.check(), 0)
+        null_word = null_element(Word)
+        self.assertEqual(Sentence([Clause(null_word, word, null_word)]).check(), 2) # only the new clause and sentence
+
+    def test_deep_tree_check(self):
+        class Node(TreeStructure):
+            def __init__(self, child=None):
+                super().__init__()
+                self.children = [child] if child is not None else []
+
+        depth = sys.getrecursionlimit() * 2
+        root = Node()
+        for i in range(depth - 1):
+            root = Node(root)
+        self.assertEqual(root.check(), depth)
+        self.assertTrue(root.is_ordered())
+
+    def test_slotted_nodes(self):
+        """None of the AST nodes should carry an instance dictionary"""
+        proposition = RandomPropositionGenerator().get_random_proposition(SuperSentence)
+        hypertext = HyperText(Text([proposition]))
+        superclause = proposition.children[0]
+        word = superclause.subst.children[0].subst
+        for node in [hypertext, hypertext.children[0], proposition, superclause, superclause.subst,
+                     superclause.subst.children[0], word, word.subst, word.subst.children[0], PropositionPath()]:
+            with self.subTest(node=type(node).__name__):
+                self.assertFalse(hasattr(node, "__dict__"))
+
 
 class TestPropositionsInclusion(unittest.TestCase):
 
@@ -54,6 +128,16 @@ class TestPropositionsInclusion(unittest.TestCase):
         word = self.parser.parse("[([wo.S:.-])]")
         self.assertNotIn(word, self.sentence)
 
+    def test_descendants_index(self):
+        self.assertIsNone(self.sentence._descendants) # only built when needed
+        word = self.parser.parse("[([h.O:T:.-])]")
+        self.assertIn(word, self.sentence)
+        self.assertIn(word, self.sentence.descendants_index()[hash(word)])
+        self.assertIn(word.subst, self.sentence) # non closed propositions are indexed too
+        self.assertIn("[([h.O:T:.-])]", self.sentence.closed_descendants())
+        self.assertIn("[h.O:T:.-]", self.sentence.closed_descendants())
+        self.assertNotIn(str(self.sentence), self.sentence.closed_descendants())
+
 class TestTermsFeatures(unittest.TestCase):
     """Checks basic AST features like hashing, ordering for words, morphemes and terms"""
 
@@ -102,6 +186,185 @@ class TestTermsFeatures(unittest.TestCase):
         self.assertEqual(len(terms_set), 3)
 
 
+class TestTermRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = TermRegistry()
+
+    def test_interned_instance(self):
+        term = self.registry.get("E:A:T:.")
+        self.assertIs(term, self.registry.get("[E:A:T:.]"))
+        self.assertEqual(term.objectid, ObjectId("55d220df6653c32453c0ac94"))
+
+    def test_null_term(self):
+        null_term = self.registry.get("E:")
+        self.assertIs(null_term, self.registry.null_term)
+        self.assertIs(null_term, null_element(Term))
+        self.assertTrue(null_term.is_null)
+        self.assertFalse(self.registry.get("E:A:T:.").is_null)
+        self.assertFalse(Term("E:").is_null) # only the registry's null term is
+
+    def test_unknown_term(self):
+        with self.assertRaises(IEMLTermNotFoundInDictionnary):
+            self.registry.get("E:A:Tqsdf")
+        self.assertNotIn("E:A:Tqsdf", self.registry)
+
+    def test_parser_hands_out_interned_terms(self):
+        word = PropositionsParser().parse("[([E:A:T:.]+[E:S:.wa.-])]")
+        self.assertIs(word.subst.children[0], self.registry.get("E:A:T:."))
+
+
+class TestPropositionFactory(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = PropositionFactory()
+        self.terms = [TermRegistry().get(ieml) for ieml in ["E:A:T:.", "E:S:.wa.-", "E:S:.o.-"]]
+        PropositionsParser().cache.clear() # the cached ASTs keep their nodes alive
+        gc.collect()
+
+    def test_shared_morphemes(self):
+        morpheme = self.factory.morpheme(self.terms)
+        self.assertIs(morpheme, self.factory.morpheme(list(reversed(self.terms))))
+        self.assertTrue(morpheme.is_checked())
+        self.assertIsNot(morpheme, self.factory.morpheme(self.terms[:2]))
+
+    def test_shared_words(self):
+        morpheme = self.factory.morpheme(self.terms[:1])
+        word = self.factory.word(morpheme)
+        self.assertIs(word, self.factory.word(self.factory.morpheme(self.terms[:1])))
+        self.assertIsNot(word, self.factory.word(morpheme, self.factory.morpheme(self.terms[1:])))
+        self.assertEqual(str(word), "[([E:A:T:.])]")
+
+    def test_nodes_are_weakly_kept(self):
+        node_count = len(self.factory)
+        word = self.factory.word(self.factory.morpheme(self.terms[1:]))
+        self.assertEqual(len(self.factory), node_count + 2)
+        del word
+        gc.collect()
+        self.assertEqual(len(self.factory), node_count)
+
+    def test_invalid_node_not_kept(self):
+        node_count = len(self.factory)
+        with self.assertRaises(IndistintiveTermsExist):
+            self.factory.morpheme([self.terms[0], self.terms[0]])
+        self.assertEqual(len(self.factory), node_count)
+
+
+class TestFrozenElements(unittest.TestCase):
+
+    def test_freeze_makes_tuples(self):
+        sentence = get_test_sentence()
+        self.assertIs(sentence.freeze(), sentence)
+        for node in [sentence, sentence.children[0], sentence.children[0].subst, sentence.children[0].subst.subst]:
+            with self.subTest(node=type(node).__name__):
+                self.assertTrue(node.is_frozen())
+                self.assertIsInstance(node.children, tuple)
+
+    def test_frozen_element_is_read_only(self):
+        sentence = get_test_sentence().freeze()
+        word = sentence.children[0].subst
+        with self.assertRaises(FrozenElementModified):
+            sentence.children = []
+        with self.assertRaises(FrozenElementModified):
+            word.subst = word.mode
+        with self.assertRaises(FrozenElementModified):
+            sentence.add_hyperlink_list([])
+        with self.assertRaises(FrozenElementModified):
+            sentence._metadata = None
+        self.assertEqual(str(sentence), str(get_test_sentence()))
+
+    def test_frozen_element_equality(self):
+        sentence = get_test_sentence()
+        self.assertEqual(sentence, get_test_sentence().freeze())
+        self.assertEqual(hash(sentence), hash(get_test_sentence().freeze()))
+
+    def test_frozen_hypertext(self):
+        sentence = get_test_sentence()
+        hypertext = HyperText(Text([sentence]))
+        linked_hypertext = HyperText(Text([get_test_word_instance()]))
+        hypertext.add_hyperlink(PropositionPath([sentence]), "lit", linked_hypertext)
+        hypertext.freeze()
+        self.assertTrue(linked_hypertext.is_frozen())
+        with self.assertRaises(FrozenElementModified):
+            hypertext.add_hyperlink(PropositionPath([sentence]), "other", linked_hypertext)
+        with self.assertRaises(TypeError):
+            hypertext._hyperlinks[PropositionPath([sentence])] = ()
+
+    def test_factory_nodes_are_frozen(self):
+        word = RandomPropositionGenerator().get_random_proposition(Sentence).children[0].subst
+        self.assertTrue(PropositionFactory().word(word.subst, word.mode).is_frozen())
+
+
+class TestBinaryEncoding(unittest.TestCase):
+
+    def test_roundtrip(self):
+        sentence = get_test_sentence()
+        for element in [sentence, sentence.children[0].subst, sentence.children[0].subst.subst]:
+            with self.subTest(element=type(element).__name__):
+                decoded = decode(encode(element))
+                self.assertIsInstance(decoded, type(element))
+                self.assertTrue(decoded.is_checked())
+                self.assertEqual(str(decoded), str(element))
+                self.assertEqual(decoded, element)
+
+        term = sentence.children[0].subst.subst.children[0]
+        self.assertEqual(decode(encode(term)), term)
+
+    def test_shared_subtrees(self):
+        word = get_test_word_instance()
+        word.check()
+        text = Text([word, promote_to(word, Sentence)])
+        text.check()
+        data = encode(text)
+        decoded = decode(data)
+        self.assertEqual(str(decoded), str(text))
+        self.assertLess(len(data), len(encode(word)) * 2) # the word is only written once
+
+    def test_hypertext(self):
+        sentence = get_test_sentence()
+        hypertext = HyperText(Text([sentence]))
+        linked_hypertext = HyperText(Text([get_test_word_instance()]))
+        linked_hypertext.check()
+        hypertext.add_hyperlink(PropositionPath([sentence, sentence.children[1]]), "lit", linked_hypertext)
+        hypertext.add_hyperlink(PropositionPath([sentence]), "other", linked_hypertext)
+        hypertext.check()
+
+        decoded = decode(encode(hypertext))
+        self.assertEqual(str(decoded), str(hypertext))
+        self.assertEqual(decoded.transitions, hypertext.transitions)
+
+    def test_hyperlinked_propositions(self):
+        with open("data/example_usl_one_hyperlink.txt") as ieml_file:
+            hypertext = USLParser().parse(ieml_file.read())
+
+        decoded = decode(encode(hypertext))
+        self.assertEqual(str(decoded), str(hypertext))
+        self.assertEqual(len(decoded.children[0].get_hyperlinks()), 1)
+        self.assertEqual([(str(path), literal, str(linked_hypertext))
+                          for path, (literal, linked_hypertext) in decoded.children[0].get_hyperlinks()],
+                         [(str(path), literal, str(linked_hypertext))
+                          for path, (literal, linked_hypertext) in hypertext.children[0].get_hyperlinks()])
+        self.assertEqual(len(list(decoded.get_hyperlinks())), len(list(hypertext.get_hyperlinks())))
+
+        decoded_text = decode(encode(hypertext.children[0]))
+        self.assertEqual(len(decoded_text.get_hyperlinks()), 1)
+
+    def test_no_dictionary_lookup(self):
+        data = encode(get_test_sentence())
+        with unittest.mock.patch("models.base_queries.DictionaryQueries.exact_ieml_terms_search") as lookup:
+            decode(data)
+        lookup.assert_not_called()
+
+    def test_invalid_data(self):
+        data = encode(get_test_sentence())
+        with self.assertRaises(InvalidBinaryAST):
+            decode(b"IEMLSTR" + data[7:])
+        with self.assertRaises(InvalidBinaryAST):
+            decode(data[:-3])
+        with self.assertRaises(UnsupportedBinaryVersion):
+            decode(MAGIC + bytes([VERSION + 1]) + data[len(MAGIC) + 1:])
+
+
 class TestMorphemesFeatures(unittest.TestCase):
 
     def test_morpheme_checks(self):
@@ -218,6 +481,34 @@ class TestSentences(unittest.TestCase):
                                       [False,False,False,False,False]])
         self.assertTrue((sentence.graph.adjacency_matrix == adjancency_matrix).all())
 
+    def test_adjacency_lists_building(self):
+        sentence = get_test_sentence()
+        children_indexes = [sorted(children) for children in sentence.graph.children_indexes]
+        self.assertEqual(children_indexes, [[1, 2], [3, 4], [], [], []])
+        self.assertEqual(list(sentence.graph.in_degrees), [0, 1, 1, 1, 1])
+        self.assertEqual(list(sentence.graph.out_degrees), [2, 2, 0, 0, 0])
+
+    def test_max_nodes(self):
+        generator = RandomPropositionGenerator()
+        words = {}
+        while len(words) < 60:
+            word = generator._make_random_word()
+            word.check()
+            words[str(word)] = word
+        words = list(words.values())
+        chain = [Clause(words[i], words[i + 1], words[-1]) for i in range(len(words) - 2)]
+        with self.assertRaises(TooManyNodesInGraph):
+            Sentence(list(chain)).check()
+
+        graph = PropositionGraph(chain)
+        graph.check(max_nodes=len(words))
+        self.assertEqual(len(graph.nodes_list), len(words) - 1)
+
+        sentence = Sentence(list(chain))
+        self.assertEqual(check_sentences([sentence], max_nodes=len(words)), [None])
+        self.assertEqual(len(sentence.graph.nodes_list), len(words) - 1)
+        self.assertIsInstance(check_sentences([Sentence(list(chain))])[0], TooManyNodesInGraph)
+
     def test_two_many_roots(self):
         a, b, c, d, e, f = tuple(get_words_list())
         sentence = Sentence([Clause(a,b,f), Clause(a,c,f), Clause(b,e,f), Clause(d,b,f)])
@@ -236,6 +527,53 @@ class TestSentences(unittest.TestCase):
         with self.assertRaises(NoRootNodeFound):
             sentence.check()
 
+    def test_all_errors_found(self):
+        a, b, c, d, e, f = tuple(get_words_list())
+        sentence = Sentence([Clause(a,b,f), Clause(c,d,f), Clause(d,e,f), Clause(e,d,f)])
+        with self.assertRaises(SeveralRootNodeFound) as context:
+            sentence.check()
+        self.assertEqual([type(error) for error in context.exception.errors],
+                         [SeveralRootNodeFound, NodeHasTooMuchParents, NodeInCycle, NodeInCycle, NodeNotConnected,
+                          NodeNotConnected])
+        self.assertEqual(context.exception.node_ids, [0, 2])
+        # a and b are apart from the biggest component
+        self.assertEqual([error.node_id for error in context.exception.errors[1:]], [3, 3, 4, 0, 1])
+
+    def test_disjoint_cycle(self):
+        """A cycle apart from a valid tree used to go unnoticed"""
+        a, b, c, d, e, f = tuple(get_words_list())
+        sentence = Sentence([Clause(a,b,f), Clause(a,c,f), Clause(d,e,f), Clause(e,d,f)])
+        with self.assertRaises(NodeInCycle):
+            sentence.check()
+
+    def test_batch_validation(self):
+        a, b, c, d, e, f = tuple(get_words_list())
+        sentences = [Sentence([Clause(a,b,f), Clause(a,c,f), Clause(b,e,f), Clause(b,d,f), Clause(c,d,f)]),
+                     Sentence([Clause(b,d,f), Clause(a,c,f), Clause(b,e,f), Clause(a,b,f)]),
+                     Sentence([Clause(a,b,f)]),
+                     Sentence([Clause(a,b,f), Clause(c,d,f), Clause(d,e,f), Clause(e,d,f)])]
+        verdicts = check_sentences(sentences)
+        self.assertEqual([type(verdict) for verdict in verdicts],
+                         [NodeHasTooMuchParents, type(None), type(None), SeveralRootNodeFound])
+        self.assertEqual(len(verdicts[3].errors), 6)
+        self.assertTrue(sentences[1].graph.has_been_checked)
+        self.assertIsNotNone(sentences[1].graph.ordered_clauses)
+        sentence = get_test_sentence() # the same sentence, checked on its own
+        self.assertEqual(sentences[1].children, sentence.children)
+        self.assertEqual(str(sentences[1]), str(sentence))
+
+    def test_batch_validation_of_empty_graphs(self):
+        a, b, c, d, e, f = tuple(get_words_list())
+        clauses = [Clause(a,b,f), Clause(a,c,f)]
+        for clause in clauses:
+            clause.check()
+        graphs = [PropositionGraph([]), PropositionGraph(clauses), PropositionGraph([])]
+        verdicts = BatchGraphValidator(graphs).validate()
+        self.assertIsNone(verdicts[1])
+        self.assertEqual(graphs[1].root_node, a)
+        self.assertIsInstance(verdicts[0], NoRootNodeFound)
+        self.assertIsInstance(verdicts[2], NoRootNodeFound)
+
     def test_clause_ordering(self):
         a, b, c, d, e, f = tuple(get_words_list())
         clause_a, clause_b, clause_c, clause_d = Clause(a,b,f), Clause(a,c,f), Clause(b,d,f), Clause(b,e,f)
@@ -266,16 +604,17 @@ class TestIsNull(unittest.TestCase):
         self.parser = PropositionsParser()
 
     def test_null_closed_proposition(self):
-        NULL_WORD.check(), NULL_SUPERSENTENCE.check(), NULL_SENTENCE.check()
-        self.assertTrue(NULL_WORD.is_null)
-        self.assertTrue(NULL_SENTENCE.is_null)
-        self.assertTrue(NULL_SUPERSENTENCE.is_null)
+        self.assertTrue(null_element(Word).is_null)
+        self.assertTrue(null_element(Sentence).is_null)
+        self.assertTrue(null_element(SuperSentence).is_null)
 
     def test_null_nonclosed_proposition(self):
-        NULL_CLAUSE.check(), NULL_MORPHEME.check(), NULL_SUPERCLAUSE.check()
-        self.assertTrue(NULL_CLAUSE.is_null)
-        self.assertTrue(NULL_MORPHEME.is_null)
-        self.assertTrue(NULL_SUPERCLAUSE.is_null)
+        self.assertTrue(null_element(Clause).is_null)
+        self.assertTrue(null_element(Morpheme).is_null)
+        self.assertTrue(null_element(SuperClause).is_null)
+
+    def test_parsed_null_elements(self):
+        self.assertIs(self.parser.parse("[([E:])]"), null_element(Word))
 
     def test_composed_proposition(self):
         promoted_sentence = self.parser.parse("[([([wa.j.-])]*[([E:])]*[([E:])])]")
@@ -1,9 +1,15 @@
 from .helper import *
-import string, random
+import string, random, os, tempfile
+import numpy as np
 from pymongo import MongoClient
 from pymongo.errors import DuplicateKeyError
 from models import *
-from ieml.AST import Sentence, Word
+from models.exceptions import ObjectNotFound
+from models.search_index import SearchIndexes
+from models.dictionary import DictionaryImage, DictionarySnapshot
+from models.dictionary_loader import read_dump, main as run_dictionary_loader
+from ieml.AST import Sentence, Word, Term, TermRegistry
+from ieml.AST.tools import null_element
 
 
 class BaseDBTest(unittest.TestCase):
@@ -27,6 +33,29 @@ class TestDBQueries(BaseDBTest):
                                                                          "EN" : "Badababi dou baba boup"})
         self.assertEqual(self.writable_db_connector.propositions.count(), 1)
 
+    def test_propositions_containing(self):
+        sentence = get_test_sentence()
+        self.writable_db_connector.save_closed_proposition(sentence, {"FR": "Une phrase", "EN": "A sentence"})
+        word = next(get_words_list())
+        result = self.writable_db_connector.propositions_containing(word)
+        self.assertEqual([e["IEML"] for e in result], [str(sentence)])
+        self.assertEqual(self.writable_db_connector.propositions_containing(word.subst.children[0]), result)
+        self.assertEqual(self.writable_db_connector.propositions_containing(word, levels=[Word]), [])
+
+    def test_load_proposition(self):
+        sentence = get_test_sentence()
+        self.writable_db_connector.save_closed_proposition(sentence, {"FR": "Une phrase", "EN": "A sentence"})
+        with unittest.mock.patch("ieml.parsing.PropositionsParser.parse") as parse:
+            loaded = self.writable_db_connector.load_proposition(str(sentence))
+        parse.assert_not_called()
+        self.assertEqual(loaded, sentence)
+
+        # entries saved without the binary form are parsed
+        self.writable_db_connector.propositions.update_one({"_id": str(sentence)}, {"$unset": {"BINARY": ""}})
+        self.assertEqual(self.writable_db_connector.load_proposition(str(sentence)), sentence)
+        with self.assertRaises(ObjectNotFound):
+            self.writable_db_connector.load_proposition("[([E:A:T:.])]")
+
     def test_search(self):
         result = self.term_connector.search_for_terms("w")
         self.assertTrue(len(result) != 0)
@@ -74,3 +103,300 @@ class TestUnicityDb(unittest.TestCase):
         self._save_to_db()
         self.assertEqual(self._save_to_db(), True)
 
+
+
+class TestDictionarySnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.term_connector = DictionaryQueries()
+        self.term_connector.load_snapshot()
+        self.terms_collection = self.term_connector.terms
+
+    def tearDown(self):
+        self.term_connector.terms = self.terms_collection
+        self.term_connector.drop_snapshot()
+
+    def test_snapshot_matches_db(self):
+        from_snapshot = self.term_connector.exact_ieml_term_search("[E:A:T:.]")
+        self.term_connector.drop_snapshot()
+        from_db = self.term_connector.exact_ieml_term_search("[E:A:T:.]")
+        # the collection doesn't store the ranks, they're computed the same way as the snapshot's
+        self.assertIsNotNone(from_snapshot["RANK"])
+        self.assertEqual(from_snapshot, from_db)
+
+    def test_ranks_follow_canonical_order(self):
+        snapshot = self.term_connector.snapshot
+        ranks = sorted(set(snapshot.rank(entry["IEML"]) for entry in snapshot))
+        self.assertEqual(ranks, list(range(len(ranks)))) # ranks are dense
+
+        term_a, term_b = Term("S:M:.e.-M:M:.u.-'+B:M:.e.-M:M:.a.-'+T:M:.e.-M:M:.i.-'"), Term("S:M:.e.-M:M:.u.-'")
+        term_a.check(), term_b.check()
+        self.assertLess(term_b.rank, term_a.rank)
+        self.assertLess(term_b, term_a)
+        self.assertLess(term_b.sort_key, term_a.sort_key)
+
+    def test_no_db_roundtrip(self):
+        """Once the snapshot is loaded, checking a whole sentence doesn't touch the terms collection"""
+        self.term_connector.terms = Mock()
+        sentence = get_test_sentence()
+        self.assertTrue(sentence.is_checked())
+        self.assertTrue(self.term_connector.check_tag_exist("pensée", "FR"))
+        self.term_connector.terms.find_one.assert_not_called()
+
+    def test_unknown_term(self):
+        self.assertIsNone(self.term_connector.exact_ieml_term_search("E:A:Tqsdf"))
+        self.assertFalse(self.term_connector.check_tag_exist("not a tag", "EN"))
+
+
+class TestDictionaryImage(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.term_entries = read_dump("data/ieml_db_loader.js")
+        handle, cls.image_path = tempfile.mkstemp()
+        os.close(handle)
+        DictionaryImage.write(cls.term_entries, cls.image_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.image_path)
+
+    def setUp(self):
+        self.image = DictionaryImage.open(self.image_path)
+
+    def test_dump_parsing(self):
+        self.assertEqual(len(self.term_entries), len(self.image))
+        self.assertTrue(all("_id" in entry and "CANONICAL" in entry for entry in self.term_entries))
+
+    def test_image_matches_snapshot(self):
+        snapshot = DictionarySnapshot(self.term_entries)
+        for entry in snapshot:
+            from_image = self.image.get(entry["IEML"])
+            for field in ["_id", "IEML", "CANONICAL", "RANK", "LAYER", "CLASS", "PARADIGM", "TAILLE"] \
+                    + TAG_LANGUAGES:
+                self.assertEqual(from_image[field], entry.get(field))
+
+    def test_tags(self):
+        self.assertTrue(self.image.has_tag("pensée", "FR"))
+        self.assertFalse(self.image.has_tag("not a tag", "EN"))
+        self.assertFalse(self.image.has_tag("pensée", "DE"))
+
+    def test_unknown_term(self):
+        self.assertNotIn("E:A:Tqsdf", self.image)
+        self.assertIsNone(self.image.get("E:A:Tqsdf"))
+
+    def test_queries_on_image(self):
+        term_connector = DictionaryQueries()
+        from_db = term_connector.exact_ieml_term_search("[E:A:T:.]")
+        term_connector.load_image(self.image_path)
+        try:
+            from_image = term_connector.exact_ieml_term_search("[E:A:T:.]")
+        finally:
+            term_connector.drop_snapshot()
+        self.assertIsNotNone(from_image.pop("RANK"))
+        from_db.pop("RANK")
+        self.assertEqual(from_image, from_db)
+
+
+class TestDictionaryGeneration(unittest.TestCase):
+
+    def setUp(self):
+        self.term_connector = DictionaryQueries()
+        self.term_connector.load_snapshot()
+        self.meta_collection = self.term_connector.meta
+
+    def tearDown(self):
+        self.term_connector.meta = self.meta_collection
+        self.term_connector.drop_snapshot()
+
+    def test_bump_generation(self):
+        generation = self.term_connector.generation(force=True)
+        self.assertEqual(self.term_connector.bump_generation(), generation + 1)
+        self.assertEqual(self.term_connector.generation(force=True), generation + 1)
+
+    def test_image_only_reload_bumps_generation(self):
+        generation = self.term_connector.generation(force=True)
+        with tempfile.TemporaryDirectory() as directory, \
+                unittest.mock.patch("sys.argv", ["dictionary_loader", "data/ieml_db_loader.js", "--no-db",
+                                                 "--image", os.path.join(directory, "dictionary.img")]), \
+                unittest.mock.patch("models.dictionary_loader.load_terms") as load_terms, \
+                unittest.mock.patch("builtins.print"):
+            run_dictionary_loader()
+        load_terms.assert_not_called()
+        self.assertEqual(self.term_connector.generation(force=True), generation + 1)
+
+    def test_generation_read_is_rate_limited(self):
+        self.term_connector.generation(force=True)
+        self.term_connector.meta = Mock()
+        self.term_connector.generation()
+        self.term_connector.exact_ieml_term_search("[E:A:T:.]")
+        self.term_connector.meta.find_one.assert_not_called()
+
+    def test_caches_rebuilt_on_new_generation(self):
+        term = TermRegistry().get("E:A:T:.")
+        snapshot = self.term_connector.snapshot
+        self.term_connector.bump_generation()
+
+        new_term = TermRegistry().get("E:A:T:.")
+        self.assertIsNot(new_term, term)
+        self.assertEqual(new_term, term)
+        self.assertIsNot(self.term_connector.snapshot, snapshot)
+        self.assertEqual(self.term_connector.snapshot_generation, self.term_connector.generation())
+        self.assertEqual(TermRegistry().generation, self.term_connector.generation())
+
+    def test_completions_rebuilt_on_new_generation(self):
+        SearchRequest.build_search_indexes()
+        self.term_connector.bump_generation()
+        SearchRequest.autocomplete("Pens", 5)
+        self.assertEqual(self.term_connector.search_index_generation, self.term_connector.generation())
+
+    def test_null_elements_rebuilt_on_new_generation(self):
+        null_term, null_word = TermRegistry().null_term, null_element(Word)
+        objectid = null_term.objectid
+        with unittest.mock.patch.object(Term, "uncheck") as uncheck:
+            self.term_connector.bump_generation()
+            new_null_term = TermRegistry().get("E:")
+        uncheck.assert_not_called()
+        self.assertIsNot(new_null_term, null_term)
+        self.assertTrue(new_null_term.is_null)
+        self.assertEqual(null_term.objectid, objectid) # the previous generation's null term is left as it was
+
+        self.assertIsNot(null_element(Word), null_word)
+        self.assertIs(null_element(Term), new_null_term)
+        self.assertIs(PropositionsParser().parse("[([E:])]"), null_element(Word))
+
+
+class TestTermFilters(unittest.TestCase):
+
+    def setUp(self):
+        self.term_connector = DictionaryQueries()
+        self.term_connector.load_snapshot()
+        self.term_connector.build_search_index()
+
+    def tearDown(self):
+        self.term_connector.drop_snapshot()
+
+    def _search_from_db(self, *args, **kwargs):
+        self.term_connector.drop_snapshot()
+        try:
+            return self.term_connector.search_terms(*args, **kwargs)
+        finally:
+            self.term_connector.load_snapshot()
+
+    def test_filters_match_db(self):
+        for search_string in ["S:", "a", "pensée"]:
+            for category in [None, 0, 1, 2]:
+                for term_type in [None, 0, 1, 2]:
+                    from_columns = self.term_connector.search_terms(search_string, None, category, term_type)
+                    from_db = self._search_from_db(search_string, None, category, term_type)
+                    self.assertEqual(sorted(term["IEML"] for term in from_columns),
+                                     sorted(term["IEML"] for term in from_db))
+
+    def test_term_types_partition(self):
+        snapshot = self.term_connector.snapshot
+        masks = [snapshot.filter_mask(term_type=term_type) for term_type in [0, 1, 2]]
+        self.assertTrue(np.all(masks[0] ^ masks[1] ^ masks[2]))
+
+    def test_layer_filter(self):
+        terms = self.term_connector.search_terms("E:", layer=0)
+        self.assertTrue(terms)
+        self.assertTrue(all(self.term_connector.snapshot.get(term["IEML"][1:-1])["LAYER"] == "0" for term in terms))
+        self.assertEqual(sorted(term["IEML"] for term in terms),
+                         sorted(term["IEML"] for term in self._search_from_db("E:", layer=0)))
+
+    def test_image_filters_match_snapshot(self):
+        term_entries = list(self.term_connector.snapshot)
+        handle, image_path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            DictionaryImage.write(term_entries, image_path)
+            image = DictionaryImage.open(image_path)
+            for category in [0, 1, 2]:
+                self.assertEqual(
+                    [entry["IEML"] for entry in image.filter_entries(term_entries, category, 1)],
+                    [entry["IEML"] for entry in self.term_connector.snapshot.filter_entries(term_entries, category, 1)])
+            self.assertEqual(list(image.positions_of(["E:A:T:.", "E:A:Tqsdf", "E:" * 100])[1:]), [-1, -1])
+        finally:
+            os.remove(image_path)
+
+
+class TestSearchIndex(BaseDBTest):
+
+    def setUp(self):
+        super().setUp()
+        self.term_connector.build_search_index()
+        self.writable_db_connector.build_search_index()
+        self.tags = {"FR": "Faire du bruit avec sa bouche", "EN": "Badababi dou baba boup"}
+
+    def tearDown(self):
+        SearchIndexes().drop(TERMS_COLLECTION)
+        SearchIndexes().drop(self.writable_db_connector.propositions.name)
+        super().tearDown()
+
+    def test_same_results_as_db(self):
+        for search_string in ["w", "possessif", "T:.E:.n.-", "zzzz"]:
+            from_index = self.term_connector.search_terms(search_string)
+            SearchIndexes().drop(TERMS_COLLECTION)
+            self.assertCountEqual(from_index, self.term_connector.search_terms(search_string))
+            self.term_connector.build_search_index()
+
+    def test_language_filter(self):
+        for e in self.term_connector.search_terms("possessif", ["EN"]):
+            self.assertTrue("possessif" in e["IEML"] or "possessif" in e["TAGS"]["EN"])
+
+    def test_index_maintained_on_save(self):
+        word_object = get_test_word_instance()
+        word_object.check()
+        self.writable_db_connector.save_closed_proposition(word_object, self.tags)
+        result = self.writable_db_connector.search_propositions("baba", levels=[Word])
+        self.assertEqual([e["IEML"] for e in result], [str(word_object)])
+
+        self.writable_db_connector.update_tags(str(word_object), {"FR": "chut", "EN": "hush"})
+        self.assertEqual(self.writable_db_connector.search_propositions("baba"), [])
+        self.assertEqual(len(self.writable_db_connector.search_propositions("hus")), 1)
+
+    def test_index_rebuilt_after_write_by_other_process(self):
+        word_object = get_test_word_instance()
+        word_object.check()
+        collection = self.writable_db_connector.propositions
+        # the other process writes the proposition and bumps the collection's write counter
+        collection.insert_one({"_id": str(word_object), "TYPE": "WORD", "TAGS": self.tags})
+        self.term_connector.meta.update_one({"_id": "collection:" + collection.name}, {"$inc": {"GENERATION": 1}},
+                                            upsert=True)
+
+        self.writable_db_connector.collection_generation(collection, force=True)
+        result = self.writable_db_connector.search_propositions("baba")
+        self.assertEqual([e["IEML"] for e in result], [str(word_object)])
+        self.assertEqual(SearchIndexes().get(collection.name).generation,
+                         self.writable_db_connector.collection_generation(collection))
+
+    def test_autocomplete(self):
+        completions = SearchIndexes().completions
+        result = completions.complete("Pens", 5, ["TERM"])
+        self.assertTrue(0 < len(result["TERM"]) <= 5)
+        for e in result["TERM"]:
+            self.assertTrue(any(tag.casefold().startswith("pens") for tag in e["TAGS"].values() if tag))
+
+        word_object = get_test_word_instance()
+        word_object.check()
+        self.writable_db_connector.save_closed_proposition(word_object, self.tags)
+        self.assertEqual(completions.complete("badababi", 5), {"WORD": [{"IEML": str(word_object),
+                                                                          "TAGS": self.tags,
+                                                                          "TYPE": "WORD"}]})
+
+    def test_index_rebuild(self):
+        word_object = get_test_word_instance()
+        word_object.check()
+        self.writable_db_connector.save_closed_proposition(word_object, self.tags)
+        collection = self.writable_db_connector.propositions
+        completions = SearchIndexes().completions
+        expected = {"WORD": [{"IEML": str(word_object), "TAGS": self.tags, "TYPE": "WORD"}]}
+        self.assertEqual(completions.complete("badababi", 5), expected)
+        self.assertEqual(set(SearchIndexes().get(collection.name).get(str(word_object))), {"_id", "TAGS", "TYPE"})
+
+        for _ in range(2):
+            self.writable_db_connector.build_search_index()
+            self.assertEqual(completions.complete("badababi", 5), expected)
+            self.assertEqual(set(SearchIndexes().get(collection.name).get(str(word_object))),
+                             {"_id", "TAGS", "TYPE"})
+        self.assertTrue(completions.complete("Pens", 5, ["TERM"])["TERM"])
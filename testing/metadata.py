@@ -1,3 +1,4 @@
+import unittest.mock
 from .db import BaseDBTest
 from ieml.AST.tree_metadata import TreeElementMetadata
 from ieml import PropositionsParser
@@ -14,3 +15,22 @@ class TestMetadata(BaseDBTest):
 
     def test_get_tags(self):
         self.assertEqual(self.example_word.metadata["TAGS"]["FR"], "WESH")
+
+    def test_tags_update_seen_by_parsed_nodes(self):
+        """The parser hands out the same (cached) node for a string, its tags mustn't stay stuck on it"""
+        self.assertEqual(self.example_word.metadata["TAGS"]["FR"], "WESH")
+        self.writable_db_connector.update_tags(str(self.example_word), {"FR": "SALUT", "EN": "HI"})
+        word = self.parser.parse("[([a.wo.-]+[a.T:.-]+[i.t.-])*([wo.B:.-])]")
+        self.assertIs(word, self.example_word)
+        self.assertEqual(word.metadata["TAGS"], {"FR": "SALUT", "EN": "HI"})
+
+    def test_frozen_metadata_cached(self):
+        """A parsed node only queries the db again for its metadata once its collection has been written"""
+        self.assertEqual(self.example_word.metadata["TAGS"]["FR"], "WESH")
+        with unittest.mock.patch.object(self.writable_db_connector, "exact_ieml_search",
+                                        wraps=self.writable_db_connector.exact_ieml_search) as search:
+            self.assertEqual(self.example_word.metadata["TAGS"]["EN"], "SUP'")
+            self.assertEqual(search.call_count, 0)
+            self.writable_db_connector.update_tags(str(self.example_word), {"FR": "SALUT", "EN": "HI"})
+            self.assertEqual(self.example_word.metadata["TAGS"]["FR"], "SALUT")
+            self.assertEqual(search.call_count, 1)
@@ -1,8 +1,27 @@
 from ieml.AST.tools import RandomPropositionGenerator
 from ieml.parsing import USLParser
+from ieml.AST import TermRegistry, HyperText, Text, PropositionPath
+from ieml.constants import PARSER_CACHE_SIZE
+from models import DictionaryQueries
 from testing.helper import *
 
 
+class TermLookupsCounter:
+    """Counts the queries to the terms collection made while parsing"""
+
+    def __enter__(self):
+        TermRegistry().get("E:") # makes sure the registry is up to date with the dictionary's generation
+        TermRegistry().clear()
+        PropositionsParser().cache.clear(), USLParser().cache.clear() # the strings have to be parsed again
+        self.term_connector = DictionaryQueries()
+        self.terms_collection = self.term_connector.terms
+        self.term_connector.terms = Mock(wraps=self.terms_collection)
+        return self.term_connector.terms
+
+    def __exit__(self, *args):
+        self.term_connector.terms = self.terms_collection
+
+
 class TestPropositionParser(unittest.TestCase):
 
     def setUp(self):
@@ -28,6 +47,21 @@ class TestPropositionParser(unittest.TestCase):
         to_check = self.parser.parse("[f.-O:M:.-+M:O:.-s.y.-']")
         self.assertEqual(to_check, term)
 
+    def test_terms_resolved_at_once(self):
+        with TermLookupsCounter() as terms_collection:
+            self.parser.parse("[([([h.O:T:.-])]*[([E:O:.T:M:.-])]*[([E:F:.O:O:.-])])+"
+                              "([([h.O:T:.-])]*[([wu.T:.-])]*[([h.O:B:.-])])]")
+        self.assertEqual(terms_collection.find.call_count, 1)
+        terms_collection.find_one.assert_not_called()
+
+    def test_identical_subtrees_shared(self):
+        sentence = self.parser.parse("[([([h.O:T:.-])]*[([E:])]*[([E:])])+([([h.O:T:.-])]*[([wu.T:.-])]*[([E:])])]")
+        null_words = [clause.mode for clause in sentence.children] + [sentence.children[0].attr]
+        self.assertEqual(str(null_words[0]), "[([E:])]")
+        self.assertTrue(all(word is null_words[0] for word in null_words))
+        self.assertIs(sentence.children[0].subst, sentence.children[1].subst)
+        self.assertIs(self.parser.parse(str(sentence)), sentence)
+
     def test_ordering(self):
         supersentence_ast = self.parser.parse(str(RandomPropositionGenerator().get_random_proposition(SuperSentence)))
         self.assertTrue(supersentence_ast.is_ordered())
@@ -39,6 +73,12 @@ class TestUSLParser(unittest.TestCase):
     def setUp(self):
         self.parser = USLParser()
 
+    def test_terms_resolved_at_once(self):
+        with open("data/example_usl_one_hyperlink.txt") as ieml_file, TermLookupsCounter() as terms_collection:
+            self.parser.parse(ieml_file.read())
+        self.assertEqual(terms_collection.find.call_count, 1)
+        terms_collection.find_one.assert_not_called()
+
     def test_text(self):
         """Weak test of the USL with hyperlink parsing"""
         with open("data/example_text.txt") as ieml_file:
@@ -61,3 +101,52 @@ class TestUSLParser(unittest.TestCase):
         with open("data/example_usl_multiple_hyperlinks.txt") as ieml_file:
             usl_obj = self.parser.parse(ieml_file.read())
         self.assertEqual(len(usl_obj.texts), 4)
+
+
+class TestParserCache(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = PropositionsParser()
+        self.usl_parser = USLParser()
+        self.parser.cache.clear()
+        self.usl_parser.cache.clear()
+
+    def test_hits_and_misses(self):
+        ieml = "[([([h.O:T:.-])]*[([E:O:.T:M:.-])]*[([E:F:.O:O:.-])])]"
+        sentence = self.parser.parse(ieml)
+        self.assertIs(self.parser.parse(ieml), sentence) # the propositions are shared anyway
+        self.assertEqual((self.parser.cache.hits, self.parser.cache.misses), (1, 1))
+
+    def test_least_recently_used_evicted(self):
+        self.parser.cache.size = 2
+        try:
+            for ieml in ["[E:A:T:.]", "[E:S:.wa.-]", "[E:A:T:.]", "[E:S:.o.-]"]:
+                self.parser.parse(ieml)
+            self.assertEqual(len(self.parser.cache), 2)
+            self.parser.parse("[E:A:T:.]")
+            self.assertEqual(self.parser.cache.hits, 2)
+            self.parser.parse("[E:S:.wa.-]")
+            self.assertEqual(self.parser.cache.misses, 4)
+        finally:
+            self.parser.cache.size = PARSER_CACHE_SIZE
+
+    def test_hypertexts_are_copies(self):
+        with open("data/example_usl_one_hyperlink.txt") as ieml_file:
+            ieml = ieml_file.read()
+        hypertext = self.usl_parser.parse(ieml)
+        other_hypertext = self.usl_parser.parse(ieml)
+        self.assertEqual(self.usl_parser.cache.hits, 1)
+        self.assertIsNot(other_hypertext, hypertext)
+        self.assertEqual(str(other_hypertext), str(hypertext))
+
+        linked_hypertext = HyperText(Text([get_test_word_instance()]))
+        linked_hypertext.check()
+        proposition = other_hypertext.children[0].children[0]
+        other_hypertext.add_hyperlink(PropositionPath(proposition=proposition), "lit", linked_hypertext)
+        self.assertEqual(str(self.usl_parser.parse(ieml)), str(hypertext))
+
+    def test_invalidated_by_dictionary_reload(self):
+        self.parser.parse("[E:A:T:.]")
+        DictionaryQueries().bump_generation()
+        self.parser.parse("[E:A:T:.]")
+        self.assertEqual(self.parser.cache.misses, 2)
@@ -2,6 +2,8 @@ from ieml.AST import promote_to, Term
 from ieml.AST.tools import RandomPropositionGenerator, demote_once
 from ieml.exceptions import CannotPromoteToLowerLevel
 from .helper import *
+import numpy as np
+from models import DictionaryQueries
 
 
 class TestPromotion(unittest.TestCase):
@@ -84,4 +86,32 @@ class TestRandomGenerator(unittest.TestCase):
                     print(random_proposition.__class__)
                     # self.fail("%s checking failed : %s " % (str(prop_type), str(err)))
                     raise err
-                self.assertIs(type(random_proposition), prop_type)
\ No newline at end of file
+                self.assertIs(type(random_proposition), prop_type)
+
+    def test_seeded_generation(self):
+        self.generator.seed(42)
+        first = self.generator.get_random_proposition(SuperSentence)
+        self.generator.seed(42)
+        self.assertEqual(str(self.generator.get_random_proposition(SuperSentence)), str(first))
+
+    def test_random_terms(self):
+        db = DictionaryQueries()
+        terms = db.get_random_terms(50)
+        self.assertEqual(len(terms), 50)
+        self.assertEqual(len(set(terms)), 50) # drawn without replacement
+
+        rng_a, rng_b = np.random.default_rng(3), np.random.default_rng(3)
+        self.assertEqual(db.get_random_terms(10, rng_a), db.get_random_terms(10, rng_b))
+
+    def test_filtered_random_terms(self):
+        db = DictionaryQueries()
+        for term_ieml in db.get_random_terms(20, layer=2):
+            self.assertEqual(db.terms.find_one({"IEML": term_ieml})["LAYER"], "2")
+
+        paradigms = db.get_random_terms(10000, paradigm=True) # fewer paradigms than that, so we get all of them
+        self.assertEqual(len(set(paradigms)), db.terms.count({"PARADIGM": "1"}))
+
+        word = self.generator.get_random_proposition(Word, layer=3)
+        for morpheme in word.children:
+            for term in morpheme.children:
+                self.assertEqual(db.terms.find_one({"IEML": term.ieml})["LAYER"], "3")
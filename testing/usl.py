@@ -2,6 +2,9 @@ import unittest
 
 from ieml.AST import RandomPropositionGenerator, Sentence, HyperText, Text, Word, PropositionPath
 from ieml.AST.tools import promote_to
+from ieml.AST.usl import HyperTextAssembler
+from ieml.AST.propositional_graph import IncrementalTopologicalOrder
+from ieml.exceptions import EdgeCreatesCycle, UnknownHypertext
 from .helper import *
 
 
@@ -33,4 +36,78 @@ class TestHypertext(unittest.TestCase):
         hyperlink.check()
         str_first = hypertext._str
         hypertext.add_hyperlink(PropositionPath(proposition=proposition), "lol", hyperlink)
-        self.assertNotEqual(str_first, hypertext._str)
\ No newline at end of file
+        self.assertNotEqual(str_first, hypertext._str)
+
+    def test_streamed_rendering(self):
+        proposition = RandomPropositionGenerator().get_random_proposition(Sentence)
+        hypertext = HyperText(Text([proposition]))
+        hyperlink = HyperText(Text([RandomPropositionGenerator().get_random_proposition(Word)]))
+        hypertext.check()
+        hyperlink.check()
+        hypertext.add_hyperlink(PropositionPath(proposition=proposition), "lol", hyperlink)
+
+        chunks = list(hypertext.iter_ieml())
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), str(hypertext))
+        self.assertIn(str(proposition) + "<lol>" + str(hyperlink), str(hypertext))
+
+    def test_descendants_not_rendered(self):
+        sentence = RandomPropositionGenerator().get_random_proposition(Sentence)
+        sentence.check()
+        str(sentence)
+        self.assertIsNone(sentence.children[0]._ieml_string) # only the string that's asked for is built
+
+    def _random_hypertexts(self, count):
+        propositions = [RandomPropositionGenerator().get_random_proposition(Sentence) for i in range(count)]
+        hypertexts = [HyperText(Text([proposition])) for proposition in propositions]
+        for hypertext in hypertexts:
+            hypertext.check()
+        return propositions, hypertexts
+
+    def test_assembled_hypertexts(self):
+        propositions, hypertexts = self._random_hypertexts(3)
+        assembler = HyperTextAssembler()
+        for i, hypertext in enumerate(hypertexts):
+            assembler.add_hypertext(i, hypertext)
+        # the hyperlink to the middle hypertext is added before the middle one's
+        assembler.add_hyperlink(0, PropositionPath([propositions[0]]), "first", 1)
+        assembler.add_hyperlink(1, PropositionPath([propositions[1]]), "second", 2)
+        root = assembler.build()
+        self.assertIs(root, hypertexts[0])
+        self.assertEqual(root.strate, 2)
+        self.assertEqual(len(root.texts), 3)
+        self.assertIn("<second>" + str(hypertexts[2]), str(root))
+
+    def test_hyperlink_cycle_rejected(self):
+        propositions, hypertexts = self._random_hypertexts(3)
+        assembler = HyperTextAssembler()
+        for i, hypertext in enumerate(hypertexts):
+            assembler.add_hypertext(i, hypertext)
+        assembler.add_hyperlink(0, PropositionPath([propositions[0]]), "first", 1)
+        assembler.add_hyperlink(1, PropositionPath([propositions[1]]), "second", 2)
+        with self.assertRaises(EdgeCreatesCycle) as context:
+            assembler.add_hyperlink(2, PropositionPath([propositions[2]]), "third", 0)
+        self.assertEqual(context.exception.nodes, [2, 0])
+        self.assertEqual(len(list(hypertexts[2].get_hyperlinks())), 0)
+
+    def test_hyperlink_to_unknown_hypertext(self):
+        propositions, hypertexts = self._random_hypertexts(2)
+        assembler = HyperTextAssembler()
+        for i, hypertext in enumerate(hypertexts):
+            assembler.add_hypertext(i, hypertext)
+        with self.assertRaises(UnknownHypertext):
+            assembler.add_hyperlink(0, PropositionPath([propositions[0]]), "first", 2)
+        self.assertEqual(sorted(assembler._order), [0, 1])
+        self.assertEqual(len(list(hypertexts[0].get_hyperlinks())), 0)
+
+    def test_incremental_topological_order(self):
+        order = IncrementalTopologicalOrder()
+        for node in "abcd":
+            order.add_node(node)
+        for source, target in ["dc", "cb", "ba", "da"]:
+            order.add_edge(source, target)
+        self.assertEqual(list(order), list("dcba"))
+        with self.assertRaises(EdgeCreatesCycle):
+            order.add_edge("a", "d")
+        order.add_edge("a", "e")
+        self.assertEqual(list(order), list("dcbae"))